@@ -0,0 +1,54 @@
+import os
+
+# === 產氣尺度線上修正（指數加權） ===
+# calibration.py 是每晚用整段歷史重新擬合曲線；這裡則是每收到一筆當日產氣就即時更新，不讀歷史：
+#   scale = 指數加權的「每單位 normalized 對應幾 m³」，新的一天以 ADAPT_ALPHA 往 當日總產氣 / Σ 各槽 normalized 靠近
+# 只修正整個場址的一個尺度，不分槽、不分曲線天數：每天只量得到總產氣，各槽產氣是依 normalized 比例分出來的，
+# 單筆讀值無法分辨是哪一槽偏多偏少（各槽的「誤差」都是同一個比值），逐槽逐日的曲線形狀交給 calibration.py 用歷史擬合。
+# 計算與 curve_adaptation.json 的大小都與歷史長度無關。
+# 只接受比上次更新更晚的日期（補登舊日期不會重複計入；那些交給夜間批次校正）。
+ADAPT_PATH = "curve_adaptation.json"
+ADAPT_ALPHA = float(os.environ.get("BIOGAS_ADAPT_ALPHA", "0.1"))
+
+
+def observe(state, date_str, items, alpha=ADAPT_ALPHA):
+    """
+    把一天的結果併入修正狀態（直接修改 state，可當 update_json 的 mutate 使用）。
+    items: [(normalized, 分配到的產氣量)]
+    回傳是否有更新。
+    """
+    if date_str <= state.get("last_date", ""):
+        return False
+    state["last_date"] = date_str
+    gas = sum(volume for _, volume in items)
+    total = sum(norm for norm, _ in items if norm > 0)
+    if total <= 0 or gas <= 0:
+        return False
+
+    scale = state.get("scale")
+    state["scale"] = gas / total if scale is None else scale + alpha * (gas / total - scale)
+    state["count"] = state.get("count", 0) + 1
+    return True
+
+
+def result_items(result):
+    # analyze() 結果 → observe() 的 items
+    return [(item.get("normalized", 0), item.get("volume", 0)) for item in result.values()]
+
+
+def update_adaptation(storage, results, commit_msg=None):
+    """
+    results: {日期: analyze() 結果}（依日期順序併入）
+    以 update_json 讀-改-寫（可傳入 storage.batch()，與當日紀錄同一個 commit）。
+    """
+    items = {d: result_items(results[d]) for d in sorted(results)}
+
+    def apply(state):
+        for d, day_items in items.items():
+            observe(state, d, day_items)
+    return storage.update_json(ADAPT_PATH, apply, commit_msg or "更新產氣尺度線上修正")
+
+
+def load_scale(storage):
+    # 目前的「每單位 normalized = 多少 m³」；還沒有任何紀錄時為 None
+    return storage.get_json(ADAPT_PATH).get("scale")
@@ -1,93 +1,169 @@
-import json
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import matplotlib.font_manager as fm
-from datetime import datetime, timedelta
 import os
-import pandas as pd
+
 import numpy as np
 
 
-font_path = "fonts/NotoSansTC-Regular.ttf"  # 字型檔路徑
-fm.fontManager.addfont(font_path)
-plt.rcParams['font.sans-serif'] = ['Noto Sans TC', 'Microsoft JhengHei', 'sans-serif']
-plt.rcParams['axes.unicode_minus'] = False  # 避免負號亂碼
+# log 檔案的 load/save 一律走 storage 後端（github / local / memory 由設定決定）
+from storage import get_storage
+from log_store import open_log, SortedDateLog
+from log_columns import DailyColumns
+from curve_registry import curve_registry
+# matplotlib / pandas 只在畫圖時載入（見 plot_style）
+from plot_style import new_figure, figure_png
+from render_service import stacked_job, cumulative_job
+from figure_cache import render_figures
+
+# 疊加圖只畫最近 STACKED_WINDOW_DAYS 天（0 = 全部歷史）；範圍內的讀值日超過 STACKED_MAX_BARS 根時，
+# 自動改成每週、仍太多則每月加總一根 bar。柱內數值標籤最多 STACKED_MAX_LABELS 個，超過時只標每根 bar 的總量，
+# 不論廠跑了多久，疊加圖的繪製時間與 PNG 大小都有上限。
+STACKED_WINDOW_DAYS = int(os.environ.get("BIOGAS_STACKED_WINDOW", "90"))
+STACKED_MAX_BARS = int(os.environ.get("BIOGAS_STACKED_MAX_BARS", "45"))
+STACKED_MAX_LABELS = int(os.environ.get("BIOGAS_STACKED_MAX_LABELS", "120"))
+STACKED_MAX_TICKS = 30
+
+
+def stacked_window(last_date, window_days=STACKED_WINDOW_DAYS):
+    # 疊加圖的日期範圍 (起, 迄)：以最後一筆累積讀值的日期往前 window_days 天
+    # 只需要最後一筆的日期（log.latest()），呼叫端可以先定出範圍，只讀範圍內的月份
+    if last_date is None:
+        return None, None
+    if window_days <= 0:
+        return None, last_date
+    start = np.datetime64(last_date, "D") - np.timedelta64(window_days - 1, "D")
+    return str(start), last_date
+
 
+def stacked_series(daily_data, cumulative_data: dict, window_days=STACKED_WINDOW_DAYS, max_bars=STACKED_MAX_BARS):
+    """
+    疊加圖的資料：範圍內每個讀值日（或每週 / 每月）一根 bar。
+    回傳 (bar 標籤, 槽別, 產氣量 [bar × 槽], 累積讀值 [bar]（該期最後一筆）, 週期名稱)
+    """
+    start, end = stacked_window(max(cumulative_data, default=None), window_days)
+    dates = sorted(d for d in cumulative_data if start is None or d >= start)
+    table = daily_data.between(start, end).volume_table().reindex(dates).dropna(axis=1, how="all").fillna(0)
+    volumes = table.to_numpy(dtype=float)
+    cumulative = np.array([cumulative_data[d] for d in dates], dtype=float)
 
-# 加入 github_utils：for log 檔案的 load/save
-try:
-    from github_utils import load_json_from_github, save_json_to_github
-except ImportError:
-    # 若未使用 github 直接運行，fallback 用本地
-    load_json_from_github = None
-    save_json_to_github = None
+    days = np.array(dates, dtype="datetime64[D]")
+    period, labels = "日", np.array(dates, dtype=str)
+    if len(dates) > max_bars:
+        # 1970-01-01 是週四：(天數 + 3) % 7 = 距週一的天數
+        keys = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+        period, labels = "週", np.datetime_as_string(keys, unit="D")
+        if len(np.unique(keys)) > max_bars:
+            keys = days.astype("datetime64[M]")
+            period, labels = "月", np.datetime_as_string(keys, unit="M")
+        labels, first, group = np.unique(labels, return_index=True, return_inverse=True)
+        summed = np.zeros((len(labels), volumes.shape[1]))
+        np.add.at(summed, group, volumes)
+        last = np.append(first[1:], len(dates)) - 1    # 日期已排序，每組最後一筆即為期末讀值
+        volumes, cumulative = summed, cumulative[last]
+    return list(labels), list(table.columns), volumes, cumulative, period
 
 class BiogasAnalyzer:
-    def __init__(self, curve_json_dict):
-        # 標準曲線（本地存取）
-        self.curves = {}
-        for tank, curve_json_path in curve_json_dict.items():
-            with open(curve_json_path, 'r') as f:
-                self.curves[tank] = json.load(f)
+    def __init__(self, curve_json_dict, storage=None):
+        self.storage = storage if storage is not None else get_storage()
+        # 標準曲線向共用的 curve_registry 借用，建構時不讀檔；雲端曲線更新後 registry 會自動換新
+        self.curve_paths = dict(curve_json_dict)
 
-    def analyze(self, start_dates, today_str, total_gas, cumulative_log_path=None, is_cumulative=True):
-        today = datetime.strptime(today_str, "%Y-%m-%d").date()
+    @property
+    def curves(self):
+        # {槽: Curve}
+        by_path = curve_registry.get_many(list(self.curve_paths.values()), self.storage)
+        return {tank: by_path[path] for tank, path in self.curve_paths.items()}
+
+    def analyze(self, start_dates, today_str, total_gas, cumulative_log_path=None, is_cumulative=True, baseline=None):
+        # baseline：已載入的累積讀值 SortedDateLog（連續分析多天時重複使用）；未給時從 storage 讀
 
         last_cumulative = 0.0
-        # 累積資料從 github 取
-        if is_cumulative and cumulative_log_path and load_json_from_github is not None:
+        # 累積資料從 storage 取（只讀當月 / 前幾個月的分片）
+        if is_cumulative and baseline is not None:
+            last_day, value = baseline.prior(today_str)
+            if last_day is not None:
+                last_cumulative = value
+        elif is_cumulative and cumulative_log_path:
             try:
-                log = load_json_from_github(cumulative_log_path)
-                prior_dates = [d for d in log.keys() if d < today_str]
-                if prior_dates:
-                    last_day = max(prior_dates)
-                    last_cumulative = log.get(last_day, 0.0)
+                last_day, value = open_log(cumulative_log_path, self.storage).prior(today_str)
+                if last_day is not None:
+                    last_cumulative = value
             except Exception:
                 last_cumulative = 0.0
-        else:
-            # fallback 本地
-            if is_cumulative and cumulative_log_path and os.path.exists(cumulative_log_path):
-                with open(cumulative_log_path, 'r') as f:
-                    log = json.load(f)
-                prior_dates = [d for d in log.keys() if d < today_str]
-                if prior_dates:
-                    last_day = max(prior_dates)
-                    last_cumulative = log.get(last_day, 0.0)
 
         total_gas_today = max(total_gas - last_cumulative, 0)
+        return self._allocate([today_str], np.array([total_gas_today], dtype=float), start_dates)[today_str]
+
+    def analyze_range(self, dates, totals, start_dates, cumulative_log_path=None, is_cumulative=True, baseline=None):
+        """
+        多日一次分析：dates × 各槽的天數、曲線取值、正規化加總與產氣分配都以 numpy 陣列一次算完。
+        totals 為與 dates 對應的讀值；回傳 {日期: analyze() 相同格式的結果}。
+        累積讀值的「前一筆」取 log 中與本次 totals 合併後、嚴格早於該日的最後一筆（與輸入順序無關）。
+        baseline 可傳入已載入的 SortedDateLog 重複使用，本次 totals 會併入其中。
+        """
+        dates = [str(d) for d in dates]
+        totals = np.asarray(totals, dtype=float)
+
+        # 每一天扣掉前一筆累積讀值
+        previous = np.zeros(len(dates))
+        if is_cumulative and (baseline is not None or cumulative_log_path) and dates:
+            if baseline is None:
+                try:
+                    baseline = open_log(cumulative_log_path, self.storage).sorted_index(min(dates), max(dates))
+                except Exception:
+                    baseline = SortedDateLog()
+            baseline.update(zip(dates, totals.tolist()))
+            previous = np.array([baseline.prior(d)[1] or 0.0 for d in dates], dtype=float)
+        gas_today = np.maximum(totals - previous, 0)
 
-        result = {}
-        norm_sum = 0
-        for tank, start_date_str in start_dates.items():
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            days = (today - start_date).days + 1
-            curve = self.curves[tank]
-            yield_list = curve.get("normalized_yield", [])
-
-            if days < 1:
-                norm = 0
-                stage = f"尚未啟動（提前 {abs(days)} 天）"
-            elif days > len(yield_list):
-                norm = 0
-                stage = f"結束期（已超出試程 {days - len(yield_list)} 天）"
-            else:
-                norm = yield_list[days - 1]
-                stage = self._get_stage(days)
-
-            result[tank] = {
-                "day": days,
-                "normalized": norm,
-                "start_date": str(start_date),
-                "stage": stage
-            }
-            norm_sum += norm
-
-        for tank in result:
-            norm = result[tank]["normalized"]
-            volume = round(norm / norm_sum * total_gas_today, 2) if norm_sum > 0 else 0
-            result[tank]["volume"] = volume
-
-        return result
+        return self._allocate(dates, gas_today, start_dates)
+
+    def _allocate(self, dates, gas_today, start_dates):
+        """
+        各槽狀態以陣列表示（啟動日 day number、曲線編號），dates × 槽 的天數、曲線取值、
+        正規化加總與產氣分配都是陣列運算；曲線表只依「不重複的曲線」建一次，槽數多時共用同一列。
+        """
+        tanks = list(start_dates)
+        day_nums = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+        starts = np.array([start_dates[t] for t in tanks], dtype="datetime64[D]").astype(np.int64)
+        curve_paths, curve_ids = np.unique([self.curve_paths[t] for t in tanks], return_inverse=True)
+        curve_ids = curve_ids.reshape(-1)
+        by_path = curve_registry.get_many(curve_paths.tolist(), self.storage)
+        yields = [by_path[p].normalized for p in curve_paths.tolist()]
+
+        # 曲線表：每條曲線一列，最後一格固定為 0（超出曲線範圍的天數都指向這一格）
+        curve_lengths = np.array([len(y) for y in yields], dtype=np.int64)
+        table = np.zeros((len(yields), curve_lengths.max(initial=0) + 1))
+        for i, y in enumerate(yields):
+            table[i, :len(y)] = y
+        lengths = curve_lengths[curve_ids]
+
+        days = day_nums[:, None] - starts[None, :] + 1
+        in_curve = (days >= 1) & (days <= lengths[None, :])
+        norm = table[curve_ids[None, :], np.where(in_curve, days - 1, table.shape[1] - 1)]
+        norm_sum = norm.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = np.where(norm_sum[:, None] > 0, norm / norm_sum[:, None] * gas_today[:, None], 0.0)
+
+        results = {}
+        start_strs = [str(np.datetime64(int(s), "D")) for s in starts]
+        for i, d in enumerate(dates):
+            result = {}
+            for j, tank in enumerate(tanks):
+                day = int(days[i, j])
+                if day < 1:
+                    stage = f"尚未啟動（提前 {abs(day)} 天）"
+                elif day > lengths[j]:
+                    stage = f"結束期（已超出試程 {day - int(lengths[j])} 天）"
+                else:
+                    stage = self._get_stage(day)
+                result[tank] = {
+                    "day": day,
+                    "normalized": float(norm[i, j]) if in_curve[i, j] else 0,
+                    "start_date": start_strs[j],
+                    "stage": stage,
+                    "volume": round(float(share[i, j]), 2) if norm_sum[i] > 0 else 0,
+                }
+            results[d] = result
+        return results
 
     def _get_stage(self, day):
         if day <= 3:
@@ -101,11 +177,12 @@ class BiogasAnalyzer:
         else:
             return f"結束期（已超出試程 {day - 14} 天）"
 
-    def plot_cumulative(self, cumulative_data: dict, active_tanks: dict, save_path: str = "cumulative_plot.png"):
+    def plot_cumulative(self, cumulative_data: dict, active_tanks: dict):
         dates = sorted(cumulative_data.keys())
         values = [cumulative_data[d] for d in dates]
 
-        fig, ax = plt.subplots(figsize=(10, 5))
+        fig = new_figure(figsize=(10, 5))
+        ax = fig.subplots()
         ax.plot(dates, values, marker='o', color='blue')
         for x, y in zip(dates, values):
             ax.annotate(f"{int(y)}", xy=(x, y), xytext=(0, 8), textcoords='offset points',
@@ -117,21 +194,16 @@ class BiogasAnalyzer:
         ax.set_ylabel("累積產氣量 m³", fontsize=14)
         ax.tick_params(axis='x', rotation=45)
         ax.grid(True)
-        plt.tight_layout()
-        plt.savefig(save_path)
-        plt.close(fig)
-        try:
-            from github_utils import push_png_to_github
-            remote_name = f"figures/{os.path.basename(save_path)}"
-            push_png_to_github(save_path, remote_name, commit_msg="每日累積沼氣量趨勢圖")
-        except Exception as e:
-            print(f"[WARNING] push_png_to_github 失敗: {e}")
-        return save_path
-
-    def plot_daily_distribution(self, result: dict, date_str: str, save_path: str = "daily_distribution.png"):
+        fig.tight_layout()
+        return figure_png(fig)
+
+    def plot_daily_distribution(self, result: dict, date_str: str):
+        import matplotlib
+        import pandas as pd
         df = pd.DataFrame(result).T.reset_index(names="Tank")
-        fig, ax = plt.subplots(figsize=(8, 6))
-        colors = plt.cm.Set2(np.arange(len(df)))
+        fig = new_figure(figsize=(8, 6))
+        ax = fig.subplots()
+        colors = matplotlib.colormaps["Set2"](np.arange(len(df)))
         # ==== 專業單一 bar 畫法 ====
         if len(df) == 1:
             # 只剩一槽，手動設 x 軸為 0
@@ -157,126 +229,96 @@ class BiogasAnalyzer:
         ax.set_ylabel("預估產氣量 m³", fontsize=14)
         ax.set_title(f"{date_str} 各槽預估產氣量", fontsize=16)
         ax.tick_params(labelsize=12)
-        plt.tight_layout()
-        plt.savefig(save_path)
-        plt.close(fig)
-        # 這一段是重點
-        try:
-            from github_utils import push_png_to_github
-            remote_name = f"figures/{os.path.basename(save_path)}"
-            push_png_to_github(save_path, remote_name, commit_msg=f"{date_str} 每日產氣分布圖")
-        except Exception as e:
-            print(f"[WARNING] push_png_to_github 失敗: {e}")
-        return save_path
+        fig.tight_layout()
+        return figure_png(fig)
 
 
 
-    def plot_stacked_estimation_and_cumulative(self, daily_data: dict, cumulative_data: dict, active_tanks: dict, save_path: str = "stacked_daily_cumulative.png"):
-        dates = sorted(cumulative_data.keys())
-        df_est = pd.DataFrame(index=dates)
-        for date in dates:
-            tanks = daily_data.get(date, [])
-            for entry in tanks:
-                tank = entry['Tank']
-                df_est.at[date, tank] = entry['volume']
-        df_est = df_est.fillna(0)
-
-        fig, ax1 = plt.subplots(figsize=(14, 6))
-        tank_colors = plt.cm.Set3.colors
-        bars = df_est.plot(kind='bar', stacked=True, ax=ax1, color=tank_colors[:len(df_est.columns)], edgecolor='black')
-        for i, date in enumerate(df_est.index):
-            y_offset = 0
-            for j, tank in enumerate(df_est.columns):
-                value = df_est.loc[date, tank]
-                if value > 0:
-                    y = y_offset + value / 2
-                    ax1.text(i, y, f"{value:.1f}", ha='center', va='center', fontsize=12, weight='bold')
-                    y_offset += value
+    def plot_stacked_estimation_and_cumulative(self, daily_data, cumulative_data: dict, active_tanks: dict,
+                                               window_days=STACKED_WINDOW_DAYS):
+        import matplotlib
+        # daily_data 可為 DailyColumns 欄式快照，或原本的 {日期: [各槽紀錄]}
+        if isinstance(daily_data, dict):
+            daily_data = DailyColumns.from_log(daily_data)
+        labels, tanks, volumes, cumulative, period = stacked_series(daily_data, cumulative_data, window_days)
+        x = np.arange(len(labels))
 
+        fig = new_figure(figsize=(14, 6))
+        ax1 = fig.subplots()
+        tank_colors = matplotlib.colormaps["Set3"].colors
+        bottoms = np.vstack([np.zeros(len(x)), np.cumsum(volumes, axis=1)[:, :-1].T]) if tanks else np.zeros((0, len(x)))
+        for j, tank in enumerate(tanks):
+            ax1.bar(x, volumes[:, j], bottom=bottoms[j], width=0.5, color=tank_colors[j % len(tank_colors)],
+                    edgecolor='black', label=tank)
+
+        # 數值標籤：段數不多時每段標在中間，太多時只標每根 bar 的總量
+        rows, cols = np.nonzero(volumes > 0)
+        if len(rows) <= STACKED_MAX_LABELS:
+            for i, j in zip(rows, cols):
+                ax1.text(i, bottoms[j, i] + volumes[i, j] / 2, f"{volumes[i, j]:.1f}",
+                         ha='center', va='center', fontsize=12, weight='bold')
+        else:
+            totals = volumes.sum(axis=1)
+            for i in np.nonzero(totals > 0)[0]:
+                ax1.text(i, totals[i], f"{totals[i]:.0f}", ha='center', va='bottom', fontsize=10, weight='bold')
 
         ax2 = ax1.twinx()
-        cumulative_values = [cumulative_data.get(d, 0) for d in dates]
-        ax2.plot(dates, cumulative_values, color='blue', marker='o', label='累積產氣量')
-        tank_label = ", ".join([f"{tank}({active_tanks.get(tank, '-')})" for tank in df_est.columns])
+        ax2.plot(x, cumulative, color='blue', marker='o', label='累積產氣量')
+        step = max(1, -(-len(x) // STACKED_MAX_TICKS))
+        ax1.set_xticks(x[::step])
+        ax1.set_xticklabels(labels[::step], rotation=45, ha='right')
+        ax1.set_xlim(-0.5, len(x) - 0.5)
+        tank_label = ", ".join([f"{tank}({active_tanks.get(tank, '-')})" for tank in tanks])
+        span = f"（{labels[0]} ~ {labels[-1]}，每{period}）" if labels else ""
         ax1.set_xlabel("日期", fontsize=14)
-        ax1.set_ylabel("預估產氣量 m³", color='black', fontsize=16)
+        ax1.set_ylabel(f"{'預估產氣量' if period == '日' else f'每{period}產氣量'} m³", color='black', fontsize=16)
         ax2.set_ylabel("累積產氣量 m³", color='blue', fontsize=16)
-        ax1.set_title(f"每日預估產氣 + 累積產氣量疊加圖\n運轉槽: {tank_label}", fontsize=20, weight='bold')
-        ax1.tick_params(axis='x', labelrotation=45, labelsize=12)
+        ax1.set_title(f"每日預估產氣 + 累積產氣量疊加圖{span}\n運轉槽: {tank_label}", fontsize=20, weight='bold')
+        ax1.tick_params(axis='x', labelsize=12)
         ax1.tick_params(axis='y', labelsize=12)
         ax2.tick_params(axis='y', labelsize=12)
-        ax1.legend(title="槽別", fontsize=12, loc="center left", bbox_to_anchor=(0.03, 0.88))
-        plt.tight_layout()
-        plt.savefig(save_path)
-        plt.close(fig)
-        try:
-            from github_utils import push_png_to_github
-            remote_name = f"figures/{os.path.basename(save_path)}"
-            push_png_to_github(save_path, remote_name, commit_msg="每日疊加圖")
-        except Exception as e:
-            print(f"[WARNING] push_png_to_github 失敗: {e}")
-        return save_path
+        if tanks:
+            ax1.legend(title="槽別", fontsize=12, loc="center left", bbox_to_anchor=(0.03, 0.88))
+        fig.tight_layout()
+        return figure_png(fig)
 
 
-    # --------- 這裡開始是 github 版 json 寫入 ---------
+    # --------- 這裡開始是 log json 寫入（經由 storage） ---------
     def update_cumulative_log(self, log_path: str, today: str, gas_value: float):
-        if load_json_from_github is not None:
-            try:
-                cumulative_data = load_json_from_github(log_path)
-            except Exception:
-                cumulative_data = {}
-            cumulative_data[today] = gas_value
-            save_json_to_github(log_path, cumulative_data)
-        else:
-            # fallback
-            if os.path.exists(log_path):
-                with open(log_path, "r") as f:
-                    cumulative_data = json.load(f)
-            else:
-                cumulative_data = {}
-            cumulative_data[today] = gas_value
-            with open(log_path, "w") as f:
-                json.dump(cumulative_data, f, indent=2)
-        return cumulative_data
+        # 只重寫 today 所在月份的分片
+        open_log(log_path, self.storage).set(today, gas_value, f"記錄 {today} 累積產氣量")
 
     def reset_cumulative_log(self, log_path: str):
-        if save_json_to_github is not None:
-            save_json_to_github(log_path, {})
-            return {}
-        else:
-            with open(log_path, "w") as f:
-                json.dump({}, f, indent=2)
-            return {}
-
-    def run_cumulative_pipeline(self, log_path: str, today: str, gas_value: float, active_tanks: dict, save_path: str = "cumulative_plot.png"):
-        if load_json_from_github is not None:
-            cumulative_data = self.update_cumulative_log(log_path, today, gas_value)
-            return self.plot_cumulative(cumulative_data, active_tanks, save_path)
-        else:
-            # fallback 本地
-            cumulative_data = self.update_cumulative_log(log_path, today, gas_value)
-            return self.plot_cumulative(cumulative_data, active_tanks, save_path)
+        open_log(log_path, self.storage).clear("歸零累積紀錄")
+        return {}
 
-    def run_stacked_pipeline(self, daily_log_path: str, cumulative_log_path: str, active_tanks: dict, save_path: str = "stacked_daily_cumulative.png"):
-        if load_json_from_github is not None:
-            try:
-                daily_data = load_json_from_github(daily_log_path)
-            except Exception:
-                daily_data = {}
-            try:
-                cumulative_data = load_json_from_github(cumulative_log_path)
-            except Exception:
-                cumulative_data = {}
-        else:
-            # fallback
-            if os.path.exists(daily_log_path):
-                with open(daily_log_path, "r") as f:
-                    daily_data = json.load(f)
-            else:
-                daily_data = {}
-            if os.path.exists(cumulative_log_path):
-                with open(cumulative_log_path, "r") as f:
-                    cumulative_data = json.load(f)
-            else:
-                cumulative_data = {}
-        return self.plot_stacked_estimation_and_cumulative(daily_data, cumulative_data, active_tanks, save_path)
+    def run_cumulative_pipeline(self, log_path: str, today: str, gas_value: float, active_tanks: dict, remote_path=None):
+        # remote_path：同時把圖寫到 storage；資料沒變時由圖檔快取命中，不重畫也不寫入
+        log = open_log(log_path, self.storage)
+        log.set(today, gas_value, f"記錄 {today} 累積產氣量")
+        cumulative_data = log.load_all()
+        if remote_path is None:
+            return self.plot_cumulative(cumulative_data, active_tanks)
+        return self._render_cached(remote_path, cumulative_job(cumulative_data, active_tanks))
+
+    def run_stacked_pipeline(self, daily_log_path: str, cumulative_log_path: str, active_tanks: dict, remote_path=None):
+        # 先以最後一筆累積讀值定出顯示範圍，只讀範圍內的月份（累積讀值另含範圍前一筆當基準）
+        start = None
+        try:
+            cumulative_log = open_log(cumulative_log_path, self.storage)
+            start, _ = stacked_window(cumulative_log.latest()[0])
+            cumulative_data = dict(SortedDateLog.from_log(cumulative_log, start).items())
+        except Exception:
+            cumulative_data = {}
+        try:
+            daily_data = open_log(daily_log_path, self.storage).load_columns(start)
+        except Exception:
+            daily_data = DailyColumns.from_log({})
+        if remote_path is None:
+            return self.plot_stacked_estimation_and_cumulative(daily_data, cumulative_data, active_tanks)
+        return self._render_cached(remote_path, stacked_job(daily_data, cumulative_data, active_tanks))
+
+    def _render_cached(self, remote_path, job):
+        png, _ = render_figures(self.storage, [(remote_path, job)],
+                                commit_msg=f"更新圖檔 {os.path.basename(remote_path)}")[0]
+        return png
@@ -0,0 +1,209 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from storage import get_storage
+from log_store import open_log, DAILY_RESULT_LOG, CUMULATIVE_LOG
+from curve_registry import curve_registry
+
+# === 標準曲線批次校正（非負最小平方法） ===
+# 只量得到總產氣，各槽產氣量是用固定的 normalized 曲線分出來的；累積讀值夠多之後可以反過來擬合曲線本身：
+#   每兩筆相鄰累積讀值之間的產氣 y_r = 該區間內每一天、每個運轉中的槽「依曲線第 k 天的產氣」之和
+#   未知數 b[曲線, k] = 使用該曲線的槽在第 k 天的產氣（m³/天），需 >= 0
+#   設計矩陣 X[r, (曲線, k)] = 區間 r 內處於第 k 天、使用該曲線的「槽 × 天」數
+# 解法（numpy 實作的 Lawson–Hanson NNLS，不另外依賴 scipy）：
+#   1. 先只擬合每條曲線的整體尺度 s（曲線形狀不變），得到先驗 s × normalized
+#   2. 再逐日擬合 b，並加上 prior_weight 筆「b = 先驗」的虛擬觀測，資料少或沒觀測到的天數會停在先驗附近
+# 區間內各槽的啟動日取區間結束日在 daily_result_log 的紀錄（當時實際的啟動日），沒有紀錄時才用目前的 user_config。
+# 擬合結果以原本的曲線 json 格式輸出為 curves/<原檔名>_fitted.json（不覆蓋原曲線）。
+PRIOR_WEIGHT = 1.0
+FITTED_SUFFIX = "_fitted"
+
+
+def nnls(A, b, max_iter=None, tol=None):
+    # Lawson–Hanson 主動集法：min ||A x - b||，x >= 0
+    m, n = A.shape
+    x = np.zeros(n)
+    passive = np.zeros(n, dtype=bool)
+    tol = tol if tol is not None else 10 * np.finfo(float).eps * np.abs(A).sum(axis=0).max(initial=0) * max(m, n)
+    w = A.T @ b
+    for _ in range(max_iter or 3 * n):
+        if passive.all() or np.where(passive, -np.inf, w).max() <= tol:
+            break
+        passive[np.argmax(np.where(passive, -np.inf, w))] = True
+        while True:
+            z = np.zeros(n)
+            z[passive] = np.linalg.lstsq(A[:, passive], b, rcond=None)[0]
+            if not passive.any() or z[passive].min() > 0:
+                break
+            # 有係數變成 <= 0：沿 x → z 走到第一個碰到 0 的位置，把它移回主動集
+            neg = passive & (z <= 0)
+            alpha = np.min(x[neg] / (x[neg] - z[neg]))
+            x = x + alpha * (z - x)
+            passive &= x > tol
+            x[~passive] = 0
+        x = z
+        w = A.T @ (b - A @ x)
+    return x
+
+
+class Design:
+    """設計矩陣與觀測：X (區間 × 曲線係數)、y (區間產氣)，以及各曲線在 X 中的欄位範圍。"""
+
+    def __init__(self, X, y, intervals, curves, offsets):
+        self.X = X
+        self.y = y
+        self.intervals = intervals      # [(區間起日, 區間迄日)]
+        self.curves = curves            # [Curve]
+        self.offsets = offsets          # 第 i 條曲線佔 X[:, offsets[i]:offsets[i + 1]]
+
+    def block(self, i):
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+
+def build_design(cumulative, daily_log, user_config, assignment, storage=None):
+    """
+    cumulative : {日期: 累積讀值}（依日期排序）
+    daily_log  : {日期: [各槽紀錄]}（取每個讀值日當時的運轉槽與啟動日）
+    """
+    dates = sorted(cumulative)
+    values = np.array([cumulative[d] for d in dates], dtype=float)
+    day_nums = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+    fallback = {t: c["start_date"] for t, c in user_config.items() if c.get("run") and c.get("start_date")}
+    paths = sorted({assignment[t] for t in set(fallback) | {r.get("Tank") for d in dates for r in daily_log.get(d, [])}
+                    if t in assignment})
+    by_path = curve_registry.get_many(paths, storage)
+    curves = [by_path[p] for p in paths]
+    curve_index = {p: i for i, p in enumerate(paths)}
+    offsets = np.concatenate([[0], np.cumsum([len(c) for c in curves])]).astype(np.int64)
+
+    rows, cols, y, intervals = [], [], [], []
+    for r in range(1, len(dates)):
+        gas = values[r] - values[r - 1]
+        if gas < 0:
+            continue    # 讀值倒退（換表 / 歸零），不是產氣
+        entries = daily_log.get(dates[r])
+        starts = {e["Tank"]: e["start_date"] for e in entries if e.get("start_date")} if entries else fallback
+        days = np.arange(day_nums[r - 1] + 1, day_nums[r] + 1)
+        row = len(y)
+        for tank, start in starts.items():
+            if tank not in assignment:
+                continue
+            c = curve_index[assignment[tank]]
+            ages = days - np.datetime64(start, "D").astype(np.int64) + 1
+            ages = ages[(ages >= 1) & (ages <= len(curves[c]))]
+            rows.append(np.full(len(ages), row))
+            cols.append(offsets[c] + ages - 1)
+        y.append(gas)
+        intervals.append((dates[r - 1], dates[r]))
+
+    X = np.zeros((len(y), int(offsets[-1])))
+    if rows:
+        np.add.at(X, (np.concatenate(rows), np.concatenate(cols)), 1.0)
+    return Design(X, np.array(y, dtype=float), intervals, curves, offsets)
+
+
+def calibrate(design, prior_weight=PRIOR_WEIGHT):
+    """回傳 {曲線路徑: {"raw", "normalized", "scale", "observed"}} 與擬合前後的 RMS 殘差。"""
+    X, y = design.X, design.y
+    prior = np.concatenate([c.normalized for c in design.curves]) if design.curves else np.zeros(0)
+
+    # 1. 每條曲線的整體尺度
+    Xs = np.stack([X[:, design.block(i)] @ c.normalized for i, c in enumerate(design.curves)], axis=1) \
+        if design.curves else np.zeros((len(y), 0))
+    scale = nnls(Xs, y)
+    target = np.concatenate([np.full(len(c), s) for c, s in zip(design.curves, scale)]) * prior if len(prior) else prior
+
+    # 2. 逐日係數，加上 prior_weight 筆「b = s × normalized」的虛擬觀測
+    k = np.sqrt(prior_weight)
+    A = np.vstack([X, k * np.eye(X.shape[1])])
+    b = np.concatenate([y, k * target])
+    coef = nnls(A, b)
+
+    fitted = {}
+    for i, curve in enumerate(design.curves):
+        raw = coef[design.block(i)]
+        peak = raw.max(initial=0)
+        fitted[curve.path] = {
+            "raw": raw,
+            "normalized": raw / peak if peak > 0 else np.asarray(curve.normalized),
+            "scale": float(scale[i]),
+            "observed": int((X[:, design.block(i)].sum(axis=0) > 0).sum()),
+        }
+    rms = lambda residual: float(np.sqrt(np.mean(residual ** 2))) if len(residual) else 0.0
+    return fitted, rms(Xs @ scale - y), rms(X @ coef - y)
+
+
+def fitted_path(path, suffix=FITTED_SUFFIX):
+    # curves/a.json → curves/a_fitted.json；已經是擬合曲線時覆寫同一檔（每晚重跑不會一直加後綴）
+    stem, ext = os.path.splitext(path)
+    return path if stem.endswith(suffix) else f"{stem}{suffix}{ext}"
+
+
+def curve_json(curve, fit, design):
+    first, last = (design.intervals[0][0], design.intervals[-1][1]) if design.intervals else ("", "")
+    name = curve.name if curve.name.endswith(FITTED_SUFFIX) else f"{curve.name}{FITTED_SUFFIX}"
+    return {
+        "name": name,
+        "description": f"由 {curve.name} 以 {first} ~ {last} 共 {len(design.y)} 筆累積讀值 NNLS 校正"
+                       f"（有觀測 {fit['observed']}/{len(curve)} 天）",
+        "days": [int(d) for d in curve.days],
+        "normalized_yield": np.round(fit["normalized"], 6).tolist(),
+        "raw_yield": np.round(fit["raw"], 3).tolist(),
+    }
+
+
+def run_calibration(storage=None, start=None, end=None, prior_weight=PRIOR_WEIGHT, write=True, assign=False):
+    """
+    讀取 start ~ end 的累積讀值與每日結果，擬合所有使用中的曲線。
+    write：寫入 curves/<名稱>_fitted.json；assign：同時把 curve_assignment 改指向擬合後的曲線（同一個 commit）。
+    回傳 {原曲線路徑: 擬合後的曲線 json}。
+    """
+    storage = storage if storage is not None else get_storage()
+    cumulative_log = open_log(CUMULATIVE_LOG, storage)
+    cumulative = cumulative_log.load_range(start, end)
+    if start:
+        d, value = cumulative_log.prior(start)
+        if d is not None:
+            cumulative[d] = value
+    daily_log = open_log(DAILY_RESULT_LOG, storage).load_range(start, end)
+    assignment = storage.get_json("curve_assignment.json")
+
+    design = build_design(dict(sorted(cumulative.items())), daily_log, storage.get_json("user_config.json"), assignment, storage)
+    fitted, rms_before, rms_after = calibrate(design, prior_weight)
+    print(f"[INFO] 校正 {len(design.y)} 筆讀值、{design.X.shape[1]} 個曲線係數；RMS 殘差 {rms_before:.2f} → {rms_after:.2f} m³")
+
+    results = {curve.path: curve_json(curve, fitted[curve.path], design) for curve in design.curves}
+    if write and results:
+        renamed = {path: fitted_path(path) for path in results}
+        with storage.batch(f"標準曲線 NNLS 校正（{len(design.y)} 筆讀值）") as tx:
+            for path, data in results.items():
+                tx.put_json(renamed[path], data)
+            if assign:
+                def point_to_fitted(mapping):
+                    for tank, path in mapping.items():
+                        mapping[tank] = renamed.get(path, path)
+                tx.update_json("curve_assignment.json", point_to_fitted)
+        for path in renamed.values():
+            curve_registry.invalidate(path)
+    return results
+
+
+if __name__ == "__main__":
+    # 每晚排程：python calibration.py --assign
+    parser = argparse.ArgumentParser(description="以累積讀值 NNLS 校正標準曲線")
+    parser.add_argument("--start", help="起始日期 YYYY-MM-DD（預設全部歷史）")
+    parser.add_argument("--end", help="結束日期 YYYY-MM-DD")
+    parser.add_argument("--prior-weight", type=float, default=PRIOR_WEIGHT, help="原曲線相當於幾筆觀測")
+    parser.add_argument("--assign", action="store_true", help="把 curve_assignment 改指向擬合後的曲線")
+    parser.add_argument("--dry-run", action="store_true", help="只計算不寫入")
+    args = parser.parse_args()
+    t0 = time.time()
+    results = run_calibration(start=args.start, end=args.end, prior_weight=args.prior_weight,
+                              write=not args.dry_run, assign=args.assign)
+    for path, data in results.items():
+        print(f"{path} → {fitted_path(path)}：{data['description']}")
+    print(f"[INFO] 完成，耗時 {time.time() - t0:.2f} 秒")
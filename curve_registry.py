@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from storage import StorageBatch, get_storage, content_version, dump_json_bytes
+
+# === 程序共用的標準曲線 registry ===
+# 原本每建一個 BiogasAnalyzer 就把每條曲線 json 重新讀檔、解析一次；
+# Streamlit 的 ensure_curve_local 下載一次後就再也不會發現雲端曲線已更新。
+# 這裡每條曲線只解析一次，存成唯讀 numpy 陣列（含 prefix sum），以路徑與內容版本（git blob sha）為 key：
+#   - 同一條曲線在 BIOGAS_CURVE_TTL 秒內直接共用，不碰 storage
+#   - 超過 TTL 才向 storage 查一次版本（GitHub 只列資料夾），版本變了才重新下載解析
+#   - 本程序透過 put() 寫入的曲線立即生效
+# 快取以 (storage, 路徑) 為 key：傳入不同 storage（例如測試用的 MemoryStorage、calibration 指定的 storage）
+# 不會拿到別的 storage 的曲線；batch 與它底層的 storage 共用同一份快取，版本則向 batch 查（看得到尚未送出的寫入）
+CURVE_TTL = float(os.environ.get("BIOGAS_CURVE_TTL", "30"))
+
+
+def _frozen(values):
+    arr = np.array(values, dtype=float)
+    arr.setflags(write=False)
+    return arr
+
+
+class Curve:
+    """一條標準曲線（唯讀）。normalized[i] 為第 i+1 天的正規化產氣。"""
+
+    def __init__(self, path, raw, version):
+        try:
+            data = json.loads(raw.decode()) if raw else {}
+        except Exception as e:
+            print(f"[WARNING] 曲線 {path} JSON 格式異常：{e}")
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        self.path = path
+        self.raw = raw
+        self.version = version
+        self.name = data.get("name", os.path.splitext(os.path.basename(path))[0])
+        self.description = data.get("description", "")
+        self.normalized = _frozen(data.get("normalized_yield", []))
+        self.days = _frozen(data.get("days", range(1, len(self.normalized) + 1)))
+        self.raw_yield = _frozen(data.get("raw_yield", []))
+        # prefix[k] = 前 k 天 normalized 總和
+        self.prefix = _frozen(np.concatenate([[0.0], np.cumsum(self.normalized)]))
+
+    def __len__(self):
+        return len(self.normalized)
+
+    def window_sum(self, first_day, last_day):
+        # 第 first_day ~ last_day 天（1 起算、含端點）的 normalized 總和，超出曲線的天數以 0 計；可傳入陣列
+        n = len(self)
+        lo = np.clip(np.asarray(first_day) - 1, 0, n)
+        hi = np.clip(np.asarray(last_day), 0, n)
+        return self.prefix[hi] - self.prefix[np.minimum(lo, hi)]
+
+
+def _cache_owner(storage):
+    # batch 是一次性的物件，改用它最底層的 storage 當快取的 key
+    return storage.outermost.backend if isinstance(storage, StorageBatch) else storage
+
+
+class CurveRegistry:
+    def __init__(self, storage=None, ttl=CURVE_TTL):
+        self._storage = storage
+        self.ttl = ttl
+        self._curves = {}        # (storage, path) -> Curve
+        self._checked = {}       # (storage, path) -> 上次確認版本的時間
+        self._lock = threading.Lock()
+
+    @property
+    def storage(self):
+        # 未指定時跟著目前的 storage 設定（set_storage 之後也會生效）
+        return self._storage if self._storage is not None else get_storage()
+
+    def get(self, path, storage=None):
+        return self.get_many([path], storage)[path]
+
+    def get_many(self, paths, storage=None):
+        # 一次取多條曲線；需要確認版本的路徑合併成一次 versions() 查詢
+        # storage：曲線從哪個 storage 讀（分析器 / 校正傳入自己的 storage），未給時用 registry 的預設
+        storage = storage if storage is not None else self.storage
+        owner = _cache_owner(storage)
+        now = time.monotonic()
+        with self._lock:
+            result = {p: self._curves[owner, p] for p in paths
+                      if (owner, p) in self._curves and now - self._checked.get((owner, p), float("-inf")) < self.ttl}
+        stale = sorted(set(paths) - set(result))
+        if not stale:
+            return result
+        versions = storage.versions(stale)
+        for path in stale:
+            with self._lock:
+                curve = self._curves.get((owner, path))
+            if curve is None or curve.version != versions[path]:
+                curve = self._load(storage, path, versions[path])
+            with self._lock:
+                self._curves[owner, path] = curve
+                self._checked[owner, path] = now
+            result[path] = curve
+        return result
+
+    def _load(self, storage, path, version):
+        if version is None and os.path.exists(path):
+            # storage 上沒有，但本地有（例如 repo 內附的曲線）
+            with open(path, "rb") as f:
+                raw = f.read()
+            return Curve(path, raw, content_version(raw))
+        raw, version = storage.read_versioned(path)
+        return Curve(path, raw, version)
+
+    def put(self, path, data, commit_msg=None, storage=None):
+        # 寫入 storage 並立即換上新曲線
+        storage = storage if storage is not None else self.storage
+        raw = dump_json_bytes(data)
+        storage.put_json(path, data, commit_msg or f"更新標準曲線 {path}")
+        curve = Curve(path, raw, content_version(raw))
+        owner = _cache_owner(storage)
+        with self._lock:
+            self._curves[owner, path] = curve
+            self._checked[owner, path] = time.monotonic()
+        return curve
+
+    def invalidate(self, path=None):
+        # 所有 storage 的同一路徑都會在下次取用時重新確認版本
+        with self._lock:
+            if path is None:
+                self._checked.clear()
+            else:
+                for key in [k for k in self._checked if k[1] == path]:
+                    del self._checked[key]
+
+
+curve_registry = CurveRegistry()
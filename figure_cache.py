@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    # Windows 沒有 flock：只靠程序內的鎖（Windows 上不要讓多個程序共用同一個快取資料夾）
+    fcntl = None
+
+from storage import content_version
+from plot_style import STYLE_VERSION
+
+# === 圖檔內容快取（content-addressed） ===
+# 疊加圖 / 累積圖每次都畫整段歷史；同一個值重輸入、表單重送、重查同一天時，資料其實一模一樣，
+# 卻照樣重畫並多一個 PNG commit。這裡以「job 內容 + STYLE_VERSION」的 sha256 當作圖的 key：
+#   <FIGURE_CACHE_DIR>/<key>.png     畫好的 PNG bytes
+#   <FIGURE_CACHE_DIR>/index.json    {遠端路徑: {"key", "version"}}，記錄每個遠端圖檔目前是哪個 key、其 blob sha
+# 命中條件：索引記錄的 key 相同且本機有 PNG → 不渲染、不寫入、也不查遠端，直接沿用原本的網址。
+# 索引只在寫入 commit 成功後才更新（storage.after_commit），commit 失敗不會留下「已上傳」的假紀錄；
+# 圖檔路徑只由本服務寫入，所以命中時不必再向遠端確認（改用別的 storage / repo 時要清掉快取資料夾）。
+# 未命中時只查這些路徑的遠端版本：與要寫入的內容相同（例如別的程序已上傳同一張圖）就不寫，只補記索引。
+# 多個程序（Streamlit、數個 gunicorn worker）共用同一個快取資料夾：
+#   - 每次查詢前比對索引檔的 (inode, mtime, 大小)，別的程序寫過就重新讀取，不會沿用自己記憶體裡的舊紀錄
+#   - 記錄索引時鎖住 index.lock 重新讀取再合併；若渲染之後別的程序記錄了同一路徑（無法確定誰的 commit 較晚），
+#     改為刪掉該路徑的紀錄，下次取用時由遠端版本判斷
+# 快取只存在本機磁碟，遺失時只是退回重畫，不影響正確性。
+FIGURE_CACHE_DIR = os.environ.get("BIOGAS_FIGURE_CACHE", ".figure_cache")
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+
+
+def job_key(job):
+    # job 是純資料 dict（見 render_service）；bytes 欄位（欄式快照）直接雜湊，其餘以排序後的 json 雜湊
+    h = hashlib.sha256(f"style={STYLE_VERSION}".encode())
+    for name in sorted(job):
+        value = job[name]
+        h.update(b"\0" + name.encode() + b"\0")
+        if isinstance(value, bytes):
+            h.update(value)
+        else:
+            h.update(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode())
+    return h.hexdigest()
+
+
+class FigureCache:
+    def __init__(self, root=FIGURE_CACHE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._index = None
+        self._stamp = None      # 目前記憶體中的索引是讀自哪個版本的索引檔
+
+    def _file(self, name):
+        return os.path.join(self.root, name)
+
+    # --- 本機索引 ---
+    def _index_stamp(self):
+        # 索引檔每次都是寫暫存檔再 rename，inode 會換；再加上 mtime / 大小判斷是否被別的程序改過
+        try:
+            st = os.stat(self._file(INDEX_FILE))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load_index(self):
+        stamp = self._index_stamp()
+        if self._index is None or stamp != self._stamp:
+            try:
+                with open(self._file(INDEX_FILE), encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            self._stamp = stamp
+        return self._index
+
+    def _save_index(self):
+        # 寫到暫存檔再 rename，程序中途被砍也不會留下半個 index
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp, self._file(INDEX_FILE))
+        self._stamp = self._index_stamp()
+
+    @contextmanager
+    def _file_lock(self):
+        # 跨程序的索引鎖（讀-合併-寫期間）
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._file(LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- PNG bytes ---
+    def get_bytes(self, key):
+        try:
+            with open(self._file(f"{key}.png"), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put_bytes(self, key, png):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(tmp, self._file(f"{key}.png"))
+
+    def _record(self, entries, seen):
+        # seen：渲染時索引中這些路徑的紀錄；之後若被別的寫入者換成別的 key，就不確定遠端是誰的圖
+        with self._lock, self._file_lock():
+            index = self._load_index()
+            for path, entry in entries.items():
+                if index.get(path) in (seen.get(path), entry):
+                    index[path] = entry
+                else:
+                    index.pop(path, None)
+            self._save_index()
+
+    def render(self, storage, targets, render, commit_msg=None):
+        """
+        targets: [(遠端路徑, job)]；render(jobs) → [PNG bytes]（只會拿到未命中的 job）
+        未命中的圖寫入 storage（可傳入 storage.batch()，與 json 同一個 commit）。
+        回傳 [(PNG bytes, 是否命中)]，順序與 targets 相同。
+        """
+        targets = list(targets)
+        keys = [job_key(job) for _, job in targets]
+        with self._lock:
+            index = dict(self._load_index())
+
+        # 1. 索引記錄遠端已是同一份內容：不畫、不寫、不查遠端
+        results = [None] * len(targets)
+        for i, ((path, _), key) in enumerate(zip(targets, keys)):
+            if index.get(path, {}).get("key") == key:
+                png = self.get_bytes(key)
+                if png is not None:
+                    results[i] = (png, True)
+
+        # 2. 本機有同樣內容的圖就直接用，其餘才送去渲染
+        missed = [i for i, r in enumerate(results) if r is None]
+        pending = []
+        for i in missed:
+            png = self.get_bytes(keys[i])
+            if png is None:
+                pending.append(i)
+            else:
+                results[i] = (png, False)
+        for i, png in zip(pending, render([targets[i][1] for i in pending]) if pending else []):
+            self.put_bytes(keys[i], png)
+            results[i] = (png, False)
+
+        # 3. 未命中的路徑查一次遠端版本，內容不同才寫入；commit 成功後才記入索引
+        remote = storage.versions([targets[i][0] for i in missed]) if missed else {}
+        entries = {}
+        for i in missed:
+            path, png = targets[i][0], results[i][0]
+            version = content_version(png)
+            if remote.get(path) != version:
+                storage.put_binary(path, png, commit_msg or f"更新圖檔 {path}")
+            entries[path] = {"key": keys[i], "version": version}
+        if entries:
+            seen = {path: index.get(path) for path in entries}
+            storage.after_commit(lambda: self._record(entries, seen))
+        return results
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_figure_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FigureCache()
+        return _cache
+
+
+def _render_inline(jobs):
+    from render_service import render_job
+    return [render_job(job) for job in jobs]
+
+
+def render_figures(storage, targets, render=None, commit_msg=None):
+    # 預設在本程序內渲染；webhook 傳入 render_service.render_many 交給 worker 並行畫
+    return get_figure_cache().render(storage, targets, render or _render_inline, commit_msg)
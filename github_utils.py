@@ -1,7 +1,13 @@
 import requests
 import os
 import base64
+import hashlib
 import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
 
 def get_github_token():
     # 1. 先抓 streamlit secrets
@@ -19,21 +25,161 @@ GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")  # 建議設成 Streamlit Cloud se
 REPO = "antony910911/biogas_2"         # <<== 換成你的 GitHub 使用者名稱
 BRANCH = "main"
 API_URL = f"https://api.github.com/repos/{REPO}/contents"
+GIT_API_URL = f"https://api.github.com/repos/{REPO}/git"
+
+# === 連線設定（可用環境變數調整） ===
+GITHUB_TIMEOUT = float(os.environ.get("GITHUB_TIMEOUT", "15"))          # 單次請求逾時秒數
+GITHUB_MAX_RETRIES = int(os.environ.get("GITHUB_MAX_RETRIES", "3"))     # 5xx / 限流時最多重試次數
+GITHUB_BACKOFF = float(os.environ.get("GITHUB_BACKOFF", "0.5"))         # 指數退避起始秒數
+GITHUB_BACKOFF_MAX = float(os.environ.get("GITHUB_BACKOFF_MAX", "30"))  # 單次等待上限
+RETRY_STATUS = {500, 502, 503, 504}
+
+
+# === 共用連線池：整個 process 共用一個 keep-alive session，避免每次重新 TCP+TLS 握手 ===
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept": "application/vnd.github+json"})
+            _session = session
+        return _session
+
+
+def _auth_headers():
+    return {"Authorization": f"token {GITHUB_TOKEN}"}
+
+
+def _retry_wait(resp, attempt):
+    """
+    回傳需要等待的秒數；None 表示這個回應不該重試。
+    5xx 走指數退避；403/429 只有在 secondary rate limit（有 Retry-After 或剩餘額度為 0）才重試。
+    """
+    backoff = min(GITHUB_BACKOFF * (2 ** attempt), GITHUB_BACKOFF_MAX)
+    if resp.status_code in RETRY_STATUS:
+        return backoff + random.uniform(0, GITHUB_BACKOFF)
+    if resp.status_code in (403, 429):
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), GITHUB_BACKOFF_MAX)
+            except ValueError:
+                return backoff
+        if resp.headers.get("X-RateLimit-Remaining") == "0":
+            reset = resp.headers.get("X-RateLimit-Reset")
+            if reset and reset.isdigit():
+                return min(max(int(reset) - time.time(), 0) + 1, GITHUB_BACKOFF_MAX)
+            return backoff
+    return None
+
+
+def github_request(method, url, headers=None, **kwargs):
+    """
+    所有 GitHub API 呼叫的入口：共用 session、預設 timeout、有上限的指數退避重試。
+    重試用盡時回傳最後一個 response（或丟出最後的連線例外）。
+    """
+    session = get_session()
+    all_headers = _auth_headers()
+    if headers:
+        all_headers.update(headers)
+    kwargs.setdefault("timeout", GITHUB_TIMEOUT)
+    for attempt in range(GITHUB_MAX_RETRIES + 1):
+        try:
+            resp = session.request(method, url, headers=all_headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= GITHUB_MAX_RETRIES:
+                raise
+            wait = min(GITHUB_BACKOFF * (2 ** attempt), GITHUB_BACKOFF_MAX)
+            print(f"[WARNING] GitHub {method} 連線失敗（{e}），{wait:.1f}s 後重試")
+            time.sleep(wait)
+            continue
+        wait = _retry_wait(resp, attempt)
+        if wait is None or attempt >= GITHUB_MAX_RETRIES:
+            return resp
+        print(f"[WARNING] GitHub {method} status {resp.status_code}，{wait:.1f}s 後重試")
+        time.sleep(wait)
+    return resp
+
+# === JSON 讀取快取（ETag 條件式 GET + LRU） ===
+# 同一份 json 在一次指令內、跨指令都會重複讀；快取住內容與 ETag，之後帶 If-None-Match 重新驗證，
+# 304 回應不含內容、也不算 rate limit。
+GITHUB_CACHE_MAX_BYTES = int(os.environ.get("GITHUB_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+GITHUB_CACHE_MAX_ENTRIES = int(os.environ.get("GITHUB_CACHE_MAX_ENTRIES", "256"))
+
+
+class JsonCache:
+    def __init__(self, max_bytes=GITHUB_CACHE_MAX_BYTES, max_entries=GITHUB_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # path -> {"etag", "sha", "text"}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+
+    def put(self, path, etag, sha, text):
+        with self._lock:
+            self._drop(path)
+            self._entries[path] = {"etag": etag, "sha": sha, "text": text}
+            self._bytes += len(text)
+            # 依 LRU 淘汰，直到總大小與筆數都在上限內（至少保留剛放入的這筆）
+            while len(self._entries) > 1 and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate(self, path):
+        with self._lock:
+            self._drop(path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= len(entry["text"])
+
+
+json_cache = JsonCache()
+
+
+def _fresh_copy(entry):
+    # 呼叫端會直接修改讀到的 dict，快取只留解碼後的原文，每次 parse 一份新的物件給呼叫端
+    return json.loads(entry["text"])
+
 
 # === 從 GitHub 讀 JSON 檔 ===
 def load_json_from_github(filename):
     url = f"{API_URL}/{filename}?ref={BRANCH}"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-    resp = requests.get(url, headers=headers)
+    cached = json_cache.get(filename)
+    headers = {"If-None-Match": cached["etag"]} if cached and cached["etag"] else None
+    resp = github_request("GET", url, headers=headers)
+    if resp.status_code == 304 and cached:
+        return _fresh_copy(cached)
     if resp.status_code == 200:
         try:
-            content = resp.json()["content"]
-            content = base64.b64decode(content).decode()
+            payload = resp.json()
+            content = base64.b64decode(payload["content"]).decode()
             data = json.loads(content)
             # ⭐ 防呆：如果不是 dict，直接報警告
             if not isinstance(data, dict):
                 print(f"[WARNING] {filename} 讀取後型別為 {type(data)}，預期應為 dict，自動回傳空字典")
                 return {}
+            json_cache.put(filename, resp.headers.get("ETag"), payload.get("sha"), content)
+            remember_sha(filename, payload.get("sha"))
             return data
         except Exception as e:
             print(f"[WARNING] 讀取 {filename} 時 JSON 格式異常：{e}")
@@ -41,23 +187,167 @@ def load_json_from_github(filename):
     print(f"[WARNING] 下載 {filename} 失敗，status: {resp.status_code}")
     return {}
 
-# === 寫 JSON 檔到 GitHub ===
-def save_json_to_github(filename, data, commit_msg="Update JSON via Streamlit"):
-    url = f"{API_URL}/{filename}"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-    # 先讀 SHA
-    get_resp = requests.get(url, headers=headers)
-    sha = get_resp.json().get("sha") if get_resp.status_code == 200 else None
-    # encode data
-    b64_data = base64.b64encode(json.dumps(data, ensure_ascii=False, indent=2).encode()).decode()
+# === 讀檔並回傳 (內容 bytes, blob sha)，給需要比對版本的讀-改-寫使用；不存在回傳 (None, None) ===
+def load_contents_from_github(filepath):
+    url = f"{API_URL}/{filepath}?ref={BRANCH}"
+    cached = json_cache.get(filepath)
+    headers = {"If-None-Match": cached["etag"]} if cached and cached["etag"] else None
+    resp = github_request("GET", url, headers=headers)
+    if resp.status_code == 304 and cached:
+        return cached["text"].encode(), cached["sha"]
+    if resp.status_code == 200:
+        payload = resp.json()
+        raw = base64.b64decode(payload["content"])
+        remember_sha(filepath, payload.get("sha"))
+        try:
+            json_cache.put(filepath, resp.headers.get("ETag"), payload.get("sha"), raw.decode())
+        except UnicodeDecodeError:
+            pass
+        return raw, payload.get("sha")
+    if resp.status_code == 404:
+        remember_sha(filepath, None)
+        return None, None
+    raise RuntimeError(f"下載 {filepath} 失敗，status: {resp.status_code}")
+
+
+class GitHubConflict(Exception):
+    # 檔案在 GitHub 上的版本已不是呼叫端讀到的版本
+    def __init__(self, paths):
+        super().__init__(f"GitHub 上的檔案已被更新：{', '.join(paths)}")
+        self.paths = list(paths)
+
+
+# === 已知的 blob SHA ===
+# 每次讀取、PUT、批次 commit 都記下檔案目前的 blob sha，寫入時直接帶上，
+# 不必為了拿 sha 先把整個檔案（可能是幾百 KB 的圖檔）下載一次。
+_blob_shas = {}
+_blob_shas_lock = threading.Lock()
+
+
+def git_blob_sha(data):
+    # 與 `git hash-object` 相同的算法，可在本地算出寫入後的 blob sha
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def remember_sha(path, sha):
+    with _blob_shas_lock:
+        if sha:
+            _blob_shas[path] = sha
+        else:
+            _blob_shas.pop(path, None)
+
+
+def known_sha(path):
+    with _blob_shas_lock:
+        return _blob_shas.get(path)
+
+
+# === 整個 repo 的 blob sha 清單（Git trees API） ===
+# contents API 列資料夾最多只回 1000 筆（figures/ 每天多 3 張，大約一年後就查不到 sha），
+# 這裡改用 trees API 一次遞迴列出整個 repo（只有路徑與 sha，不含內容）。
+# 清單以 commit 為 key 快取；本程式自己 commit 成功後直接在清單上套用寫入的 sha，
+# branch 沒有被別人推進時，查 sha 只需要一次 GET ref（commit 時連這次都省掉）。
+_tree_listing = {"commit": None, "shas": {}}
+_tree_lock = threading.Lock()
+
+
+def branch_head():
+    resp = github_request("GET", f"{GIT_API_URL}/ref/heads/{BRANCH}")
+    if resp.status_code != 200:
+        raise RuntimeError(f"讀取 branch {BRANCH} 失敗，status: {resp.status_code}")
+    return resp.json()["object"]["sha"]
+
+
+def tree_shas(commit=None):
+    """commit（預設為 branch 最新）時整個 repo 的 {路徑: blob sha}；清單超過 trees API 上限被截斷時回傳 None。"""
+    commit = commit or branch_head()
+    with _tree_lock:
+        if _tree_listing["commit"] == commit:
+            return _tree_listing["shas"]
+    resp = github_request("GET", f"{GIT_API_URL}/trees/{commit}", params={"recursive": "1"})
+    if resp.status_code != 200:
+        raise RuntimeError(f"讀取 tree {commit} 失敗，status: {resp.status_code}")
+    payload = resp.json()
+    if payload.get("truncated"):
+        return None
+    shas = {item["path"]: item["sha"] for item in payload["tree"] if item.get("type") == "blob"}
+    with _tree_lock:
+        _tree_listing.update(commit=commit, shas=shas)
+    return shas
+
+
+def _advance_tree_listing(parent, commit, files):
+    # 自己的 commit 成功：快取若正好是 parent 的清單，套上這次寫入的 sha 即為新 commit 的清單
+    with _tree_lock:
+        if parent and _tree_listing["commit"] == parent:
+            shas = dict(_tree_listing["shas"])
+            shas.update({path: git_blob_sha(data) for path, data in files.items()})
+            _tree_listing.update(commit=commit, shas=shas)
+
+
+def current_shas(paths, commit=None):
+    # 查多個檔案目前的 sha（不存在為 None），順便更新已知 sha
+    paths = list(paths)
+    listing = tree_shas(commit)
+    if listing is None:
+        # repo 大到 trees API 也列不完：逐檔查（條件式 GET，內容沒變時是 304）
+        result = {path: load_contents_from_github(path)[1] for path in paths}
+    else:
+        result = {path: listing.get(path) for path in paths}
+    for path, sha in result.items():
+        remember_sha(path, sha)
+    return result
+
+
+def lookup_sha(path):
+    """
+    輕量查詢：從 trees 清單取單一檔案的 sha（不下載內容）。
+    只在 PUT 發生 409/422 衝突時才呼叫。
+    """
+    return current_shas([path])[path]
+
+
+def put_contents(path, data, commit_msg, sha=None, resolve_conflict=True):
+    """
+    以 contents API 寫入單一檔案，回傳 response。
+    sha 未指定時使用已知的 sha；resolve_conflict=True 時遇到 409/422 會查一次最新 sha 再寫一次（後寫者為準）。
+    resolve_conflict=False 時 sha 即為前提條件（None 表示檔案應不存在），衝突直接回傳給呼叫端處理。
+    """
+    url = f"{API_URL}/{path}"
     body = {
         "message": commit_msg,
-        "content": b64_data,
+        "content": base64.b64encode(data).decode(),
         "branch": BRANCH,
     }
+    if sha is None and resolve_conflict:
+        sha = known_sha(path)
     if sha:
         body["sha"] = sha
-    put_resp = requests.put(url, headers=headers, json=body)
+    put_resp = github_request("PUT", url, json=body)
+    if put_resp.status_code in (409, 422) and resolve_conflict:
+        latest = lookup_sha(path)
+        if latest != sha:
+            if latest:
+                body["sha"] = latest
+            else:
+                body.pop("sha", None)
+            put_resp = github_request("PUT", url, json=body)
+    # 自己寫入後，快取內容已過期；sha 改用 PUT 回應裡的新值
+    json_cache.invalidate(path)
+    if put_resp.status_code in (200, 201):
+        payload = put_resp.json()
+        remember_sha(path, payload["content"]["sha"])
+        commit = payload.get("commit") or {}
+        parents = commit.get("parents") or [{}]
+        _advance_tree_listing(parents[0].get("sha"), commit.get("sha"), {path: data})
+    return put_resp
+
+
+# === 寫 JSON 檔到 GitHub ===
+def save_json_to_github(filename, data, commit_msg="Update JSON via Streamlit"):
+    # encode data
+    raw = json.dumps(data, ensure_ascii=False, indent=2).encode()
+    put_resp = put_contents(filename, raw, commit_msg)
     return put_resp.status_code in [200, 201]
 
 
@@ -71,37 +361,119 @@ def save_json_to_github_subdir(subdir, filename, data, commit_msg="Upload curve
 
 
 def save_binary_to_github(filepath, bin_data, commit_msg="Upload image via Streamlit"):
-    GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
-    REPO = "antony910911/biogas_2"         # <<<<<< 記得替換
-    BRANCH = "main"
-    API_URL = f"https://api.github.com/repos/{REPO}/contents/{filepath}"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
+    put_resp = put_contents(filepath, bin_data, commit_msg)
+    return put_resp.status_code in [200, 201]
 
-    # 查詢 SHA（如有同名檔案）
-    get_resp = requests.get(API_URL, headers=headers)
-    sha = get_resp.json().get("sha") if get_resp.status_code == 200 else None
 
-    b64_data = base64.b64encode(bin_data).decode()
-    body = {
-        "message": commit_msg,
-        "content": b64_data,
-        "branch": BRANCH,
-    }
-    if sha:
-        body["sha"] = sha
-    put_resp = requests.put(API_URL, headers=headers, json=body)
-    return put_resp.status_code in [200, 201]
+# === 從 GitHub 讀二進位檔（圖檔等），不存在回傳 None ===
+def load_binary_from_github(filepath):
+    url = f"{API_URL}/{filepath}?ref={BRANCH}"
+    resp = github_request("GET", url)
+    if resp.status_code == 200:
+        payload = resp.json()
+        remember_sha(filepath, payload.get("sha"))
+        return base64.b64decode(payload["content"])
+    if resp.status_code == 404:
+        remember_sha(filepath, None)
+    else:
+        print(f"[WARNING] 下載 {filepath} 失敗，status: {resp.status_code}")
+    return None
 
 
-def list_curves_on_github(subdir="curves"):
+def list_files_on_github(subdir, suffix=None):
     url = f"{API_URL}/{subdir}?ref={BRANCH}"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-    resp = requests.get(url, headers=headers)
+    resp = github_request("GET", url)
     if resp.status_code == 200:
-        return [item["name"] for item in resp.json() if item["name"].endswith(".json")]
+        items = [item for item in resp.json() if item.get("type", "file") == "file"]
+        for item in items:
+            remember_sha(f"{subdir}/{item['name']}", item.get("sha"))
+        return [item["name"] for item in items if suffix is None or item["name"].endswith(suffix)]
     print("list 失敗:", resp.status_code, resp.text)
     return []
 
+
+def list_curves_on_github(subdir="curves"):
+    return list_files_on_github(subdir, suffix=".json")
+
+# === 多檔單一 commit（Git Data API） ===
+# 一般流程：GET ref → (GET commit 取 tree) → POST blob（僅二進位檔）→ POST tree → POST commit → PATCH ref。
+# 上一次由本程式建立的 commit 若仍是 branch 最新，直接沿用記住的 tree sha，省掉 GET commit。
+GIT_COMMIT_RETRIES = int(os.environ.get("GIT_COMMIT_RETRIES", "3"))
+_last_commit = {"sha": None, "tree": None}
+
+
+def _tree_entry(path, data):
+    try:
+        text = data.decode("utf-8")
+        # 文字檔直接內嵌在 tree 裡，不需另外建 blob
+        return {"path": path, "mode": "100644", "type": "blob", "content": text}
+    except UnicodeDecodeError:
+        resp = github_request("POST", f"{GIT_API_URL}/blobs",
+                              json={"content": base64.b64encode(data).decode(), "encoding": "base64"})
+        if resp.status_code != 201:
+            raise RuntimeError(f"建立 blob {path} 失敗，status: {resp.status_code}")
+        return {"path": path, "mode": "100644", "type": "blob", "sha": resp.json()["sha"]}
+
+
+def commit_files_to_github(files, commit_msg="Batch update", expected_shas=None):
+    """
+    files: {repo 內路徑: bytes}，全部寫進同一個 commit，branch ref 只移動一次。
+    若 ref 更新時 branch 已被別人推進（非 fast-forward），以新的 HEAD 重建 commit 再試。
+    expected_shas: {路徑: 讀取時的 sha（None 表示當時不存在）}；
+    送出前會比對，任何一個已被別人改過就丟出 GitHubConflict，由呼叫端重新合併。
+    """
+    if not files:
+        return True
+    # 只比對這次要寫入的檔案
+    expected_shas = {path: sha for path, sha in (expected_shas or {}).items() if path in files}
+    # blob 與 branch 狀態無關，先建好，重試時不必重傳圖檔
+    entries = [_tree_entry(path, data) for path, data in files.items()]
+    for attempt in range(GIT_COMMIT_RETRIES):
+        ref_resp = github_request("GET", f"{GIT_API_URL}/ref/heads/{BRANCH}")
+        if ref_resp.status_code != 200:
+            print(f"[WARNING] 讀取 branch {BRANCH} 失敗，status: {ref_resp.status_code}")
+            return False
+        head_sha = ref_resp.json()["object"]["sha"]
+        if expected_shas:
+            latest = current_shas(expected_shas, commit=head_sha)
+            stale = [path for path, sha in expected_shas.items() if latest[path] != sha]
+            if stale:
+                raise GitHubConflict(stale)
+        if head_sha == _last_commit["sha"]:
+            base_tree = _last_commit["tree"]
+        else:
+            commit_resp = github_request("GET", f"{GIT_API_URL}/commits/{head_sha}")
+            if commit_resp.status_code != 200:
+                print(f"[WARNING] 讀取 commit {head_sha} 失敗，status: {commit_resp.status_code}")
+                return False
+            base_tree = commit_resp.json()["tree"]["sha"]
+
+        tree_resp = github_request("POST", f"{GIT_API_URL}/trees", json={"base_tree": base_tree, "tree": entries})
+        if tree_resp.status_code != 201:
+            print(f"[WARNING] 建立 tree 失敗，status: {tree_resp.status_code}")
+            return False
+        new_tree = tree_resp.json()["sha"]
+
+        new_commit_resp = github_request("POST", f"{GIT_API_URL}/commits",
+                                         json={"message": commit_msg, "tree": new_tree, "parents": [head_sha]})
+        if new_commit_resp.status_code != 201:
+            print(f"[WARNING] 建立 commit 失敗，status: {new_commit_resp.status_code}")
+            return False
+        new_commit = new_commit_resp.json()["sha"]
+
+        update_resp = github_request("PATCH", f"{GIT_API_URL}/refs/heads/{BRANCH}", json={"sha": new_commit, "force": False})
+        if update_resp.status_code == 200:
+            _last_commit["sha"], _last_commit["tree"] = new_commit, new_tree
+            _advance_tree_listing(head_sha, new_commit, files)
+            for path, data in files.items():
+                json_cache.invalidate(path)
+                remember_sha(path, git_blob_sha(data))
+            return True
+        # 422：branch 在這期間被推進，重新以最新 HEAD 為基底
+        print(f"[WARNING] 更新 branch 失敗（status {update_resp.status_code}），第 {attempt + 1} 次重試")
+    return False
+
+
 def push_png_to_github(local_path, remote_path, commit_msg="Upload figure"):
     # 讀取本地檔案
     with open(local_path, "rb") as f:
@@ -12,10 +12,17 @@ from linebot.models import (
     MessageEvent, TextMessage, ImageMessage, TextSendMessage, ImageSendMessage
 )
 
-from biogas_2 import BiogasAnalyzer
-from github_utils import load_json_from_github, save_json_to_github
-
-from github_utils import save_binary_to_github
+from biogas_2 import BiogasAnalyzer, stacked_window
+from storage import get_storage, StorageWriteError
+from log_store import open_log, DAILY_RESULT_LOG, CUMULATIVE_LOG
+from log_index import get_index
+from recompute import recompute_downstream, is_figure_dirty, clear_figures_dirty, figure_paths
+from planner import plan_from_storage
+from power import load_power
+from adaptation import update_adaptation
+from render_service import get_render_service, daily_distribution_job, stacked_job, cumulative_job
+from figure_cache import render_figures
+from tank_state import TankFleet
 
 
 
@@ -37,29 +44,53 @@ PHOTO_BASE_URL = f"https://raw.githubusercontent.com/{GITHUB_REPO}/{GITHUB_BRANC
 
 
 
-def push_png_to_github(local_path, remote_filename, commit_msg="自動上傳圖檔"):
-    with open(local_path, "rb") as f:
-        img_bytes = f.read()
-    save_binary_to_github(
-        filepath=remote_filename,   # 例如 "figures/2024-06-19_daily_distribution.png"
-        bin_data=img_bytes,
-        commit_msg=commit_msg
-    )
+# 所有 json / 圖檔讀寫都經由 storage 後端（BIOGAS_STORAGE 設定）
+storage = get_storage()
+# 查詢類指令走本機 sqlite 索引；本程序寫入後呼叫 log_index.invalidate()
+log_index = get_index(storage)
+
+
+def render_daily_figures(tx, date_str, result, active_tanks, end=None):
+    # 分布圖 / 疊加圖 / 累積圖 一次送出並行渲染，PNG 直接寫入 tx（與 json 同一個 commit）
+    # 圖表交給常駐的渲染 worker，三張圖同時畫；worker pool 在第一次畫圖時才建立
+    # 資料沒變的圖（重輸入同一個值、重查同一天）由圖檔快取命中：不重畫、不寫入，沿用原本的網址
+    # 累積圖畫整段歷史（每天一個數字）；疊加圖只讀顯示範圍內月份的欄式資料
+    # end：只用到該日為止的資料（重畫歷史日期的圖時傳入，圖與該日當時的狀態一致，不混入之後的讀值）
+    cumulative = open_log(CUMULATIVE_LOG, tx).load_range(None, end)
+    start, _ = stacked_window(max(cumulative, default=None))
+    jobs = [
+        daily_distribution_job(result, date_str),
+        stacked_job(open_log(DAILY_RESULT_LOG, tx).load_columns(start, end), cumulative, active_tanks),
+        cumulative_job(cumulative, active_tanks),
+    ]
+    results = render_figures(tx, zip(figure_paths(date_str), jobs), render=get_render_service().render_many)
+    hits = sum(hit for _, hit in results)
+    if hits:
+        print(f"[INFO] {date_str} 圖檔快取命中 {hits}/{len(results)} 張")
+
+
 
 
 
+def ensure_written():
+    # 背景寫入時，圖檔要先落地 LINE 才抓得到；送出失敗就不能回報成功
+    if not storage.flush():
+        raise StorageWriteError(["背景寫入佇列"])
 
 
 # === 工具函數：取得目前運轉中的槽與啟動日（與 Streamlit 完全同步） ===
+def load_active_fleet():
+    # 各槽狀態載入為陣列（槽數不限），只留 run=True 且有啟動日的槽
+    return TankFleet.from_config(storage.get_json("user_config.json"), storage.get_json("curve_assignment.json")).active()
+
+
 def get_active_tanks():
-    user_config = load_json_from_github("user_config.json")
-    # 只回傳 run=True 的槽與啟動日
-    return {tank: conf["start_date"] for tank, conf in user_config.items() if conf.get("run", False)}
+    return load_active_fleet().start_dates()
 
 # === 工具函數：支援 LINE 下「6/21 A槽 啟動」、「6/25 B槽 結束」 ===
 def handle_tank_event_command(msg):
     import re
-    m = re.match(r"(\d{1,2}/\d{1,2})\s*([ABC])槽\s*(啟動|結束)", msg)
+    m = re.match(r"(\d{1,2}/\d{1,2})\s*(\S+?)槽\s*(啟動|結束)", msg)
     if not m:
         return TextSendMessage(text="❌ 指令格式錯誤，請用 6/21 A槽 啟動")
     dt, tank, op = m.groups()
@@ -68,16 +99,21 @@ def handle_tank_event_command(msg):
         dt_obj = datetime.strptime(f"{y}/{dt}", "%Y/%m/%d").date()
     except Exception:
         return TextSendMessage(text="❌ 日期格式錯誤")
-    user_config = load_json_from_github("user_config.json")
-    tank = tank.upper()
-    if tank not in user_config:
+    # 槽別不限 A/B/C；大小寫不同時對應到既有的槽
+    found = TankFleet.from_config(storage.get_json("user_config.json")).find(tank)
+    if found is None:
         return TextSendMessage(text=f"❌ 查無 {tank} 槽")
-    if op == "啟動":
-        user_config[tank]["run"] = True
-        user_config[tank]["start_date"] = str(dt_obj)
-    else:
-        user_config[tank]["run"] = False
-    save_json_to_github("user_config.json", user_config)
+    tank = found
+
+    def set_tank(user_config):
+        # 只改這一槽的欄位，其他槽同時被修改時不會被覆蓋
+        cfg = user_config.setdefault(tank, {})
+        cfg["run"] = op == "啟動"
+        if op == "啟動":
+            cfg["start_date"] = str(dt_obj)
+
+    storage.update_json("user_config.json", set_tank, f"設定 {tank} 槽{op}")
+    log_index.invalidate()
     return TextSendMessage(text=f"✅ 已設定 {tank} 槽 {'啟動' if op=='啟動' else '結束'}於 {dt_obj}")
 
 # === Home Page (健康檢查用) ===
@@ -120,11 +156,9 @@ def handle_message(event):
         # **2. 然後再做耗時操作（產圖、上傳、分析），最後用 push_message 回傳圖表**
         try:
             replies = handle_today_gas_command(value_str, date_str=date_str)
-            # 找出所有圖片訊息
-            imgs = [msg for msg in replies if isinstance(msg, ImageSendMessage)]
-            # 用 push_message 單獨送圖片
-            for img in imgs:
-                line_bot_api.push_message(event.source.user_id, img)
+            # 結果（成功訊息 + 圖片，或失敗原因）用 push_message 逐則送出
+            for reply in replies:
+                line_bot_api.push_message(event.source.user_id, reply)
         except Exception as e:
             line_bot_api.push_message(event.source.user_id, TextSendMessage(text=f"❌ 圖片產生失敗：{e}"))
         return
@@ -162,6 +196,18 @@ def handle_message(event):
         line_bot_api.reply_message(event.reply_token, reply)
         return
 
+    # 排程建議 [smooth|power]
+    if msg.startswith("排程建議"):
+        reply = handle_schedule_plan_command(msg.replace("排程建議", "").strip())
+        line_bot_api.reply_message(event.reply_token, reply)
+        return
+
+    # 發電潛能 [天數]
+    if msg.startswith("發電潛能"):
+        reply = handle_power_report_command(msg.replace("發電潛能", "").strip())
+        line_bot_api.reply_message(event.reply_token, reply)
+        return
+
     # AI分析
     if msg == "AI分析":
         reply = handle_ai_summary_command()
@@ -198,7 +244,7 @@ def handle_help_command():
         "3️⃣ 傳統登記今日產氣（支援向下相容）：\n"
         "    ➤ 指令：今日產氣 720\n"
         "4️⃣ 啟動/結束紀錄：\n"
-        "    例：6/10 A槽 啟動、6/20 A槽 結束\n"
+        "    例：6/10 A槽 啟動、6/20 2-1槽 結束（槽別依設定，不限 A/B/C）\n"
         "5️⃣ 查詢目前狀態：\n"
         "    ➤ 指令：目前階段\n"
         "6️⃣ 查詢指定日期：\n"
@@ -206,7 +252,11 @@ def handle_help_command():
         "7️⃣ 產氣週報：\n"
         "    ➤ 指令：週報\n"
         "8️⃣ AI 分析摘要：\n"
-        "    ➤ 指令：AI分析"
+        "    ➤ 指令：AI分析\n"
+        "9️⃣ 啟動日排程建議：\n"
+        "    ➤ 指令：排程建議（產氣最平穩）、排程建議 power（發電潛能最穩定）\n"
+        "🔟 發電潛能：\n"
+        "    ➤ 指令：發電潛能（最近 7 天）、發電潛能 30"
     ))
 
 # === 今日產氣指令（直接用 get_active_tanks） ===
@@ -216,44 +266,38 @@ def handle_today_gas_command(value_str, date_str=None):
         if date_str is None:
             date_str = str(date.today())
 
-        # 1. 讀「user_config」→ 取得 active_tanks
-        user_config = load_json_from_github("user_config.json")
-        active_tanks = {tank: conf["start_date"] for tank, conf in user_config.items() if conf.get("run", False)}
-
-        # 2. 讀「curve_assignment」→ 取得 active_mapping
-        full_mapping = load_json_from_github("curve_assignment.json")
-        active_mapping = {k: full_mapping[k] for k in active_tanks if k in full_mapping}
-
-        # 3. BiogasAnalyzer 必須用 active_mapping
-        analyzer = BiogasAnalyzer(active_mapping)
-        result = analyzer.analyze(
-            start_dates=active_tanks,
-            today_str=date_str,
-            total_gas=value,
-            cumulative_log_path="cumulative_gas_log.json",
-            is_cumulative=True
-        )        # ...（略，前段同你的 code）
-
-        history = load_json_from_github("daily_result_log.json")
-        history[date_str] = [
-            dict({"Tank": tank}, **item) for tank, item in result.items()
-        ]
-        save_json_to_github("daily_result_log.json", history, f"記錄 {date_str} 產氣量")
-
-        # （A）先寫入累積 log
-        analyzer.update_cumulative_log("cumulative_gas_log.json", date_str, value)
-
-
-        # （B）再依序產圖（注意要接住回傳的本地圖檔路徑）   
-        daily_dist_path = analyzer.plot_daily_distribution(result, date_str, save_path=f"{date_str}_daily_distribution.png")
-        stacked_path = analyzer.run_stacked_pipeline("daily_result_log.json", "cumulative_gas_log.json", active_tanks, save_path=f"{date_str}_stacked.png")
-        cumulative_path = analyzer.run_cumulative_pipeline("cumulative_gas_log.json", date_str, value, active_tanks, save_path=f"{date_str}_cumulative.png")
-
-        # ==== push 到 github，確保雲端即時可用 ====
-        push_png_to_github(daily_dist_path, f"figures/{date_str}_daily_distribution.png", f"{date_str} daily_distribution")
-        push_png_to_github(stacked_path, f"figures/{date_str}_stacked.png", f"{date_str} stacked")
-        push_png_to_github(cumulative_path, f"figures/{date_str}_cumulative.png", f"{date_str} cumulative")
-
+        # 1~2. 讀「user_config」與「curve_assignment」→ 運轉中的槽（陣列）→ active_tanks / active_mapping
+        fleet = load_active_fleet()
+        active_tanks = fleet.start_dates()
+        active_mapping = fleet.curve_mapping()
+
+        # 3. 之後所有 json 與圖檔寫入都收進同一個 batch，離開 with 時一次 commit
+        with storage.batch(f"記錄 {date_str} 產氣量") as tx:
+            # BiogasAnalyzer 必須用 active_mapping
+            analyzer = BiogasAnalyzer(active_mapping, storage=tx)
+            result = analyzer.analyze(
+                start_dates=active_tanks,
+                today_str=date_str,
+                total_gas=value,
+                cumulative_log_path=CUMULATIVE_LOG,
+                is_cumulative=True
+            )
+
+            open_log(DAILY_RESULT_LOG, tx).set(date_str, [
+                dict({"Tank": tank}, **item) for tank, item in result.items()
+            ])
+            # 產氣尺度線上修正：只併入當天這一筆，不讀歷史
+            update_adaptation(tx, {date_str: result})
+
+            # （A）先寫入累積 log；補登 / 修正過去日期時，下一筆讀值的分配一併重算
+            analyzer.update_cumulative_log(CUMULATIVE_LOG, date_str, value)
+            recompute_downstream(tx, [date_str])
+
+            # （B）再產圖：三張圖並行渲染，圖檔與 json 同一個 commit，確保雲端即時可用
+            render_daily_figures(tx, date_str, result, active_tanks)
+
+        ensure_written()
+        log_index.invalidate()
         imgs = [
             ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{date_str}_daily_distribution.png", preview_image_url=f"{PHOTO_BASE_URL}/{date_str}_daily_distribution.png"),
             ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{date_str}_stacked.png", preview_image_url=f"{PHOTO_BASE_URL}/{date_str}_stacked.png"),
@@ -261,24 +305,44 @@ def handle_today_gas_command(value_str, date_str=None):
         ]
         return [TextSendMessage(text=f"✅ 已記錄 {date_str} 產氣量：{value:.1f} m³")] + imgs
 
+    except StorageWriteError as e:
+        # batch 沒有 commit 成功：json 與圖檔都沒有寫入，不能回覆「已記錄」和圖檔網址
+        log_index.invalidate()
+        return [TextSendMessage(text=f"❌ {date_str} 產氣量寫入失敗，未記錄，請稍後再試一次\n({e})")]
     except Exception as e:
         return [TextSendMessage(text=f"❌ 請輸入正確格式，例如：2025-06-19 720\n({e})")]
 
 
+# === 重算過的日期：查詢時重畫三張圖 ===
+def rerender_figures(date_str, items):
+    tanks = {i["Tank"]: i.get("start_date", "-") for i in items}
+    result = {i["Tank"]: {k: v for k, v in i.items() if k != "Tank"} for i in items}
+    with storage.batch(f"重畫 {date_str} 圖檔") as tx:
+        render_daily_figures(tx, date_str, result, tanks, end=date_str)
+        clear_figures_dirty(tx, [date_str])
+    ensure_written()
+
+
 # === 查詢指定日期 ===
 def handle_query_by_date_command(date_str):
-    history = load_json_from_github("daily_result_log.json")
-    if date_str not in history:
+    items = log_index.daily(date_str)
+    if items is None:
         return TextSendMessage(text=f"❌ 查無 {date_str} 紀錄"), []
-    items = history[date_str]
     if not items:
         return TextSendMessage(text=f"⚠️ {date_str} 當天沒有各槽紀錄。"), []
 
+    note = ""
+    if is_figure_dirty(storage, date_str):
+        try:
+            rerender_figures(date_str, items)
+        except StorageWriteError as e:
+            note = f"\n⚠️ 圖檔重畫失敗，以下可能仍是舊圖（{e}）"
+
     total = sum(i['volume'] for i in items)
     reply = f"📅 {date_str} 各槽產氣狀態：\n"
     for item in items:
         reply += f"槽 {item.get('Tank', '')}：{item.get('stage', '')} 第{item.get('day', '')}天\n產氣 {item.get('volume', 0):.1f} m³\n"
-    reply += f"\n🔢 總產氣：{total:.1f} m³"
+    reply += f"\n🔢 總產氣：{total:.1f} m³{note}"
     images = [
         ImageSendMessage(
             original_content_url=f"{PHOTO_BASE_URL}/{date_str}_daily_distribution.png",
@@ -297,11 +361,9 @@ def handle_query_by_date_command(date_str):
 
 # === 查詢目前階段 ===
 def handle_current_stage_command():
-    history = load_json_from_github("daily_result_log.json")
-    if not history:
+    latest_date, items = log_index.daily_latest()
+    if latest_date is None:
         return TextSendMessage(text="❌ 尚無分析資料")
-    latest_date = max(history.keys())
-    items = history[latest_date]
     reply = f"分析日期：{latest_date}\n"
     for item in items:
         reply += f"槽 {item.get('Tank', '')}：{item.get('stage', '')} 第{item.get('day', '')}天 產氣 {item.get('volume', 0):.1f} m³\n"
@@ -311,25 +373,42 @@ def handle_current_stage_command():
 
 # === 產氣週報 ===
 def handle_weekly_report_command():
-    history = load_json_from_github("daily_result_log.json")
     today = date.today()
     last7 = [(today - timedelta(days=i)).isoformat() for i in range(6, -1, -1)]
+    # 各日合計直接由索引 GROUP BY 算出
+    totals = log_index.daily_totals(last7[0], last7[-1])
     reply = "📊 一週產氣概況：\n"
     for d in last7:
-        if d in history:
-            total = sum(i.get('volume', 0) for i in history[d])
-            reply += f"{d}：{total:.1f} m³\n"
+        if d in totals:
+            reply += f"{d}：{totals[d]:.1f} m³\n"
         else:
             reply += f"{d}：無資料\n"
     return TextSendMessage(text=reply)
 
+# === 發電潛能（讀物化的 power_potential_log，不重算歷史） ===
+def handle_power_report_command(days_str=""):
+    try:
+        days = int(days_str) if days_str else 7
+    except ValueError:
+        return TextSendMessage(text="❌ 請輸入「發電潛能」或「發電潛能 30」")
+    days = min(max(days, 1), 60)
+    today = date.today()
+    rows = load_power(storage, (today - timedelta(days=days - 1)).isoformat(), today.isoformat())
+    if not rows:
+        return TextSendMessage(text=f"❌ 最近 {days} 天沒有發電潛能紀錄")
+    reply = f"⚡️ 最近 {days} 天發電潛能：\n"
+    for d, row in rows.items():
+        ch4 = f"{row['ch4_avg']:.1f}%" if row["ch4_avg"] is not None else "--"
+        reply += f"{d}：{row['power']:.0f} kW（產氣 {row['gas']:.1f} m³，加權甲烷 {ch4}）\n"
+    powers = [row["power"] for row in rows.values()]
+    reply += f"平均 {sum(powers) / len(powers):.0f} kW，最高 {max(powers):.0f} kW"
+    return TextSendMessage(text=reply)
+
 # === AI 智能摘要（範例） ===
 def handle_ai_summary_command():
-    history = load_json_from_github("daily_result_log.json")
-    if not history:
+    today, data = log_index.daily_latest()
+    if today is None:
         return TextSendMessage(text="❌ 尚無歷史資料")
-    today = max(history.keys())
-    data = history[today]
     summary = "📈 智能分析：\n"
     for i in data:
         if i.get('volume', 0) < 50:
@@ -338,69 +417,115 @@ def handle_ai_summary_command():
             summary += f"槽{i.get('Tank', '')}處於高峰，維持良好\n"
     return TextSendMessage(text=summary)
 
-def handle_batch_gas_input_command(msg):
-    lines = msg.strip().split("\n")
-    history = load_json_from_github("daily_result_log.json")
-    updated_dates = []
-    last_analyzer = last_date = last_active_tanks = None
-
-    user_config = load_json_from_github("user_config.json")
-    full_mapping = load_json_from_github("curve_assignment.json")
-
-    for line in lines:
-        if line.strip():
-            try:
-                date_str, val = line.strip().split()
-                val = float(val)
-                active_tanks = {tank: conf["start_date"] for tank, conf in user_config.items() if conf.get("run", False)}
-                active_mapping = {k: full_mapping[k] for k in active_tanks if k in full_mapping}
-
-                analyzer = BiogasAnalyzer(active_mapping)
-                result = analyzer.analyze(
-                    start_dates=active_tanks,
-                    today_str=date_str,
-                    total_gas=val,
-                    cumulative_log_path="cumulative_gas_log.json",
-                    is_cumulative=True
-                )
-                history[date_str] = [
-                    dict({"Tank": tank}, **item) for tank, item in result.items()
-                ]
-                analyzer.update_cumulative_log("cumulative_gas_log.json", date_str, val)
-
-                # 關鍵：記住最後一筆
-                last_analyzer = analyzer
-                last_date = date_str
-                last_active_tanks = active_tanks
-
-                updated_dates.append(f"{date_str} ✔ {val} m³")
-            except Exception as e:
-                updated_dates.append(f"{line.strip()} ❌ 格式錯誤 ({e})")
-
-    save_json_to_github("daily_result_log.json", history, "批次輸入多日產氣量")
-
-    if last_date:
-        daily_dist_path = last_analyzer.plot_daily_distribution(history[last_date], last_date)
-        push_png_to_github(daily_dist_path, f"figures/{last_date}_daily_distribution.png", commit_msg=f"{last_date} daily_distribution")
-
-        stacked_path = last_analyzer.run_stacked_pipeline("daily_result_log.json", "cumulative_gas_log.json", last_active_tanks)
-        push_png_to_github(stacked_path, f"figures/{last_date}_stacked.png", commit_msg=f"{last_date} stacked")
-
-        cumulative_path = last_analyzer.run_cumulative_pipeline("cumulative_gas_log.json", last_date, val, last_active_tanks)
-        push_png_to_github(cumulative_path, f"figures/{last_date}_cumulative.png", commit_msg=f"{last_date} cumulative")
+def parse_batch_lines(msg):
+    """
+    逐行解析「YYYY-MM-DD 數值」，回傳 (readings, report)。
+    readings: {日期: 讀值}（同一日期重複時以最後一行為準）
+    report:   與輸入行一一對應的 [日期或 None, 訊息]，日期不為 None 的行待寫入成功後再補上結果
+    """
+    readings = {}
+    report = []
+    for line in msg.strip().split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            date_str, val = line.split()
+            date_str = datetime.strptime(date_str, "%Y-%m-%d").date().isoformat()
+            val = float(val)
+            if val < 0:
+                raise ValueError("讀值不可為負")
+        except Exception as e:
+            report.append([None, f"{line} ❌ 格式錯誤 ({e})"])
+            continue
+        if date_str in readings:
+            for entry in report:
+                if entry[0] == date_str:
+                    entry[0], entry[1] = None, f"{date_str} ⚠️ 重複，以後面一行為準"
+        readings[date_str] = val
+        report.append([date_str, None])
+    return readings, report
+
+
+# === 啟動日排程建議 ===
+def handle_schedule_plan_command(objective=""):
+    objective = objective.lower() or "smooth"
+    if objective not in ("smooth", "power"):
+        return TextSendMessage(text="❌ 請輸入「排程建議」或「排程建議 power」")
+    plans = plan_from_storage(storage, log_index, objective=objective, top=3)
+    if not plans:
+        return TextSendMessage(text="❌ 尚無已指派曲線的槽可排程")
+    label = "產氣變異係數（越小越平穩）" if objective == "smooth" else "發電潛能 P10 kW（越大越穩定）"
+    reply = f"🗓️ 啟動日排程建議（依{label}）：\n"
+    for rank, plan in enumerate(plans, 1):
+        schedule = "、".join(f"{tank}槽 {d}" for tank, d in plan["schedule"].items())
+        reply += f"\n{rank}. {schedule}\n   評分 {plan['score']}，日均 {plan['mean_gas']:.1f} m³（最低 {plan['min_gas']:.1f}、最高 {plan['peak_gas']:.1f}）\n"
+    return TextSendMessage(text=reply)
 
-        imgs = [
-            ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{last_date}_daily_distribution.png", preview_image_url=f"{PHOTO_BASE_URL}/{last_date}_daily_distribution.png"),
-            ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{last_date}_stacked.png", preview_image_url=f"{PHOTO_BASE_URL}/{last_date}_stacked.png"),
-            ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{last_date}_cumulative.png", preview_image_url=f"{PHOTO_BASE_URL}/{last_date}_cumulative.png"),
-        ]
-        return [TextSendMessage(text="\n".join(updated_dates))] + imgs
-    else:
-        return [TextSendMessage(text="\n".join(updated_dates))]
+
+def handle_batch_gas_input_command(msg):
+    """
+    多日批次輸入：設定 / 曲線 / 累積 log 只讀一次，全部行依日期排序在記憶體內分析，
+    每日結果、累積讀值、下游重算與圖檔收進同一個 batch，一次寫入（一個 commit）。
+    """
+    readings, report = parse_batch_lines(msg)
+    if not readings:
+        return [TextSendMessage(text="\n".join(entry[1] for entry in report))]
+
+    fleet = load_active_fleet()
+    active_tanks = fleet.start_dates()
+    active_mapping = fleet.curve_mapping()
+
+    dates = sorted(readings)
+    last_date = dates[-1]
+    try:
+        with storage.batch(f"批次輸入 {dates[0]} ~ {last_date} 產氣量") as tx:
+            analyzer = BiogasAnalyzer(active_mapping, storage=tx)
+            cumulative = open_log(CUMULATIVE_LOG, tx)
+            baseline = cumulative.sorted_index(dates[0], last_date)
+            results = analyzer.analyze_range(
+                dates, [readings[d] for d in dates], active_tanks,
+                is_cumulative=True,
+                baseline=baseline
+            )
+            previous = {d: baseline.prior(d)[1] for d in dates}
+            update_adaptation(tx, results)
+
+            open_log(DAILY_RESULT_LOG, tx).update({
+                d: [dict({"Tank": tank}, **item) for tank, item in results[d].items()] for d in dates
+            })
+            cumulative.update({d: readings[d] for d in dates})
+            recompute_downstream(tx, dates)
+
+            # 只畫最後（最新）一天的圖，與 json 同一個 commit
+            render_daily_figures(tx, last_date, results[last_date], active_tanks)
+        ensure_written()
+    except Exception as e:
+        # 整批不寫入
+        return [TextSendMessage(text=f"❌ 批次輸入失敗，未寫入任何資料：{e}")]
+    finally:
+        log_index.invalidate()
+
+    for entry in report:
+        d = entry[0]
+        if d is None:
+            continue
+        total = sum(item["volume"] for item in results[d].values())
+        note = " ⚠️ 低於前一筆累積值" if previous[d] is not None and readings[d] < previous[d] else ""
+        entry[1] = f"{d} ✔ {readings[d]} m³（分配 {total:.1f} m³）{note}"
+
+    imgs = [
+        ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{last_date}_daily_distribution.png", preview_image_url=f"{PHOTO_BASE_URL}/{last_date}_daily_distribution.png"),
+        ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{last_date}_stacked.png", preview_image_url=f"{PHOTO_BASE_URL}/{last_date}_stacked.png"),
+        ImageSendMessage(original_content_url=f"{PHOTO_BASE_URL}/{last_date}_cumulative.png", preview_image_url=f"{PHOTO_BASE_URL}/{last_date}_cumulative.png"),
+    ]
+    return [TextSendMessage(text="\n".join(entry[1] for entry in report))] + imgs
 
 
 
 # === Flask 啟動入口 ===
 if __name__ == "__main__":
+    # 直接啟動服務時先把渲染 worker 開好、預熱，第一個記錄指令不用等冷啟動
+    get_render_service().start()
     port = int(os.environ.get("PORT", 5678))
     app.run(host="0.0.0.0", port=port)
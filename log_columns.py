@@ -0,0 +1,159 @@
+import io
+
+import numpy as np
+
+# === 每日結果的欄式快照（.npz） ===
+# daily_result_log 的 json 每一槽每一天都是一個 dict：重複的 key、重複的長字串（"結束期（已超出試程 6 天）"），
+# 再加上 indent=2 與 contents API 的 base64，體積是實際數字的好幾倍。
+# 這裡改存成一欄一個 numpy 陣列：
+#   date / start   : 距 1970-01-01 的天數（int32）
+#   tank / stage   : 小整數代碼（int16），對應 tank_labels / stage_labels 字串表
+#   day            : 第幾天（int16）
+#   normalized / volume : float64（與 json 數值逐位相同）
+#   log_dates      : json 裡所有日期（含沒有任何槽紀錄的日子，匯出時才能還原空清單）
+#   source         : 產生此快照的 json 分片版本（git blob sha），用來判斷快照是否過期
+# json 分片仍是正式資料（讀-改-寫與衝突合併都以 json 為準），快照只是旁邊的讀取格式。
+FORMAT_VERSION = 1
+
+
+def _to_days(date_strs):
+    return np.array(date_strs, dtype="datetime64[D]").astype(np.int32)
+
+
+def _to_date_strs(days):
+    return np.datetime_as_string(days.astype("datetime64[D]"), unit="D")
+
+
+def _encode(values):
+    labels, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return labels, codes.astype(np.int16)
+
+
+def _merge_labels(parts, attr):
+    # 合併多份字串表，回傳 (新字串表, 各份轉換後的代碼)
+    labels = np.unique(np.concatenate([getattr(p, f"{attr}_labels") for p in parts]))
+    codes = [np.searchsorted(labels, getattr(p, f"{attr}_labels")).astype(np.int16)[getattr(p, attr)] for p in parts]
+    return labels, np.concatenate(codes)
+
+
+class DailyColumns:
+    ARRAYS = ("date", "tank", "tank_labels", "start", "day", "normalized", "stage", "stage_labels", "volume", "log_dates")
+
+    def __init__(self, date, tank, tank_labels, start, day, normalized, stage, stage_labels, volume, log_dates, source=None):
+        self.date = date
+        self.tank = tank
+        self.tank_labels = tank_labels
+        self.start = start
+        self.day = day
+        self.normalized = normalized
+        self.stage = stage
+        self.stage_labels = stage_labels
+        self.volume = volume
+        self.log_dates = log_dates
+        self.source = source
+
+    def __len__(self):
+        return len(self.date)
+
+    # --- 與 json 結構互轉 ---
+    @classmethod
+    def from_log(cls, log, source=None):
+        # log: {日期: [{"Tank", "day", "normalized", "start_date", "stage", "volume"}, ...]}
+        rows = [(d, r) for d in sorted(log) for r in log[d]]
+        tank_labels, tank = _encode([r.get("Tank", "") for _, r in rows])
+        stage_labels, stage = _encode([r.get("stage", "") for _, r in rows])
+        return cls(
+            date=_to_days([d for d, _ in rows]),
+            tank=tank,
+            tank_labels=tank_labels,
+            start=_to_days([r.get("start_date") or d for d, r in rows]),
+            day=np.array([r.get("day", 0) for _, r in rows], dtype=np.int16),
+            normalized=np.array([r.get("normalized", 0) for _, r in rows], dtype=np.float64),
+            stage=stage,
+            stage_labels=stage_labels,
+            volume=np.array([r.get("volume", 0) for _, r in rows], dtype=np.float64),
+            log_dates=_to_days(sorted(log)),
+            source=source,
+        )
+
+    def to_log(self):
+        # 匯出回原本的 json 結構
+        log = {str(d): [] for d in _to_date_strs(self.log_dates)}
+        for d, tank, start, day, norm, stage, volume in zip(
+                _to_date_strs(self.date), self.tank_labels[self.tank], _to_date_strs(self.start),
+                self.day.tolist(), self.normalized.tolist(), self.stage_labels[self.stage], self.volume.tolist()):
+            log[str(d)].append({
+                "Tank": str(tank), "day": day, "normalized": norm,
+                "start_date": str(start), "stage": str(stage), "volume": volume,
+            })
+        return log
+
+    def to_frame(self):
+        import pandas as pd     # 只在需要 DataFrame 時才載入
+        return pd.DataFrame({
+            "date": _to_date_strs(self.date),
+            "Tank": self.tank_labels[self.tank],
+            "day": self.day,
+            "normalized": self.normalized,
+            "start_date": _to_date_strs(self.start),
+            "stage": self.stage_labels[self.stage],
+            "volume": self.volume,
+        })
+
+    def dates(self):
+        # 所有日期字串（已排序，含沒有槽紀錄的日子）
+        return _to_date_strs(self.log_dates)
+
+    def volume_table(self):
+        # 日期 × 槽別 的產氣量表（同一天同一槽重複時取最後一筆）
+        import pandas as pd
+        frame = pd.DataFrame({"date": _to_date_strs(self.date), "Tank": self.tank_labels[self.tank], "volume": self.volume})
+        return frame.pivot_table(index="date", columns="Tank", values="volume", aggfunc="last")
+
+    # --- 篩選 / 合併 ---
+    def between(self, start=None, end=None):
+        lo = _to_days([start])[0] if start else np.iinfo(np.int32).min
+        hi = _to_days([end])[0] if end else np.iinfo(np.int32).max
+        mask = (self.date >= lo) & (self.date <= hi)
+        day_mask = (self.log_dates >= lo) & (self.log_dates <= hi)
+        if mask.all() and day_mask.all():
+            return self
+        return DailyColumns(self.date[mask], self.tank[mask], self.tank_labels, self.start[mask], self.day[mask],
+                            self.normalized[mask], self.stage[mask], self.stage_labels, self.volume[mask],
+                            self.log_dates[day_mask])
+
+    @classmethod
+    def concat(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls.from_log({})
+        if len(parts) == 1:
+            return parts[0]
+        tank_labels, tank = _merge_labels(parts, "tank")
+        stage_labels, stage = _merge_labels(parts, "stage")
+        return cls(
+            date=np.concatenate([p.date for p in parts]),
+            tank=tank,
+            tank_labels=tank_labels,
+            start=np.concatenate([p.start for p in parts]),
+            day=np.concatenate([p.day for p in parts]),
+            normalized=np.concatenate([p.normalized for p in parts]),
+            stage=stage,
+            stage_labels=stage_labels,
+            volume=np.concatenate([p.volume for p in parts]),
+            log_dates=np.concatenate([p.log_dates for p in parts]),
+        )
+
+    # --- .npz ---
+    def to_bytes(self, source=None):
+        buf = io.BytesIO()
+        np.savez_compressed(buf, format=np.int16(FORMAT_VERSION), source=np.array(source or self.source or ""),
+                            **{name: getattr(self, name) for name in self.ARRAYS})
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, raw):
+        with np.load(io.BytesIO(raw), allow_pickle=False) as z:
+            if int(z["format"]) != FORMAT_VERSION:
+                raise ValueError(f"不支援的快照格式版本 {int(z['format'])}")
+            return cls(source=str(z["source"]) or None, **{name: z[name] for name in cls.ARRAYS})
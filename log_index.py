@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from log_store import open_log, DAILY_RESULT_LOG, CUMULATIVE_LOG, CH4_LOG
+
+# === 本機 SQLite 查詢索引 ===
+# 查詢類指令（查詢 / 目前階段 / 週報 / AI分析）與 Streamlit 歷史、發電分頁原本都要把 log 整份讀進來再用 Python 掃。
+# 這裡把每日結果、累積讀值、CH₄ 濃度與各槽設定鏡像到一個本機 sqlite 檔，日期 / 槽別都有索引，
+# 單日、區間、最新一筆都是 B-tree 查詢，不必每次下載整份 log。
+# 儲存後端仍是唯一的真實資料；索引只是快取，刪掉檔案會自動重建。
+# 同步時以一次 storage.versions() 取得所有月份分片的版本（git blob sha；GitHub 後端走 tree 清單，不下載檔案），
+# 只下載、重新載入有變動的分片。
+# 同步失敗（GitHub 5xx / 逾時）時整次同步回滾，印出警告後以索引中既有（可能較舊）的資料回答；
+# 單一分片損毀只跳過該分片，保留它原本的資料，其餘照常更新。
+# BIOGAS_INDEX     : sqlite 檔路徑（預設 biogas_index.sqlite3）
+# BIOGAS_INDEX_TTL : 兩次同步之間最少間隔秒數（預設 30）；本程序自己寫入後呼叫 invalidate() 會立即重新同步
+INDEX_PATH = os.environ.get("BIOGAS_INDEX", "biogas_index.sqlite3")
+INDEX_TTL = float(os.environ.get("BIOGAS_INDEX_TTL", "30"))
+CONFIG_FILE = "user_config.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS source_version (
+    source  TEXT PRIMARY KEY,
+    version TEXT
+);
+CREATE TABLE IF NOT EXISTS daily_result (
+    date    TEXT PRIMARY KEY,
+    records TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_tank (
+    date   TEXT NOT NULL,
+    seq    INTEGER NOT NULL,
+    tank   TEXT,
+    day    INTEGER,
+    stage  TEXT,
+    volume REAL,
+    PRIMARY KEY (date, seq)
+);
+CREATE INDEX IF NOT EXISTS daily_tank_by_tank ON daily_tank (tank, date);
+CREATE TABLE IF NOT EXISTS cumulative (
+    date  TEXT PRIMARY KEY,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS ch4 (
+    date TEXT NOT NULL,
+    tank TEXT NOT NULL,
+    ch4  REAL,
+    PRIMARY KEY (date, tank)
+);
+CREATE INDEX IF NOT EXISTS ch4_by_tank ON ch4 (tank, date);
+CREATE TABLE IF NOT EXISTS tank_config (
+    tank       TEXT PRIMARY KEY,
+    start_date TEXT,
+    run        INTEGER,
+    lock       INTEGER
+);
+"""
+
+
+def _month_bounds(month):
+    # YYYY-MM 月份內所有日期都落在這兩個字串之間
+    return f"{month}-00", f"{month}-99"
+
+
+class LogIndex:
+    def __init__(self, storage, path=INDEX_PATH, ttl=INDEX_TTL):
+        self.storage = storage
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._synced_at = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    # --- 同步 ---
+    def invalidate(self):
+        # 下一次查詢前強制重新同步
+        with self._lock:
+            self._synced_at = None
+
+    def sync(self, force=False):
+        with self._lock:
+            if not force and self._synced_at is not None and time.monotonic() - self._synced_at < self.ttl:
+                return
+            try:
+                self._sync()
+            except (RuntimeError, OSError) as e:
+                # requests 的連線錯誤也是 OSError；交易已回滾，索引維持上次同步的內容
+                print(f"[WARNING] 索引同步失敗，暫用上次同步的資料：{e}")
+            # 失敗時同樣等 TTL 再重試，避免每個查詢都打一次壞掉的後端
+            self._synced_at = time.monotonic()
+
+    def _sync(self):
+        versions = dict(self._db.execute("SELECT source, version FROM source_version"))
+        logs = [(open_log(log_path, self.storage), loader)
+                for log_path, loader in ((DAILY_RESULT_LOG, self._load_daily),
+                                         (CUMULATIVE_LOG, self._load_cumulative),
+                                         (CH4_LOG, self._load_ch4))]
+        shards = [(log, loader, month) for log, loader in logs for month in log.months()]
+        current = self.storage.versions([log.shard_path(month) for log, _, month in shards] + [CONFIG_FILE])
+        with self._db:
+            self._db.execute("BEGIN")
+            for log, loader, month in shards:
+                source = log.shard_path(month)
+                if current[source] != versions.get(source):
+                    self._load_source(source, current[source], lambda data: loader(month, data))
+            # manifest 已不再列出的月份（刪除 / 歸零）
+            seen = set(current)
+            for log, loader in logs:
+                for source in versions:
+                    if source.startswith(log.dir + "/") and source not in seen:
+                        loader(os.path.splitext(os.path.basename(source))[0], {})
+                        self._db.execute("DELETE FROM source_version WHERE source = ?", (source,))
+            if current[CONFIG_FILE] != versions.get(CONFIG_FILE):
+                self._load_source(CONFIG_FILE, current[CONFIG_FILE], self._load_config)
+
+    def _load_source(self, source, version, load):
+        # 下載並載入一個檔案；內容損毀（JSON / 格式不符）時只回滾這個檔案，保留索引中舊的資料與版本
+        # 記錄實際讀到的版本（列出版本之後檔案又被改過時，下次同步會再更新）
+        raw, version = self.storage.read_versioned(source) if version is not None else (None, None)
+        self._db.execute("SAVEPOINT source")
+        try:
+            load(json.loads(raw.decode()) if raw else {})
+        except (ValueError, TypeError, AttributeError) as e:
+            self._db.execute("ROLLBACK TO source")
+            print(f"[WARNING] 索引略過損毀的檔案 {source}：{e}")
+        else:
+            self._set_version(source, version)
+        self._db.execute("RELEASE source")
+
+    def _set_version(self, source, version):
+        self._db.execute("INSERT OR REPLACE INTO source_version (source, version) VALUES (?, ?)", (source, version))
+
+    def _load_daily(self, month, shard):
+        lo, hi = _month_bounds(month)
+        self._db.execute("DELETE FROM daily_result WHERE date BETWEEN ? AND ?", (lo, hi))
+        self._db.execute("DELETE FROM daily_tank WHERE date BETWEEN ? AND ?", (lo, hi))
+        for d, items in shard.items():
+            self._db.execute("INSERT INTO daily_result (date, records) VALUES (?, ?)",
+                             (d, json.dumps(items, ensure_ascii=False)))
+            self._db.executemany(
+                "INSERT INTO daily_tank (date, seq, tank, day, stage, volume) VALUES (?, ?, ?, ?, ?, ?)",
+                [(d, seq, i.get("Tank"), i.get("day"), i.get("stage"), i.get("volume"))
+                 for seq, i in enumerate(items)])
+
+    def _load_cumulative(self, month, shard):
+        lo, hi = _month_bounds(month)
+        self._db.execute("DELETE FROM cumulative WHERE date BETWEEN ? AND ?", (lo, hi))
+        self._db.executemany("INSERT INTO cumulative (date, value) VALUES (?, ?)", shard.items())
+
+    def _load_ch4(self, month, shard):
+        lo, hi = _month_bounds(month)
+        self._db.execute("DELETE FROM ch4 WHERE date BETWEEN ? AND ?", (lo, hi))
+        self._db.executemany("INSERT INTO ch4 (date, tank, ch4) VALUES (?, ?, ?)",
+                             [(d, tank, v) for d, tanks in shard.items() for tank, v in tanks.items()])
+
+    def _load_config(self, user_config):
+        self._db.execute("DELETE FROM tank_config")
+        self._db.executemany(
+            "INSERT INTO tank_config (tank, start_date, run, lock) VALUES (?, ?, ?, ?)",
+            [(tank, conf.get("start_date"), int(bool(conf.get("run"))), int(bool(conf.get("lock"))))
+             for tank, conf in user_config.items()])
+
+    def _query(self, sql, params=()):
+        self.sync()
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # --- 每日結果 ---
+    def daily(self, date_str):
+        # 與 ShardedLog.get 相同：查無該日回傳 None
+        rows = self._query("SELECT records FROM daily_result WHERE date = ?", (date_str,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def daily_latest(self):
+        # 回傳 (日期, 內容)；空 log 回傳 (None, None)
+        rows = self._query("SELECT date, records FROM daily_result ORDER BY date DESC LIMIT 1")
+        return (rows[0][0], json.loads(rows[0][1])) if rows else (None, None)
+
+    def daily_dates(self):
+        return [d for (d,) in self._query("SELECT date FROM daily_result ORDER BY date")]
+
+    def daily_range(self, start=None, end=None):
+        rows = self._query("SELECT date, records FROM daily_result WHERE date BETWEEN ? AND ? ORDER BY date",
+                           (start or "", end or "9999"))
+        return {d: json.loads(records) for d, records in rows}
+
+    def daily_totals(self, start=None, end=None):
+        # {日期: 各槽產氣量合計}
+        return dict(self._query(
+            "SELECT date, SUM(COALESCE(volume, 0)) FROM daily_tank WHERE date BETWEEN ? AND ? GROUP BY date ORDER BY date",
+            (start or "", end or "9999")))
+
+    # --- 累積讀值 / CH₄ / 槽設定 ---
+    def cumulative_range(self, start=None, end=None):
+        return dict(self._query("SELECT date, value FROM cumulative WHERE date BETWEEN ? AND ? ORDER BY date",
+                                (start or "", end or "9999")))
+
+    def ch4_range(self, start=None, end=None):
+        result = {}
+        for d, tank, v in self._query("SELECT date, tank, ch4 FROM ch4 WHERE date BETWEEN ? AND ? ORDER BY date, tank",
+                                      (start or "", end or "9999")):
+            result.setdefault(d, {})[tank] = v
+        return result
+
+    def tank_config(self):
+        return {tank: {"start_date": start_date, "run": bool(run), "lock": bool(lock)}
+                for tank, start_date, run, lock in self._query("SELECT tank, start_date, run, lock FROM tank_config ORDER BY tank")}
+
+
+_index = None
+_index_guard = threading.Lock()
+
+
+def get_index(storage=None):
+    # 程序內共用一個索引（依 BIOGAS_INDEX 路徑）
+    global _index
+    with _index_guard:
+        if _index is None:
+            if storage is None:
+                from storage import get_storage
+                storage = get_storage()
+            _index = LogIndex(storage)
+        return _index
@@ -0,0 +1,308 @@
+import os
+import bisect
+
+from storage import StorageBatch, content_version, dump_json_bytes, parse_json_bytes
+from log_columns import DailyColumns
+
+# === 依月份分片的 log ===
+# 原本 daily_result_log / cumulative_gas_log / ch4_result_log 各是一整份 json，
+# 每改一天就要整份下載再整份上傳，檔案隨運轉天數線性變大（contents API 內嵌上限 1 MB）。
+# 改為 logs/<log 名稱>/YYYY-MM.json 每月一個分片，加上一份很小的 manifest：
+#   logs/daily_result_log/manifest.json  →  {"months": ["2025-06", "2025-07"]}
+# 讀寫只碰到指令需要的月份，單日更新的成本與歷史長度無關。
+# 有欄式格式的 log（每日結果）每個分片旁另存一份 YYYY-MM.npz 快照，與 json 同一個 commit 寫入，
+# 圖表 / 分析用 load_columns() 直接讀快照；快照過期（json 被別人改過）時自動改由 json 重建。
+LOG_DIR = "logs"
+DAILY_RESULT_LOG = "daily_result_log.json"
+CUMULATIVE_LOG = "cumulative_gas_log.json"
+CH4_LOG = "ch4_result_log.json"
+POWER_LOG = "power_potential_log.json"
+
+
+class SortedDateLog:
+    """
+    依日期排序的 {日期: 值}：前一筆 / 後一筆查詢用 bisect，O(log n)。
+    批次 / 多日分析時載入一次後重複使用，不必每個日期都重新讀 log、掃過所有 key。
+    """
+
+    def __init__(self, items=None):
+        items = dict(items or {})
+        self._dates = sorted(items)
+        self._values = [items[d] for d in self._dates]
+
+    @classmethod
+    def from_log(cls, log, start=None, end=None):
+        # 載入 start ~ end 的紀錄，再加上 start 之前的最後一筆（當作第一天的基準）
+        index = cls(log.load_range(start, end))
+        if start:
+            d, value = log.prior(start)
+            if d is not None:
+                index.set(d, value)
+        return index
+
+    def __len__(self):
+        return len(self._dates)
+
+    def __contains__(self, date_str):
+        i = bisect.bisect_left(self._dates, date_str)
+        return i < len(self._dates) and self._dates[i] == date_str
+
+    def get(self, date_str, default=None):
+        i = bisect.bisect_left(self._dates, date_str)
+        if i < len(self._dates) and self._dates[i] == date_str:
+            return self._values[i]
+        return default
+
+    def prior(self, date_str):
+        # 嚴格早於 date_str 的最後一筆，回傳 (日期, 內容)
+        i = bisect.bisect_left(self._dates, date_str)
+        return (self._dates[i - 1], self._values[i - 1]) if i else (None, None)
+
+    def successor(self, date_str):
+        # 嚴格晚於 date_str 的第一筆，回傳 (日期, 內容)
+        i = bisect.bisect_right(self._dates, date_str)
+        return (self._dates[i], self._values[i]) if i < len(self._dates) else (None, None)
+
+    def set(self, date_str, value):
+        i = bisect.bisect_left(self._dates, date_str)
+        if i < len(self._dates) and self._dates[i] == date_str:
+            self._values[i] = value
+        else:
+            self._dates.insert(i, date_str)
+            self._values.insert(i, value)
+
+    def update(self, items):
+        for d, value in dict(items).items():
+            self.set(d, value)
+
+    def items(self):
+        return list(zip(self._dates, self._values))
+
+
+class ShardedLog:
+    def __init__(self, name, storage, legacy_path=None, columns=None):
+        self.name = name
+        self.storage = storage
+        self.legacy_path = legacy_path
+        self.columns = columns      # 欄式快照格式（例如 DailyColumns），None 表示不產生快照
+        self.dir = f"{LOG_DIR}/{name}"
+        self.manifest_path = f"{self.dir}/manifest.json"
+        self._months = None
+        self._shards = {}
+        self._sorted = {}       # month -> 排序後的日期（prior / successor 用）
+
+    # --- manifest / 分片 ---
+    def shard_path(self, month):
+        return f"{self.dir}/{month}.json"
+
+    def columns_path(self, month):
+        return f"{self.dir}/{month}.npz"
+
+    def _put_columns(self, tx, month, shard):
+        # 快照記下對應 json 的版本；json 之後若被合併改寫，讀取時就知道快照已過期
+        if self.columns is not None:
+            source = content_version(dump_json_bytes(shard))
+            tx.put_binary(self.columns_path(month), self.columns.from_log(shard).to_bytes(source))
+
+    def months(self):
+        if self._months is None:
+            # read_versioned 在 GitHub 5xx / 403 / 逾時會直接丟出例外；只有檔案真的不存在（404）才回傳 None。
+            # 不能用 get_json：讀取失敗時它回傳 {}，會被誤判成尚未拆分，舊檔重新拆分後蓋掉較新的分片
+            raw, _ = self.storage.read_versioned(self.manifest_path)
+            if raw is None:
+                self._months = self._migrate_legacy()
+            else:
+                self._months = sorted(parse_json_bytes(raw, self.manifest_path).get("months", []))
+        return self._months
+
+    def load_month(self, month):
+        # manifest 沒列出的月份一律視為不存在（clear 之後留下的舊分片不會被讀回來）
+        if month not in self._shards:
+            # 同 manifest：讀取失敗要丟出例外，不能當成空月份
+            path = self.shard_path(month)
+            self._shards[month] = parse_json_bytes(self.storage.read_versioned(path)[0], path) if month in self.months() else {}
+        return self._shards[month]
+
+    def _migrate_legacy(self):
+        # 第一次使用時，把舊的單一 json 拆成月份分片（舊檔保留不動）
+        # 分片與 manifest 都以 update_json 讀-改-寫、只補上缺少的日期：
+        # 即使兩個程序同時拆分，或分片已經存在，也不會蓋掉分片裡較新的紀錄
+        if not self.legacy_path:
+            return []
+        raw, _ = self.storage.read_versioned(self.legacy_path)
+        legacy = parse_json_bytes(raw, self.legacy_path)
+        if not legacy:
+            return []
+        shards = {}
+        for d, value in legacy.items():
+            shards.setdefault(d[:7], {})[d] = value
+
+        def fill(entries):
+            def mutate(shard):
+                for d, value in entries.items():
+                    shard.setdefault(d, value)
+                return dict(sorted(shard.items()))
+            return mutate
+
+        def add_months(manifest):
+            manifest["months"] = sorted(set(manifest.get("months", [])) | set(shards))
+
+        with self.storage.batch(f"{self.name} 拆分為月份分片") as tx:
+            for month, entries in shards.items():
+                self._shards[month] = tx.update_json(self.shard_path(month), fill(entries))
+                self._put_columns(tx, month, self._shards[month])
+            months = tx.update_json(self.manifest_path, add_months)["months"]
+        print(f"[INFO] {self.legacy_path} 已拆分為 {len(shards)} 個月份分片")
+        self._sorted.clear()
+        return sorted(months)
+
+    # --- 讀取 ---
+    def get(self, date_str, default=None):
+        return self.load_month(date_str[:7]).get(date_str, default)
+
+    def load_range(self, start=None, end=None):
+        # start / end 為 YYYY-MM-DD（含端點），只讀範圍內的月份
+        result = {}
+        for month in self.months():
+            if (start and month < start[:7]) or (end and month > end[:7]):
+                continue
+            for d, value in self.load_month(month).items():
+                if (start is None or d >= start) and (end is None or d <= end):
+                    result[d] = value
+        return dict(sorted(result.items()))
+
+    def load_all(self):
+        return self.load_range()
+
+    def load_columns(self, start=None, end=None):
+        # 欄式讀取：每個月份優先讀 .npz 快照，版本對不上或缺檔才讀 json 重建
+        months = [m for m in self.months() if not ((start and m < start[:7]) or (end and m > end[:7]))]
+        versions = self.storage.versions([self.shard_path(m) for m in months])
+        parts = []
+        for month in months:
+            cols = None
+            raw = self.storage.get_binary(self.columns_path(month))
+            if raw is not None:
+                try:
+                    cols = self.columns.from_bytes(raw)
+                except Exception as e:
+                    print(f"[WARNING] 讀取 {self.columns_path(month)} 失敗，改用 json：{e}")
+            if cols is None or cols.source != versions[self.shard_path(month)]:
+                cols = self.columns.from_log(self.load_month(month))
+            parts.append(cols)
+        return self.columns.concat(parts).between(start, end)
+
+    def latest(self):
+        # 回傳 (日期, 內容)；空 log 回傳 (None, None)
+        for month in reversed(self.months()):
+            shard = self.load_month(month)
+            if shard:
+                d = max(shard)
+                return d, shard[d]
+        return None, None
+
+    def _sorted_dates(self, month):
+        if month not in self._sorted:
+            self._sorted[month] = sorted(self.load_month(month))
+        return self._sorted[month]
+
+    def prior(self, date_str):
+        # 嚴格早於 date_str 的最後一筆，回傳 (日期, 內容)；月份內以 bisect 查找
+        for month in reversed(self.months()):
+            if month > date_str[:7]:
+                continue
+            dates = self._sorted_dates(month)
+            i = bisect.bisect_left(dates, date_str)
+            if i:
+                return dates[i - 1], self._shards[month][dates[i - 1]]
+        return None, None
+
+    def successor(self, date_str):
+        # 嚴格晚於 date_str 的第一筆，回傳 (日期, 內容)
+        for month in self.months():
+            if month < date_str[:7]:
+                continue
+            dates = self._sorted_dates(month)
+            i = bisect.bisect_right(dates, date_str)
+            if i < len(dates):
+                return dates[i], self._shards[month][dates[i]]
+        return None, None
+
+    def sorted_index(self, start=None, end=None):
+        # 取出 start ~ end（含 start 前一筆）為 SortedDateLog，供多次查詢重複使用
+        return SortedDateLog.from_log(self, start, end)
+
+    # --- 寫入 ---
+    def update(self, changes, commit_msg=None):
+        """
+        changes: {日期: 新內容}，內容為 None 代表刪除該日；
+        內容也可以是函式 f(當日舊內容或 None) → 新內容，只改當日的一部分欄位時用，
+        衝突重放時會以最新的當日內容重新呼叫。
+        只重寫受影響的月份分片；月份清單有變動時才更新 manifest。
+        每個分片都以 update_json 讀-改-寫，同時有別人寫入同一個月份時會自動合併而不會蓋掉。
+        """
+        if not changes:
+            return
+        by_month = {}
+        for d, value in changes.items():
+            by_month.setdefault(d[:7], {})[d] = value
+
+        def apply_changes(month_changes):
+            def mutate(shard):
+                for d, value in month_changes.items():
+                    if callable(value):
+                        value = value(shard.get(d))
+                    if value is None:
+                        shard.pop(d, None)
+                    else:
+                        shard[d] = value
+                return dict(sorted(shard.items()))
+            return mutate
+
+        known = set(self.months())
+        new_months = sorted(m for m in by_month if m not in known)
+
+        def add_months(manifest):
+            # 以 manifest 當下內容為準；舊的單一 json 尚未拆分時 manifest 可能還不存在
+            manifest["months"] = sorted(set(manifest.get("months", self._months)) | set(new_months))
+
+        with self.storage.batch(commit_msg or f"更新 {self.name}") as tx:
+            for month, month_changes in by_month.items():
+                self._shards[month] = tx.update_json(self.shard_path(month), apply_changes(month_changes))
+                self._sorted.pop(month, None)
+                self._put_columns(tx, month, self._shards[month])
+            if new_months:
+                self._months = tx.update_json(self.manifest_path, add_months)["months"]
+
+    def set(self, date_str, value, commit_msg=None):
+        self.update({date_str: value}, commit_msg)
+
+    def delete(self, date_str, commit_msg=None):
+        self.update({date_str: None}, commit_msg)
+
+    def clear(self, commit_msg=None):
+        # 清空所有分片與 manifest（同一個 commit）
+        with self.storage.batch(commit_msg or f"歸零 {self.name}") as tx:
+            for month in self.months():
+                tx.put_json(self.shard_path(month), {})
+            tx.put_json(self.manifest_path, {"months": []})
+        self._months = []
+        self._shards = {}
+        self._sorted = {}
+
+
+def open_log(path, storage):
+    """
+    依舊檔名（例如 "daily_result_log.json"）開啟對應的分片 log，
+    舊的單一 json 會在第一次使用時自動拆分。
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    columns = DailyColumns if name == os.path.splitext(DAILY_RESULT_LOG)[0] else None
+    # 在 batch 內：整個指令（含巢狀 batch）共用最外層 batch 上的同一個 ShardedLog，
+    # manifest / 分片只讀一次，各步驟的寫入也都更新同一份快取
+    if not isinstance(storage, StorageBatch):
+        return ShardedLog(name, storage, legacy_path=path, columns=columns)
+    outermost = storage.outermost
+    if name not in outermost.logs:
+        outermost.logs[name] = ShardedLog(name, outermost, legacy_path=path, columns=columns)
+    return outermost.logs[name]
@@ -0,0 +1,162 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from power import CH4_LHV, POWER_EFF
+
+# === 啟動日排程建議 ===
+# 以標準曲線陣列一次評估大量候選啟動日組合：
+#   G[槽, 候選位移, 天] = 該槽在該位移下，規劃期間每一天的正規化產氣
+#   每個候選排程 = 每槽選一個位移，總產氣 = G[各槽, 選到的位移, :] 加總（numpy fancy indexing，一次算完）
+# 評分方式：
+#   smooth : 規劃期間每日總產氣的變異係數（std / mean），越小越平穩
+#   power  : 每日發電潛能的第 10 百分位（kW），越大代表發電機能穩定吃到的功率越高
+# 組合數超過 max_candidates 時改為隨機抽樣（固定 seed，結果可重現）。
+# 候選以 PLAN_BLOCK 個為一塊評估，每塊內逐槽累加成 候選 × 天：
+# 不建 候選 × 槽 × 天 的陣列（槽多、規劃期長時會到數百 MB），記憶體只與區塊大小、規劃天數有關。
+PLAN_HORIZON = 45
+PLAN_MAX_OFFSET = 30
+PLAN_MAX_CANDIDATES = 20000
+PLAN_BLOCK = 2048
+CH4_DEFAULT = 60.0          # 沒有量測紀錄時的甲烷濃度（%）
+OBJECTIVES = ("smooth", "power")
+
+
+def _day_num(d):
+    return np.datetime64(str(d), "D").astype(np.int64)
+
+
+def _candidate_offsets(plan_start, max_offset, fixed):
+    # 固定的槽只有一個候選（可為負：規劃開始前已啟動）
+    if fixed is not None:
+        return np.array([_day_num(fixed) - _day_num(plan_start)])
+    return np.arange(max_offset + 1)
+
+
+def _schedules(counts, max_candidates, seed):
+    # 每槽候選數 counts → (n, 槽數) 的候選索引；全部組合太多時隨機抽樣，並保留「全部取第一個」的組合
+    total = int(np.prod(counts, dtype=float))
+    if total <= max_candidates:
+        grids = np.meshgrid(*[np.arange(c) for c in counts], indexing="ij")
+        return np.stack([g.ravel() for g in grids], axis=1)
+    rng = np.random.default_rng(seed)
+    picks = np.stack([rng.integers(0, c, size=max_candidates) for c in counts], axis=1)
+    picks[0] = 0
+    return np.unique(picks, axis=0)
+
+
+def plan_schedules(curves, plan_start, horizon=PLAN_HORIZON, max_offset=PLAN_MAX_OFFSET, fixed=None,
+                   objective="smooth", top=5, scale=1.0, ch4=None,
+                   max_candidates=PLAN_MAX_CANDIDATES, seed=0):
+    """
+    curves   : {槽: Curve}（curve_registry 取得）
+    fixed    : {槽: 啟動日} 已鎖定、不參與排程的槽
+    scale    : 每單位正規化產氣對應的 m³（見 estimate_scale），power 評分用
+    ch4      : {槽: 甲烷濃度 %}
+    回傳前 top 名：[{"schedule": {槽: 啟動日}, "score", "mean_gas", "min_gas", "peak_gas"}]
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective 須為 {OBJECTIVES} 之一")
+    tanks = list(curves)
+    if not tanks:
+        return []
+    fixed = fixed or {}
+    ch4 = ch4 or {}
+
+    offsets = [_candidate_offsets(plan_start, max_offset, fixed.get(t)) for t in tanks]
+    counts = [len(o) for o in offsets]
+    width = max(counts)
+    padded = np.stack([np.pad(o, (0, width - len(o)), mode="edge") for o in offsets])       # 槽 × 位移
+
+    # G[槽, 位移, 天]：曲線第 (天 - 位移 + 1) 天的值，超出曲線為 0
+    t = np.arange(horizon)
+    curve_day = t[None, None, :] - padded[:, :, None]                                           # 0 起算
+    lengths = np.array([len(curves[k]) for k in tanks])
+    table = np.zeros((len(tanks), max(lengths.max(), 1) + 1))
+    for i, k in enumerate(tanks):
+        table[i, :lengths[i]] = curves[k].normalized
+    valid = (curve_day >= 0) & (curve_day < lengths[:, None, None])
+    idx = np.where(valid, curve_day, table.shape[1] - 1)                                        # 最後一格固定為 0
+    G = table[np.arange(len(tanks))[:, None, None], idx]
+
+    S = _schedules(counts, max_candidates, seed)                                                # 候選 × 槽
+    ch4_frac = np.array([ch4.get(k, CH4_DEFAULT) for k in tanks]) / 100
+    score, mean, low, peak = (np.empty(len(S)) for _ in range(4))
+    for lo in range(0, len(S), PLAN_BLOCK):
+        block = slice(lo, lo + PLAN_BLOCK)
+        gas = np.zeros((len(S[block]), horizon))                                                # 候選 × 天
+        power = np.zeros_like(gas) if objective == "power" else None
+        for i in range(len(tanks)):
+            g = G[i, S[block, i]]
+            gas += g
+            if power is not None:
+                power += g * ch4_frac[i]
+        gas *= scale
+        mean[block], low[block], peak[block] = gas.mean(axis=1), gas.min(axis=1), gas.max(axis=1)
+        if objective == "smooth":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                score[block] = np.where(mean[block] > 0, gas.std(axis=1) / mean[block], np.inf)
+        else:
+            score[block] = np.percentile(power * (scale * CH4_LHV * POWER_EFF), 10, axis=1)
+    order = np.argsort(score if objective == "smooth" else -score, kind="stable")
+
+    start = _day_num(plan_start)
+    results = []
+    for n in order[:top]:
+        schedule = {k: str(np.datetime64(int(start + padded[i, S[n, i]]), "D")) for i, k in enumerate(tanks)}
+        results.append({
+            "schedule": schedule,
+            "score": round(float(score[n]), 4),
+            "mean_gas": round(float(mean[n]), 2),
+            "min_gas": round(float(low[n]), 2),
+            "peak_gas": round(float(peak[n]), 2),
+        })
+    return results
+
+
+def estimate_scale(daily_columns, days=14):
+    # 由最近的每日結果估計「每單位正規化產氣 = 多少 m³」（當日總產氣 / 當日 normalized 總和 的中位數）
+    if not len(daily_columns):
+        return 1.0
+    dates, inverse = np.unique(daily_columns.date, return_inverse=True)
+    gas = np.bincount(inverse, weights=daily_columns.volume)
+    norm = np.bincount(inverse, weights=daily_columns.normalized)
+    recent = slice(max(len(dates) - days, 0), None)
+    ratio = gas[recent][norm[recent] > 0] / norm[recent][norm[recent] > 0]
+    return float(np.median(ratio)) if len(ratio) else 1.0
+
+
+def recent_ch4(ch4_log, days=30):
+    # 各槽最近 days 筆量測的平均甲烷濃度：{槽: %}
+    by_tank = {}
+    for d in sorted(ch4_log)[-days:]:
+        for tank, v in ch4_log[d].items():
+            if v is not None:
+                by_tank.setdefault(tank, []).append(v)
+    return {tank: float(np.mean(v)) for tank, v in by_tank.items()}
+
+
+def plan_from_storage(storage, log_index, plan_start=None, objective="smooth", **kwargs):
+    """
+    依 user_config / curve_assignment 建議各槽啟動日：
+    鎖定（lock）的槽維持目前啟動日，其餘在 plan_start 起 max_offset 天內排程。
+    """
+    from curve_registry import curve_registry
+    from log_store import open_log, DAILY_RESULT_LOG
+    from adaptation import load_scale
+
+    plan_start = date.fromisoformat(str(plan_start)) if plan_start else date.today()
+    user_config = storage.get_json("user_config.json")
+    assignment = storage.get_json("curve_assignment.json")
+    tanks = [t for t in user_config if t in assignment]
+    by_path = curve_registry.get_many([assignment[t] for t in tanks], storage)
+    curves = {t: by_path[assignment[t]] for t in tanks}
+    fixed = {t: user_config[t]["start_date"] for t in tanks if user_config[t].get("lock") and user_config[t].get("start_date")}
+
+    history_start = (plan_start - timedelta(days=60)).isoformat()
+    # 有線上修正的產氣尺度就直接用，不必讀近期的每日結果
+    scale = load_scale(storage)
+    if scale is None:
+        scale = estimate_scale(open_log(DAILY_RESULT_LOG, storage).load_columns(history_start))
+    ch4 = recent_ch4(log_index.ch4_range(history_start))
+    return plan_schedules(curves, plan_start, fixed=fixed, objective=objective, scale=scale, ch4=ch4, **kwargs)
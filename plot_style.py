@@ -0,0 +1,53 @@
+import io
+import os
+import threading
+
+# === 圖表共用設定（延遲載入） ===
+# matplotlib 只在真的要畫圖時才 import；中文字型每個程序只註冊一次。
+# webhook 的純文字指令（目前階段、週報…）與 worker 冷啟動都不用付 matplotlib / 字型的載入成本。
+FONT_PATH = os.environ.get("BIOGAS_FONT", "fonts/NotoSansTC-Regular.ttf")
+# 圖表樣式版本：改了畫圖程式（配色、版面、字型…）就加 1，快取中的舊圖檔會全部失效重畫（見 figure_cache）
+STYLE_VERSION = 2
+FALLBACK_FONTS = ["Noto Sans TC", "Microsoft JhengHei", "Arial Unicode MS", "DejaVu Sans"]  # DejaVu Sans 隨 matplotlib 附帶
+
+_fonts_ready = False
+_fonts_lock = threading.Lock()
+
+
+def setup_fonts():
+    # 註冊字型並設定 rcParams；重複呼叫直接返回
+    global _fonts_ready
+    if _fonts_ready:
+        return
+    with _fonts_lock:
+        if _fonts_ready:
+            return
+        import matplotlib
+        import matplotlib.font_manager as fm
+        families = list(FALLBACK_FONTS)
+        try:
+            fm.fontManager.addfont(FONT_PATH)
+            name = fm.FontProperties(fname=FONT_PATH).get_name()
+            families = [name] + [f for f in families if f != name]
+        except Exception as e:
+            print(f"[WARNING] 無法載入字型 {FONT_PATH}：{e}")
+        matplotlib.rcParams["font.sans-serif"] = families
+        matplotlib.rcParams["axes.unicode_minus"] = False  # 避免負號亂碼
+        _fonts_ready = True
+
+
+# 圖表一律用獨立的 Figure + Agg canvas 畫在記憶體裡：不碰 pyplot 的全域狀態（可在多 thread 同時畫），
+# 也不寫暫存檔（不同請求不會互相覆蓋同名 png），直接回傳 PNG bytes 交給 storage / 上傳
+def new_figure(figsize=None):
+    setup_fonts()
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def figure_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
@@ -0,0 +1,100 @@
+import numpy as np
+
+from log_store import open_log, DAILY_RESULT_LOG, CH4_LOG, POWER_LOG
+from log_columns import DailyColumns
+
+# === 發電潛能（物化 log） ===
+# 原本 ⚡️ 分頁每次 rerun 都以巢狀迴圈把整份每日結果 × 甲烷濃度重算一遍，power_potential_log.json 一直是空的。
+# 這裡把每日的加權甲烷濃度、甲烷產量與發電潛能算好，存成分片 log（logs/power_potential_log/YYYY-MM.json）：
+#   {日期: {"gas", "ch4_avg", "ch4_volume", "power", "tank_ch4": {槽: 濃度 % 或 None}}}
+# 每日結果或甲烷濃度有變動時，只重算變動的日期（refresh_power(storage, dates)）。
+# 公式：P (kW) = 產氣量 × CH4% / 100 × LHV × η，逐槽計算後四捨五入到小數第 2 位再加總（與原分頁相同）
+CH4_LHV = 9.97          # 甲烷低位發熱值 kWh/m³
+POWER_EFF = 0.35        # 發電機組綜合效率
+
+
+def calc_power_potential(gas_volume, ch4_percent, eff=POWER_EFF):
+    # 可傳入純量或陣列
+    return np.round(np.asarray(gas_volume) * (np.asarray(ch4_percent) / 100) * CH4_LHV * eff, 2)
+
+
+def _empty_day():
+    # 當天有紀錄但沒有任何槽（空 list）：與原本的發電分頁相同，產氣 / 發電 0，沒有加權甲烷
+    return {"gas": 0.0, "ch4_avg": None, "ch4_volume": None, "power": 0.0, "tank_ch4": {}}
+
+
+def compute_power(daily_frame, ch4_log, dates=None):
+    """
+    daily_frame : DailyColumns.to_frame()（需有 date / Tank / volume 欄）
+    ch4_log     : {日期: {槽: 甲烷濃度 %}}
+    dates       : 每日結果 log 中存在的日期；欄式資料不含空 list 的日期，這些日期補上 0 的紀錄
+    回傳 {日期: 發電潛能紀錄}；整個計算是一次 merge + groupby，不逐日逐槽迴圈。
+    """
+    rows = {d: _empty_day() for d in (dates or [])}
+    if daily_frame.empty:
+        return dict(sorted(rows.items()))
+    import pandas as pd     # daily_frame 已是 DataFrame，pandas 此時必已載入
+    ch4 = pd.DataFrame(
+        [(d, tank, v) for d, tanks in ch4_log.items() for tank, v in (tanks or {}).items() if v is not None],
+        columns=["date", "Tank", "ch4"],
+    ).astype({"ch4": float})
+    frame = daily_frame[["date", "Tank", "volume"]].merge(ch4, on=["date", "Tank"], how="left")
+    has_ch4 = frame["ch4"].notna().to_numpy()
+    volume = frame["volume"].to_numpy(dtype=float)
+    ch4_pct = frame["ch4"].to_numpy(dtype=float)
+    frame["weighted"] = np.where(has_ch4, volume * ch4_pct, 0.0)
+    frame["power"] = np.where(has_ch4, calc_power_potential(volume, np.nan_to_num(ch4_pct)), 0.0)
+
+    sums = frame.groupby("date", sort=True)[["volume", "weighted", "power"]].sum()
+    gas = sums["volume"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ch4_avg = np.where(gas > 0, sums["weighted"].to_numpy() / gas, np.nan)
+    ch4_volume = ch4_avg * gas / 100
+
+    tank_ch4 = {d: dict(zip(g["Tank"], g["ch4"])) for d, g in frame.groupby("date", sort=True)}
+    rows.update({
+        d: {
+            "gas": float(gas[i]),
+            "ch4_avg": None if np.isnan(ch4_avg[i]) else float(ch4_avg[i]),
+            "ch4_volume": None if np.isnan(ch4_volume[i]) else float(ch4_volume[i]),
+            "power": float(sums["power"].iloc[i]),
+            "tank_ch4": {str(t): None if pd.isna(v) else float(v) for t, v in tank_ch4[d].items()},
+        }
+        for i, d in enumerate(sums.index)
+    })
+    return dict(sorted(rows.items()))
+
+
+def refresh_power(storage, dates=None, commit_msg=None):
+    """
+    重算並寫回發電潛能 log。dates 為 None 時整份重建，否則只重算這些日期
+    （該日已無每日結果則刪除該日紀錄）；只寫入內容有變動的日期，回傳這些日期。
+    可傳入 storage.batch()，與觸發變動的寫入同一個 commit。
+    """
+    daily = open_log(DAILY_RESULT_LOG, storage)
+    ch4 = open_log(CH4_LOG, storage)
+    power_log = open_log(POWER_LOG, storage)
+
+    if dates is None:
+        # 整份重建：讀 json（欄式快照沒有空 list 的日期）
+        entries = daily.load_all()
+        rows = compute_power(DailyColumns.from_log(entries).to_frame(), ch4.load_all(), entries)
+        changes = {d: None for d in power_log.load_all() if d not in rows}
+        changes.update(rows)
+    else:
+        dates = sorted(set(dates))
+        entries = {d: daily.get(d) for d in dates}
+        entries = {d: items for d, items in entries.items() if items is not None}
+        frame = DailyColumns.from_log(entries).to_frame()
+        rows = compute_power(frame, {d: ch4.get(d) or {} for d in dates}, entries)
+        changes = {d: rows.get(d) for d in dates}
+
+    changes = {d: row for d, row in changes.items() if power_log.get(d) != row}
+    if changes:
+        power_log.update(changes, commit_msg or f"更新發電潛能 {', '.join(sorted(changes)[:3])}{' …' if len(changes) > 3 else ''}")
+    return sorted(changes)
+
+
+def load_power(storage, start=None, end=None):
+    # 讀取物化後的發電潛能紀錄 {日期: 紀錄}（只讀範圍內的月份）
+    return open_log(POWER_LOG, storage).load_range(start, end)
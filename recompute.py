@@ -0,0 +1,84 @@
+from log_store import open_log, DAILY_RESULT_LOG, CUMULATIVE_LOG
+from power import refresh_power
+
+# === 補登 / 修正 / 刪除累積讀值後的增量重算 ===
+# 每天的產氣量 = 當日累積讀值 - 前一筆累積讀值，再依各槽 normalized 比例分配。
+# 某一天的讀值被新增、修改或刪除時，受影響的只有：
+#   - 該日本身（若仍有讀值）
+#   - 該日之後的下一筆讀值（它的「前一筆」變了）
+# 這裡只重算這些日期：沿用 daily_result_log 內已記錄的各槽 normalized / 天數 / 階段，只重新分配 volume，
+# 只寫回有變動的日期，並把這些日期的圖檔標記為待重畫（figures/dirty.json），發電潛能 log 也一併更新。
+DIRTY_FIGURES = "figures/dirty.json"
+FIGURE_KINDS = ("daily_distribution", "stacked", "cumulative")
+
+
+def figure_paths(date_str):
+    return [f"figures/{date_str}_{kind}.png" for kind in FIGURE_KINDS]
+
+
+def affected_dates(cumulative_log, changed_dates):
+    # cumulative_log 需為已套用變更後的狀態（ShardedLog 或 SortedDateLog）
+    affected = set()
+    for d in changed_dates:
+        if cumulative_log.get(d) is not None:
+            affected.add(d)
+        nxt, _ = cumulative_log.successor(d)
+        if nxt is not None:
+            affected.add(nxt)
+    return sorted(affected)
+
+
+def reallocate(items, gas_today):
+    # 與 BiogasAnalyzer.analyze 相同的分配公式，回傳新的各槽紀錄
+    norm_sum = 0
+    for item in items:
+        norm_sum += item.get("normalized", 0)
+    return [
+        dict(item, volume=round(item.get("normalized", 0) / norm_sum * gas_today, 2) if norm_sum > 0 else 0)
+        for item in items
+    ]
+
+
+def recompute_downstream(storage, changed_dates, commit_msg=None):
+    """
+    changed_dates 的累積讀值已寫入 storage（可傳入 storage.batch()，與變更同一個 commit）。
+    回傳實際改寫的日期清單。
+    """
+    cumulative = open_log(CUMULATIVE_LOG, storage)
+    daily = open_log(DAILY_RESULT_LOG, storage)
+
+    changes = {}
+    for d in affected_dates(cumulative, changed_dates):
+        items = daily.get(d)
+        if not items:
+            continue
+        _, previous = cumulative.prior(d)
+        gas_today = max(cumulative.get(d) - (previous or 0.0), 0)
+        if reallocate(items, gas_today) != items:
+            # 以寫入當下的當日內容重新分配（與同時寫入者合併）
+            changes[d] = lambda day, gas_today=gas_today: reallocate(day, gas_today) if day else day
+
+    with storage.batch(commit_msg or f"重算 {', '.join(sorted(changes) or changed_dates)} 產氣分配") as tx:
+        if changes:
+            open_log(DAILY_RESULT_LOG, tx).update(changes)
+            mark_figures_dirty(tx, changes)
+        # 每日結果有變動的日期（含呼叫端剛寫入 / 刪除的日期），發電潛能跟著重算
+        refresh_power(tx, set(changed_dates) | set(changes))
+    return sorted(changes)
+
+
+# --- 待重畫的圖檔 ---
+def mark_figures_dirty(storage, dates):
+    def add(dirty):
+        dirty["dates"] = sorted(set(dirty.get("dates", [])) | set(dates))
+    storage.update_json(DIRTY_FIGURES, add, "標記待重畫圖檔")
+
+
+def clear_figures_dirty(storage, dates):
+    def remove(dirty):
+        dirty["dates"] = sorted(set(dirty.get("dates", [])) - set(dates))
+    storage.update_json(DIRTY_FIGURES, remove, "圖檔已重畫")
+
+
+def is_figure_dirty(storage, date_str):
+    return date_str in storage.get_json(DIRTY_FIGURES).get("dates", [])
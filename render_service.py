@@ -0,0 +1,137 @@
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# === 圖檔渲染服務（常駐 process pool） ===
+# matplotlib 會持有 GIL 且 pyplot 是全域狀態，webhook 裡用 thread 平行畫圖沒有幫助；
+# 這裡開一組常駐的 worker process，建立時就先載入 matplotlib / 字型（warm）；
+# pool 在第一次有圖要畫時才建立（或由程式進入點明確呼叫 start()），import 本模組 / 取得服務都不會開 process，
+# 純文字指令、測試與 gunicorn master 都不用付 spawn 的成本。
+# 每張圖是一個只含純資料（dict / list / 欄式快照 bytes）的 job，worker 畫完回傳 PNG bytes。
+# 三張每日圖表同時送出、同時渲染，webhook 的 thread 只等結果，不被 matplotlib 卡住。
+#   BIOGAS_RENDER_WORKERS：worker 數（預設 3；設 0 則在本程序內依序渲染）
+#   BIOGAS_RENDER_TIMEOUT：單張圖等待秒數
+RENDER_WORKERS = int(os.environ.get("BIOGAS_RENDER_WORKERS", "3"))
+RENDER_TIMEOUT = float(os.environ.get("BIOGAS_RENDER_TIMEOUT", "60"))
+
+_analyzer = None
+
+
+# --- job（純資料） ---
+def daily_distribution_job(result, date_str):
+    # result：{槽: analyze() 的各槽結果}
+    return {"kind": "daily_distribution", "result": result, "date_str": date_str}
+
+
+def stacked_job(daily_columns, cumulative, active_tanks):
+    # daily_columns：DailyColumns（以 .npz bytes 傳給 worker）
+    # 只帶疊加圖顯示範圍內的資料：傳給 worker 的量固定，範圍外的舊資料變動也不會讓圖檔快取失效
+    from biogas_2 import stacked_window
+    start, end = stacked_window(max(cumulative, default=None))
+    if start is not None:
+        daily_columns = daily_columns.between(start, end)
+        cumulative = {d: v for d, v in cumulative.items() if d >= start}
+    return {"kind": "stacked", "daily": daily_columns.to_bytes(), "cumulative": dict(cumulative),
+            "active_tanks": dict(active_tanks)}
+
+
+def cumulative_job(cumulative, active_tanks):
+    return {"kind": "cumulative", "cumulative": dict(cumulative), "active_tanks": dict(active_tanks)}
+
+
+# --- worker 端 ---
+def _init_worker():
+    # 每個 worker 只做一次：載入 matplotlib、註冊字型、建好畫圖用的 analyzer（圖表畫在 Figure + Agg canvas 上）
+    # biogas_2 本身不再在 import 時載入 matplotlib / pandas，這裡明確預熱，第一張圖不用等
+    global _analyzer
+    import pandas  # noqa: F401
+    import matplotlib.figure  # noqa: F401
+    from plot_style import setup_fonts
+    from biogas_2 import BiogasAnalyzer
+    setup_fonts()
+    from storage import MemoryStorage
+    _analyzer = BiogasAnalyzer({}, storage=MemoryStorage())
+
+
+def _ping():
+    return os.getpid()
+
+
+def render_job(job):
+    """在 worker（或本程序）中渲染一個 job，回傳 PNG bytes。"""
+    if _analyzer is None:
+        _init_worker()
+    from log_columns import DailyColumns
+
+    kind = job["kind"]
+    if kind == "daily_distribution":
+        return _analyzer.plot_daily_distribution(job["result"], job["date_str"])
+    if kind == "stacked":
+        return _analyzer.plot_stacked_estimation_and_cumulative(
+            DailyColumns.from_bytes(job["daily"]), job["cumulative"], job["active_tanks"])
+    if kind == "cumulative":
+        return _analyzer.plot_cumulative(job["cumulative"], job["active_tanks"])
+    raise ValueError(f"未知的圖表類型：{kind}")
+
+
+# --- 服務端 ---
+class RenderService:
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # 建立 pool 並讓每個 worker 先跑一次（載入 matplotlib / 字型），第一張圖就不用等冷啟動
+        with self._lock:
+            if self._pool is None and self.workers > 0:
+                # spawn：webhook 是多 thread 的 Flask 程序，fork 可能複製到別的 thread 持有中的鎖
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker)
+                for _ in range(self.workers):
+                    self._pool.submit(_ping)
+            return self._pool
+
+    def render_many(self, jobs):
+        """同時渲染多個 job，依輸入順序回傳 PNG bytes；pool 壞掉時重建一次，仍失敗則改在本程序渲染。"""
+        jobs = list(jobs)
+        for attempt in range(2):
+            pool = self.start()
+            if pool is None:
+                break
+            try:
+                futures = [pool.submit(render_job, job) for job in jobs]
+                return [f.result(timeout=self.timeout) for f in futures]
+            except BrokenProcessPool as e:
+                print(f"[WARNING] 渲染 worker 異常結束，重新建立 pool：{e}")
+                self.shutdown()
+        return [render_job(job) for job in jobs]
+
+    def render(self, job):
+        return self.render_many([job])[0]
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    # 程序共用一個渲染服務；worker pool 由第一個 render_many() 建立並預熱
+    global _service
+    with _service_lock:
+        if _service is None:
+            # spawn 出來的 worker 會重新 import 主程式；worker 內不再開自己的 pool
+            nested = multiprocessing.parent_process() is not None
+            _service = RenderService(0 if nested else RENDER_WORKERS)
+            atexit.register(_service.shutdown)
+        return _service
@@ -0,0 +1,711 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+# === 儲存後端設定 ===
+# BIOGAS_STORAGE       : github（預設）/ local / memory
+# BIOGAS_STORAGE_ROOT  : local 後端的根目錄（預設為目前目錄，與 repo 內的 json 檔同一位置）
+# BIOGAS_ARCHIVE       : 設為 github 時，主要後端每次寫入也同步封存一份到 GitHub
+# BIOGAS_WRITE_BEHIND  : 背景寫入間隔秒數（例如 2）；未設定或 0 表示同步寫入
+STORAGE_KIND = os.environ.get("BIOGAS_STORAGE", "github").lower()
+STORAGE_ROOT = os.environ.get("BIOGAS_STORAGE_ROOT", ".")
+ARCHIVE_KIND = os.environ.get("BIOGAS_ARCHIVE", "").lower()
+WRITE_BEHIND_INTERVAL = float(os.environ.get("BIOGAS_WRITE_BEHIND", "0") or 0)
+UPDATE_RETRIES = int(os.environ.get("BIOGAS_UPDATE_RETRIES", "5"))    # 讀-改-寫遇到衝突的重試次數
+
+
+def dump_json_bytes(data):
+    # 與 save_json_to_github 相同的格式，切換後端時檔案內容不會變
+    return json.dumps(data, ensure_ascii=False, indent=2).encode()
+
+
+def parse_json_bytes(raw, path):
+    if raw is None:
+        return {}
+    try:
+        data = json.loads(raw.decode())
+    except Exception as e:
+        print(f"[WARNING] 讀取 {path} 時 JSON 格式異常：{e}")
+        return {}
+    # ⭐ 防呆：與 load_json_from_github 一致，只接受 dict
+    if not isinstance(data, dict):
+        print(f"[WARNING] {path} 讀取後型別為 {type(data)}，預期應為 dict，自動回傳空字典")
+        return {}
+    return data
+
+
+def content_version(raw):
+    # 檔案版本 = git blob sha，與 GitHub 回傳的 sha 相同，各後端可以直接互相比對
+    if raw is None:
+        return None
+    return hashlib.sha1(b"blob %d\0" % len(raw) + raw).hexdigest()
+
+
+class StorageConflict(Exception):
+    # 寫入時發現檔案已不是讀取時的版本
+    def __init__(self, paths):
+        super().__init__(f"檔案已被其他寫入者更新：{', '.join(paths)}")
+        self.paths = list(paths)
+
+
+class StorageWriteError(Exception):
+    # 後端回報寫入失敗（例如 GitHub 建立 tree / commit 或移動 branch 失敗），資料沒有落地
+    def __init__(self, paths, commit_msg=None):
+        listed = ", ".join(list(paths)[:3]) + (f" 等 {len(paths)} 個檔案" if len(paths) > 3 else "")
+        super().__init__(f"寫入失敗{f'（{commit_msg}）' if commit_msg else ''}：{listed}")
+        self.paths = list(paths)
+
+
+# === 每個路徑一把鎖（整個 process 共用），同檔案的讀-改-寫排隊，不同檔案互不影響 ===
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def path_lock(path):
+    with _path_locks_guard:
+        lock = _path_locks.get(path)
+        if lock is None:
+            lock = _path_locks[path] = threading.RLock()
+        return lock
+
+
+class _PathLocks:
+    # 依固定順序一次鎖多個路徑，避免互相等待造成死結
+    def __init__(self, paths):
+        self.locks = [path_lock(p) for p in sorted(set(paths))]
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for lock in reversed(self.locks):
+            lock.release()
+        return False
+
+
+def _apply_mutations(raw, path, mutations):
+    data = parse_json_bytes(raw, path)
+    for mutate in mutations:
+        result = mutate(data)
+        data = data if result is None else result
+    return data
+
+
+class StorageBackend:
+    """
+    所有 log / 設定 / 曲線 / 圖檔的讀寫介面。
+    子類別只需實作 read_bytes / write_bytes / list，JSON、batch 與讀-改-寫由這裡統一處理。
+    """
+
+    def read_bytes(self, path):
+        raise NotImplementedError
+
+    def write_bytes(self, path, data, commit_msg=None):
+        raise NotImplementedError
+
+    def list(self, subdir, suffix=None):
+        raise NotImplementedError
+
+    def read_versioned(self, path):
+        # 回傳 (內容, 版本)；不存在為 (None, None)
+        raw = self.read_bytes(path)
+        return raw, content_version(raw)
+
+    def versions(self, paths):
+        # 只要版本、不要內容：{路徑: 版本}，不存在為 None（GitHub 後端只列資料夾，不下載檔案）
+        return {path: self.read_versioned(path)[1] for path in paths}
+
+    # --- JSON ---
+    def get_json(self, path):
+        return parse_json_bytes(self.read_bytes(path), path)
+
+    def put_json(self, path, data, commit_msg=None):
+        return self.write_bytes(path, dump_json_bytes(data), commit_msg)
+
+    def update_json(self, path, mutate, commit_msg=None):
+        """
+        讀-改-寫的基本操作：mutate(data) 直接修改 dict（或回傳新的 dict）。
+        同 process 內同一路徑依序執行；寫入時若檔案已被別人改過，重新讀取、重放 mutate 再寫。
+        回傳最後寫入的內容。
+        """
+        with path_lock(path):
+            raw, version = self.read_versioned(path)
+            writes = {path: dump_json_bytes(_apply_mutations(raw, path, [mutate]))}
+            self.absorb(writes, commit_msg or f"Update {path}", {path: version}, {path: [mutate]})
+            return parse_json_bytes(writes[path], path)
+
+    # --- 二進位（圖檔） ---
+    def get_binary(self, path):
+        return self.read_bytes(path)
+
+    def put_binary(self, path, data, commit_msg=None):
+        return self.write_bytes(path, data, commit_msg)
+
+    # --- 批次寫入 ---
+    def batch(self, commit_msg="Batch update"):
+        return StorageBatch(self, commit_msg)
+
+    def commit_batch(self, writes, commit_msg, expected=None):
+        """
+        預設逐檔寫入；支援單次 commit 的後端可覆寫。
+        expected: {路徑: 讀取時的版本}，任何一個對不上就丟出 StorageConflict，整批都不寫。
+        """
+        with _PathLocks(writes):
+            if expected:
+                stale = [p for p, version in expected.items() if self.read_versioned(p)[1] != version]
+                if stale:
+                    raise StorageConflict(stale)
+            ok = True
+            for path, data in writes.items():
+                ok = self.write_bytes(path, data, commit_msg) and ok
+            return ok
+
+    def absorb(self, writes, commit_msg, expected=None, mutations=None):
+        """
+        batch / update_json 送出的入口（writes 會就地更新為最後實際寫入的內容）。
+        發生衝突時，有 mutation 紀錄的檔案重新讀取最新版並重放 mutation；
+        沒有紀錄的檔案是整檔覆寫，以這次寫入為準。
+        """
+        expected = dict(expected or {})
+        mutations = mutations or {}
+        # 整個送出（含重新合併）期間鎖住這些路徑，同 process 的其他寫入者排在後面
+        with _PathLocks(writes):
+            for attempt in range(UPDATE_RETRIES):
+                try:
+                    return self.commit_batch(writes, commit_msg, expected or None)
+                except StorageConflict as e:
+                    print(f"[WARNING] 寫入衝突（{', '.join(e.paths)}），第 {attempt + 1} 次重新合併")
+                    for path in e.paths:
+                        if path in mutations:
+                            raw, version = self.read_versioned(path)
+                            writes[path] = dump_json_bytes(_apply_mutations(raw, path, mutations[path]))
+                            expected[path] = version
+                        else:
+                            expected.pop(path, None)
+        raise StorageConflict(list(expected))
+
+    def flush(self, timeout=None):
+        # 同步後端寫入即落地；背景寫入的後端會覆寫成「等到佇列清空」
+        return True
+
+    def after_commit(self, fn):
+        # 之前的寫入確定落地後呼叫 fn()（例如記錄本機快取索引）；同步後端此時已寫入，直接呼叫
+        # batch 會等自己 commit 成功才往下交，背景寫入的後端等送出成功才呼叫；寫入失敗則不會呼叫
+        fn()
+
+
+class StorageBatch(StorageBackend):
+    """
+    收集多筆寫入，離開 with 區塊時一次交給後端。
+    批次內的讀取會先看到尚未送出的寫入（read-your-writes）；
+    update_json 會記下讀取時的版本與 mutation，送出時若有衝突由後端重新合併。
+    一個指令通常整個包在一個 batch 裡（分析、寫 log、重算、發電潛能、畫圖都會讀同一批 manifest / 分片），
+    所以批次內每個檔案只向後端讀一次，之後都用第一次讀到的內容與版本；
+    open_log() 也在最外層 batch 內共用同一個 ShardedLog（見 log_store.open_log）。
+    """
+
+    def __init__(self, backend, commit_msg):
+        self.backend = backend
+        self.commit_msg = commit_msg
+        self.writes = {}
+        self.expected = {}
+        self.mutations = {}
+        self.reads = {}         # path -> (內容, 版本)
+        self.hooks = []         # after_commit 登記的函式
+        self.outermost = backend.outermost if isinstance(backend, StorageBatch) else self
+        self.logs = {}          # 只有最外層 batch 會用到：log 名稱 -> ShardedLog
+
+    def _read(self, path):
+        if path not in self.reads:
+            self.reads[path] = self.backend.read_versioned(path)
+        return self.reads[path]
+
+    def read_bytes(self, path):
+        if path in self.writes:
+            return self.writes[path]
+        return self._read(path)[0]
+
+    def read_versioned(self, path):
+        if path in self.writes:
+            return self.writes[path], content_version(self.writes[path])
+        return self._read(path)
+
+    def versions(self, paths):
+        known = {p: content_version(self.writes[p]) if p in self.writes else self.reads[p][1]
+                 for p in paths if p in self.writes or p in self.reads}
+        result = self.backend.versions([p for p in paths if p not in known]) if len(known) < len(set(paths)) else {}
+        result.update(known)
+        return result
+
+    def get_json(self, path):
+        if path in self.writes:
+            return parse_json_bytes(self.writes[path], path)
+        return parse_json_bytes(self._read(path)[0], path)
+
+    def write_bytes(self, path, data, commit_msg=None):
+        # 整檔覆寫：之前的 mutation 紀錄不再適用
+        self.writes[path] = data
+        self.expected.pop(path, None)
+        self.mutations.pop(path, None)
+        return True
+
+    def update_json(self, path, mutate, commit_msg=None):
+        if path in self.writes:
+            raw = self.writes[path]
+        else:
+            raw, version = self._read(path)
+            self.expected[path] = version
+            self.mutations[path] = []
+        data = _apply_mutations(raw, path, [mutate])
+        self.writes[path] = dump_json_bytes(data)
+        if path in self.mutations:
+            self.mutations[path].append(mutate)
+        return data
+
+    def absorb(self, writes, commit_msg, expected=None, mutations=None):
+        # 巢狀 batch：併入外層，連同版本與 mutation 紀錄，由最外層一起送出
+        for path, data in writes.items():
+            if path not in self.writes and expected and path in expected:
+                self.expected[path] = expected[path]
+                self.mutations[path] = list((mutations or {}).get(path, []))
+            elif path in self.mutations and mutations and path in mutations:
+                self.mutations[path].extend(mutations[path])
+            else:
+                self.expected.pop(path, None)
+                self.mutations.pop(path, None)
+            self.writes[path] = data
+        return True
+
+    def list(self, subdir, suffix=None):
+        names = set(self.backend.list(subdir, suffix))
+        prefix = f"{subdir.rstrip('/')}/"
+        for path in self.writes:
+            name = path[len(prefix):]
+            if path.startswith(prefix) and "/" not in name and (suffix is None or name.endswith(suffix)):
+                names.add(name)
+        return sorted(names)
+
+    def after_commit(self, fn):
+        self.hooks.append(fn)
+
+    def commit(self):
+        # 後端回報失敗時丟出 StorageWriteError：呼叫端不能把沒有 commit 成功的寫入當成已完成
+        hooks, self.hooks = self.hooks, []
+        if self.writes:
+            paths = sorted(self.writes)
+            ok = self.backend.absorb(dict(self.writes), self.commit_msg, dict(self.expected),
+                                     {p: list(m) for p, m in self.mutations.items()})
+            self.writes.clear()
+            self.expected.clear()
+            self.mutations.clear()
+            if not ok:
+                raise StorageWriteError(paths, self.commit_msg)
+        # 寫入已交給後端：after_commit 往下交，由後端在真正落地後呼叫（巢狀 batch 則等外層 commit）
+        for fn in hooks:
+            self.backend.after_commit(fn)
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+class MemoryStorage(StorageBackend):
+    # 全部放在 RAM，給壓力測試 / 單機試跑使用
+    def __init__(self, initial=None):
+        self._files = dict(initial or {})
+        self._lock = threading.Lock()
+
+    def read_bytes(self, path):
+        with self._lock:
+            return self._files.get(path)
+
+    def write_bytes(self, path, data, commit_msg=None):
+        with self._lock:
+            self._files[path] = bytes(data)
+        return True
+
+    def list(self, subdir, suffix=None):
+        prefix = f"{subdir.rstrip('/')}/"
+        with self._lock:
+            names = [p[len(prefix):] for p in self._files if p.startswith(prefix)]
+        return sorted(n for n in names if "/" not in n and (suffix is None or n.endswith(suffix)))
+
+
+class LocalStorage(StorageBackend):
+    # 本地磁碟，路徑與 GitHub repo 內相同（例如 figures/2025-06-19_stacked.png）
+    def __init__(self, root="."):
+        self.root = root
+
+    def _full(self, path):
+        return os.path.join(self.root, path)
+
+    def read_bytes(self, path):
+        full = self._full(path)
+        if not os.path.exists(full):
+            return None
+        with open(full, "rb") as f:
+            return f.read()
+
+    def write_bytes(self, path, data, commit_msg=None):
+        full = self._full(path)
+        os.makedirs(os.path.dirname(full) or ".", exist_ok=True)
+        # 先寫暫存檔再 rename，避免讀到寫一半的檔案
+        tmp = f"{full}.tmp{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, full)
+        return True
+
+    def list(self, subdir, suffix=None):
+        full = self._full(subdir)
+        if not os.path.isdir(full):
+            return []
+        return sorted(n for n in os.listdir(full)
+                      if os.path.isfile(os.path.join(full, n)) and (suffix is None or n.endswith(suffix)))
+
+
+class GitHubStorage(StorageBackend):
+    # 直接走 GitHub contents API（原本的行為）
+    def read_bytes(self, path):
+        from github_utils import load_binary_from_github
+        return load_binary_from_github(path)
+
+    def get_json(self, path):
+        from github_utils import load_json_from_github
+        return load_json_from_github(path)
+
+    def write_bytes(self, path, data, commit_msg=None):
+        from github_utils import save_binary_to_github
+        return save_binary_to_github(path, data, commit_msg or f"Update {path}")
+
+    def put_json(self, path, data, commit_msg=None):
+        from github_utils import save_json_to_github
+        return save_json_to_github(path, data, commit_msg or "Update JSON via Streamlit")
+
+    def read_versioned(self, path):
+        from github_utils import load_contents_from_github
+        return load_contents_from_github(path)
+
+    def versions(self, paths):
+        from github_utils import current_shas
+        return current_shas(paths)
+
+    def list(self, subdir, suffix=None):
+        from github_utils import list_files_on_github
+        return list_files_on_github(subdir, suffix)
+
+    def commit_batch(self, writes, commit_msg, expected=None):
+        from github_utils import commit_files_to_github, put_contents, GitHubConflict
+        expected = expected or {}
+        if len(writes) == 1:
+            # 單檔用 contents API 一次 PUT；有指定版本時以 sha 當前提條件，對不上即為衝突
+            (path, data), = writes.items()
+            if path in expected:
+                resp = put_contents(path, data, commit_msg, sha=expected[path], resolve_conflict=False)
+                if resp.status_code in (409, 422):
+                    raise StorageConflict([path])
+            else:
+                resp = put_contents(path, data, commit_msg)
+            return resp.status_code in (200, 201)
+        # 全部檔案一個 commit、branch ref 只移動一次
+        try:
+            return commit_files_to_github(writes, commit_msg, expected_shas=expected or None)
+        except GitHubConflict as e:
+            raise StorageConflict(e.paths)
+
+
+class ArchiveStorage(StorageBackend):
+    """
+    主要後端（local / memory）負責日常讀寫，GitHub 只當封存目標：
+    讀取以主要後端為準，缺檔時才從封存端補回；寫入兩邊都寫。
+    """
+
+    def __init__(self, primary, archive):
+        self.primary = primary
+        self.archive = archive
+
+    def read_bytes(self, path):
+        data = self.primary.read_bytes(path)
+        if data is None:
+            data = self.archive.read_bytes(path)
+            if data is not None:
+                self.primary.write_bytes(path, data)
+        return data
+
+    def versions(self, paths):
+        result = self.primary.versions(paths)
+        missing = [p for p, v in result.items() if v is None]
+        if missing:
+            result.update(self.archive.versions(missing))
+        return result
+
+    def write_bytes(self, path, data, commit_msg=None):
+        ok = self.primary.write_bytes(path, data, commit_msg)
+        try:
+            self.archive.write_bytes(path, data, commit_msg)
+        except Exception as e:
+            print(f"[WARNING] 封存 {path} 失敗：{e}")
+        return ok
+
+    def commit_batch(self, writes, commit_msg, expected=None):
+        # 版本以主要後端為準；封存端跟著主要後端整檔覆寫
+        ok = self.primary.commit_batch(writes, commit_msg, expected)
+        try:
+            self.archive.commit_batch(writes, commit_msg)
+        except Exception as e:
+            print(f"[WARNING] 封存批次寫入失敗：{e}")
+        return ok
+
+    def list(self, subdir, suffix=None):
+        names = self.primary.list(subdir, suffix)
+        return names or self.archive.list(subdir, suffix)
+
+    def flush(self, timeout=None):
+        return self.primary.flush(timeout) and self.archive.flush(timeout)
+
+
+class WriteBehindStorage(StorageBackend):
+    """
+    背景寫入：put 只放進佇列就回傳，背景 thread 每 interval 秒把佇列整批交給後端。
+    同一路徑連續寫入只保留最新版本（coalescing）；讀取會先看佇列中尚未落地的版本。
+    update_json 的 mutation 會跟著佇列一起送出，後端發現衝突時可重新合併。
+    需要確保已寫入（例如 LINE 要抓圖檔網址）時呼叫 flush()；程式結束時也會自動 flush。
+    """
+
+    def __init__(self, backend, interval=2.0):
+        self.backend = backend
+        self.interval = interval
+        self._pending = {}       # path -> bytes，尚未送出
+        self._inflight = {}      # path -> bytes，正在送出
+        self._pending_expected, self._pending_mutations = {}, {}
+        self._inflight_expected, self._inflight_mutations = {}, {}
+        self._messages = []
+        self._pending_hooks, self._inflight_hooks = [], []
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        self._generation = 0     # 每完成一次送出 +1
+        self._last_ok = True
+        self._thread = threading.Thread(target=self._run, name="storage-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _queued(self, path):
+        return self._pending.get(path, self._inflight.get(path))
+
+    def read_bytes(self, path):
+        with self._cond:
+            queued = self._queued(path)
+        return queued if queued is not None else self.backend.read_bytes(path)
+
+    def read_versioned(self, path):
+        with self._cond:
+            queued = self._queued(path)
+        if queued is not None:
+            return queued, content_version(queued)
+        return self.backend.read_versioned(path)
+
+    def versions(self, paths):
+        with self._cond:
+            queued = {p: self._queued(p) for p in paths}
+        result = self.backend.versions([p for p, q in queued.items() if q is None])
+        result.update({p: content_version(q) for p, q in queued.items() if q is not None})
+        return result
+
+    def get_json(self, path):
+        with self._cond:
+            queued = self._queued(path)
+        if queued is not None:
+            return parse_json_bytes(queued, path)
+        return self.backend.get_json(path)
+
+    def write_bytes(self, path, data, commit_msg=None):
+        return self.absorb({path: data}, commit_msg or f"Update {path}")
+
+    def commit_batch(self, writes, commit_msg, expected=None):
+        return self.absorb(writes, commit_msg, expected)
+
+    def absorb(self, writes, commit_msg, expected=None, mutations=None):
+        expected = expected or {}
+        mutations = mutations or {}
+        with self._cond:
+            if self._closed:
+                return self.backend.absorb(writes, commit_msg, expected, mutations)
+            for path, data in writes.items():
+                queued = self._queued(path)
+                if path in mutations and path in expected:
+                    if queued is not None and expected[path] != content_version(queued):
+                        # 讀取之後佇列裡已有更新的版本：在最新版本上重放這次的 mutation
+                        data = writes[path] = dump_json_bytes(_apply_mutations(queued, path, mutations[path]))
+                    if path in self._pending:
+                        # 接在佇列中的版本之後改：沿用佇列的基準版本，mutation 串起來（佇列是整檔覆寫則維持覆寫）
+                        if path in self._pending_mutations:
+                            self._pending_mutations[path].extend(mutations[path])
+                    else:
+                        # 正在送出的版本送出成功後，檔案就是那個版本
+                        self._pending_expected[path] = content_version(queued) if queued is not None else expected[path]
+                        self._pending_mutations[path] = list(mutations[path])
+                else:
+                    # 整檔覆寫
+                    self._pending_expected.pop(path, None)
+                    self._pending_mutations.pop(path, None)
+                self._pending[path] = data
+            if commit_msg and commit_msg not in self._messages:
+                self._messages.append(commit_msg)
+            self._cond.notify_all()
+        return True
+
+    def after_commit(self, fn):
+        # 跟著目前佇列中的寫入一起送出，送出成功後才呼叫
+        with self._cond:
+            if not self._closed and (self._pending or self._inflight):
+                self._pending_hooks.append(fn)
+                return
+        fn()
+
+    def list(self, subdir, suffix=None):
+        names = set(self.backend.list(subdir, suffix))
+        prefix = f"{subdir.rstrip('/')}/"
+        with self._cond:
+            queued = list(self._pending) + list(self._inflight)
+        for path in queued:
+            name = path[len(prefix):]
+            if path.startswith(prefix) and "/" not in name and (suffix is None or name.endswith(suffix)):
+                names.add(name)
+        return sorted(names)
+
+    def flush(self, timeout=None):
+        # 立即送出目前佇列，等到佇列清空為止；回傳最後一次送出是否成功
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._thread.is_alive():
+                return not self._pending
+            target = self._generation + (2 if self._inflight else 1)
+            while self._pending or self._inflight:
+                self._flush_requested = True
+                self._cond.notify_all()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+                if self._generation >= target and not self._last_ok:
+                    return False
+            return True
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+        self.flush(timeout=60)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _requeue_failed(self, messages):
+        # 失敗的檔案放回佇列；期間已有更新版本時，若新版是接著失敗的版本改的，把 mutation 串回去
+        for path, data in self._inflight.items():
+            if path not in self._pending:
+                self._pending[path] = data
+                if path in self._inflight_mutations:
+                    self._pending_expected[path] = self._inflight_expected[path]
+                    self._pending_mutations[path] = self._inflight_mutations[path]
+            elif (path in self._pending_mutations and path in self._inflight_mutations
+                  and self._pending_expected.get(path) == content_version(data)):
+                self._pending_expected[path] = self._inflight_expected[path]
+                self._pending_mutations[path] = self._inflight_mutations[path] + self._pending_mutations[path]
+            elif self._pending_expected.get(path) == content_version(data):
+                self._pending_expected.pop(path, None)
+                self._pending_mutations.pop(path, None)
+        self._messages = messages + self._messages
+        self._pending_hooks = self._inflight_hooks + self._pending_hooks
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed and not self._pending:
+                    return
+                # 等滿 interval 再送，讓連續寫入合併；flush() 會提早喚醒
+                if not self._flush_requested:
+                    self._cond.wait_for(lambda: self._flush_requested or self._closed, timeout=self.interval)
+                self._flush_requested = False
+                self._inflight, self._pending = self._pending, {}
+                self._inflight_expected, self._pending_expected = self._pending_expected, {}
+                self._inflight_mutations, self._pending_mutations = self._pending_mutations, {}
+                messages, self._messages = self._messages, []
+                self._inflight_hooks, self._pending_hooks = self._pending_hooks, []
+            msg = "; ".join(messages) if messages else "Write-behind update"
+            try:
+                ok = self.backend.absorb(dict(self._inflight), msg, dict(self._inflight_expected),
+                                         dict(self._inflight_mutations))
+            except Exception as e:
+                print(f"[WARNING] 背景寫入失敗：{e}")
+                ok = False
+            with self._cond:
+                if not ok:
+                    self._requeue_failed(messages)
+                hooks = self._inflight_hooks if ok else []
+                self._inflight = {}
+                self._inflight_expected, self._inflight_mutations = {}, {}
+                self._inflight_hooks = []
+                self._last_ok = ok
+                self._generation += 1
+                self._cond.notify_all()
+            for fn in hooks:
+                try:
+                    fn()
+                except Exception as e:
+                    print(f"[WARNING] 寫入完成後的處理失敗：{e}")
+            if not ok:
+                time.sleep(self.interval)
+
+
+# === 依設定建立後端（整個 process 共用一個） ===
+def make_storage(kind=STORAGE_KIND, root=STORAGE_ROOT, archive=ARCHIVE_KIND, write_behind=WRITE_BEHIND_INTERVAL):
+    if kind == "memory":
+        backend = MemoryStorage()
+    elif kind == "local":
+        backend = LocalStorage(root)
+    elif kind == "github":
+        backend = GitHubStorage()
+        return WriteBehindStorage(backend, write_behind) if write_behind > 0 else backend
+    else:
+        raise ValueError(f"未知的 BIOGAS_STORAGE：{kind}")
+    if archive == "github":
+        # 背景寫入只套在慢的封存端，主要後端仍同步寫入
+        archive_backend = GitHubStorage()
+        if write_behind > 0:
+            archive_backend = WriteBehindStorage(archive_backend, write_behind)
+        backend = ArchiveStorage(backend, archive_backend)
+    return backend
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = make_storage()
+        return _storage
+
+
+def set_storage(backend):
+    # 壓力測試 / 單機試跑時可直接換成 MemoryStorage 等後端
+    global _storage
+    with _storage_lock:
+        _storage = backend
+    return backend
@@ -3,35 +3,52 @@ import streamlit as st
 st.set_page_config(page_title="產氣曲線管理")
 
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
 import json
 import os
 from datetime import date
 from biogas_2 import BiogasAnalyzer
+from plot_style import setup_fonts, new_figure
+from render_service import daily_distribution_job
+from figure_cache import render_figures
 import matplotlib.dates as mdates
 import threading
 from github_utils import GITHUB_TOKEN
-
-font_path = "fonts/NotoSansTC-Regular.ttf"  # 字型檔路徑
-fm.fontManager.addfont(font_path)
-plt.rcParams['font.sans-serif'] = ['Noto Sans TC', 'Microsoft JhengHei', 'sans-serif']
-plt.rcParams['axes.unicode_minus'] = False  # 避免負號亂碼
-
-if not GITHUB_TOKEN:
+from storage import get_storage, StorageWriteError, STORAGE_KIND, ARCHIVE_KIND
+from log_store import open_log, CH4_LOG, POWER_LOG
+from log_index import get_index
+from curve_registry import curve_registry
+from recompute import recompute_downstream
+from power import refresh_power, load_power
+from adaptation import update_adaptation
+from planner import plan_from_storage, PLAN_HORIZON, PLAN_MAX_OFFSET
+from tank_state import TankFleet
+
+# 中文字型：每個程序只註冊一次（streamlit 每次 rerun 重跑本檔時直接略過）
+setup_fonts()
+
+# 所有 json / 圖檔讀寫都經由 storage 後端（BIOGAS_STORAGE 設定）
+storage = get_storage()
+# 歷史 / 發電分頁的查詢走本機 sqlite 索引；本頁寫入後呼叫 log_index.invalidate()
+log_index = get_index(storage)
+
+if not GITHUB_TOKEN and "github" in (STORAGE_KIND, ARCHIVE_KIND):
     st.error("🚨 GITHUB_TOKEN 尚未設定，請到 secrets 或環境變數設定！")
-else:
+elif GITHUB_TOKEN:
     print(f"[DEBUG] GITHUB_TOKEN loaded, first 4: {GITHUB_TOKEN[:4]}")
 
 # 載入雲端 user_config
 CONFIG_FILE = "user_config.json"
-tanks = ["A", "B", "C"]
+DEFAULT_TANKS = ["A", "B", "C"]     # 雲端還沒有任何設定時的預設槽
+TANK_COLUMNS = 3                    # 每列顯示幾個槽
 
 try:
-    user_config = load_json_from_github(CONFIG_FILE)
+    user_config = storage.get_json(CONFIG_FILE)
 except:
     user_config = {}
 
+# 槽別不限 A/B/C：以 user_config 內的槽為準（可在下方「新增槽別」加入）
+tanks = list(user_config) or DEFAULT_TANKS
+
 for tank in tanks:
     if tank not in user_config:
         user_config[tank] = {}
@@ -39,77 +56,24 @@ for tank in tanks:
     user_config[tank].setdefault("lock", False)
     user_config[tank].setdefault("run", False)
     # 初始化 session_state
-    st.session_state.setdefault(f"start_{tank.lower()}", user_config[tank]["start_date"])
-    st.session_state.setdefault(f"lock_{tank.lower()}", user_config[tank]["lock"])
-    st.session_state.setdefault(f"run_{tank.lower()}", user_config[tank]["run"])
+    st.session_state.setdefault(f"start_{tank}", user_config[tank]["start_date"])
+    st.session_state.setdefault(f"lock_{tank}", user_config[tank]["lock"])
+    st.session_state.setdefault(f"run_{tank}", user_config[tank]["run"])
+
+
+def tank_columns(tank_ids):
+    # 依序回傳 (槽, streamlit 欄位)，每 TANK_COLUMNS 個槽換一列
+    for i in range(0, len(tank_ids), TANK_COLUMNS):
+        row = tank_ids[i:i + TANK_COLUMNS]
+        yield from zip(row, st.columns(TANK_COLUMNS)[:len(row)])
 
 tab1, tab2, tab3 = st.tabs(["app說明頁","沼氣紀錄", "⚡️發電潛能紀錄"])
 
 
-def ensure_curve_local(curve_name):
-    """
-    若本地無此曲線，則自動從 github 下載一份到 curves/ 資料夾
-    """
-    import os, json
-    local_path = f"curves/{curve_name}"
-    if not os.path.exists(local_path):
-        curve_data = load_json_from_github(f"curves/{curve_name}")
-        os.makedirs("curves", exist_ok=True)
-        with open(local_path, "w") as f:
-            json.dump(curve_data, f, indent=2)
-    return local_path
-
-
-
-# === GitHub 儲存工具 ===
-from github_utils import load_json_from_github, save_json_to_github, save_binary_to_github
-
-def ensure_curve_local(curve_name):
-    local_path = f"curves/{curve_name}"
-    if not os.path.exists(local_path):
-        # 下載 github 上的 curves/{curve_name} 存本地
-        curve_data = load_json_from_github(f"curves/{curve_name}")
-        os.makedirs("curves", exist_ok=True)
-        with open(local_path, "w") as f:
-            json.dump(curve_data, f, indent=2)
-    return local_path
-
-def list_curves_on_github(subdir="curves"):
-    import requests, os
-    GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
-    REPO = "antony910911/biogas_2"
-    BRANCH = "main"
-    url = f"https://api.github.com/repos/{REPO}/contents/{subdir}?ref={BRANCH}"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-    resp = requests.get(url, headers=headers)
-    if resp.status_code == 200:
-        files = [item["name"] for item in resp.json() if item["name"].endswith(".json")]
-        return files
-    print("list 失敗:", resp.status_code, resp.text)
-    return []
-
-
-def push_png_to_github(local_path, remote_filename, commit_msg="自動上傳圖檔"):
-    with open(local_path, "rb") as f:
-        img_bytes = f.read()
-    save_binary_to_github(
-        filepath=remote_filename,   # 例如 "figures/2024-06-19_daily_distribution.png"
-        bin_data=img_bytes,
-        commit_msg=commit_msg
-    )
-
-
-
-# ==== 強制字型設定 ====
-font_path = "fonts/NotoSansTC-Regular.ttf"
-try:
-    fm.fontManager.addfont(font_path)
-    font_prop = fm.FontProperties(fname=font_path)
-    font_name = font_prop.get_name()
-    plt.rcParams['font.sans-serif'] = [font_name]
-    plt.rcParams['axes.unicode_minus'] = False
-except Exception as e:
-    plt.rcParams['font.sans-serif'] = ['sans-serif']
+def list_curves(subdir="curves"):
+    return storage.list(subdir, suffix=".json")
+
+
 
 with tab1:
     st.title("🧪 沼氣管理平台 ℹ️ 使用說明")
@@ -146,15 +110,6 @@ def init_state():
         "today_date": date.today(),
         "is_cumulative": True,
         "gas_input": 0.0,
-        "run_a": True,
-        "run_b": True,
-        "run_c": True,
-        "start_a": date.today(),
-        "start_b": date.today(),
-        "start_c": date.today(),
-        "lock_a": False,
-        "lock_b": False,
-        "lock_c": False
     }
     for k, v in defaults.items():
         if k not in st.session_state:
@@ -176,7 +131,8 @@ with tab2:
         df['Normalized_Yield'] = df['Yield'] / df['Yield'].max()
         st.dataframe(df)
 
-        fig, ax = plt.subplots()
+        fig = new_figure()
+        ax = fig.subplots()
         ax.plot(df['Day'], df['Normalized_Yield'], marker='o')
         ax.set_xlabel("Day")
         ax.set_ylabel("Normalized Yield")
@@ -197,9 +153,8 @@ with tab2:
             # 本地存一份（非必要，可拿掉）
             with open(f"{CURVE_DIR}/{name}.json", "w") as f:
                 json.dump(out, f, indent=2)
-            # 雲端 GitHub 也存一份
-            from github_utils import save_json_to_github
-            save_json_to_github(f"curves/{name}.json", out, commit_msg=f"新增/更新標準曲線 {name}")
+            # 雲端 storage 也存一份，並立即更新共用的曲線 registry
+            curve_registry.put(f"curves/{name}.json", out, commit_msg=f"新增/更新標準曲線 {name}", storage=storage)
 
             st.success(f"已儲存為 {name}.json，並同步上傳至 GitHub")
 
@@ -207,78 +162,75 @@ with tab2:
     # === 區塊 2：曲線列表 ===
     st.header("📚 已有曲線管理")
 
-    # 新的（自動抓 github 曲線 json 檔名）
-    curve_files = list_curves_on_github()
+    # 新的（自動抓 storage 曲線 json 檔名）
+    curve_files = list_curves()
 
     selected = st.selectbox("選擇查看某條曲線", curve_files)
     if selected:
-        # ↓↓↓ 自動抓取本地檔案，沒有就下載
-        local_path = ensure_curve_local(selected)
-        with open(local_path, "r") as f:
-            data = json.load(f)
-        st.markdown(f"**名稱**：{data['name']}")
-        st.markdown(f"**描述**：{data['description']}")
-        df = pd.DataFrame({"Day": data['days'], "Normalized_Yield": data['normalized_yield']})
-        fig, ax = plt.subplots()
+        # ↓↓↓ 由曲線 registry 取得（雲端更新後自動換新）
+        curve = curve_registry.get(f"{CURVE_DIR}/{selected}", storage)
+        st.markdown(f"**名稱**：{curve.name}")
+        st.markdown(f"**描述**：{curve.description}")
+        df = pd.DataFrame({"Day": curve.days, "Normalized_Yield": curve.normalized})
+        fig = new_figure()
+        ax = fig.subplots()
         ax.plot(df['Day'], df['Normalized_Yield'], marker='o', color='green')
-        ax.set_title(f"{data['name']} 曲線圖")
+        ax.set_title(f"{curve.name} 曲線圖")
         st.pyplot(fig)
 
     # === 區塊 3：指派曲線 ===
-    curve_files = list_curves_on_github()
-    a_curve = b_curve = c_curve = None
+    curve_files = list_curves()
+
+    new_tank = st.text_input("➕ 新增槽別（例如 D、2-1）", key="new_tank").strip()
+    if st.button("新增槽") and new_tank:
+        if new_tank in tanks:
+            st.warning(f"{new_tank} 槽已存在")
+        else:
+            def add_tank(config):
+                # 雲端還沒有設定時，畫面上的預設槽一併寫入
+                for tank in tanks + [new_tank]:
+                    config.setdefault(tank, {"start_date": str(date.today()), "lock": False, "run": False})
+            storage.update_json(CONFIG_FILE, add_tank, f"新增 {new_tank} 槽")
+            log_index.invalidate()
+            st.rerun()
 
     if not curve_files:
         st.warning("⚠️ 目前雲端 curves/ 沒有曲線 json 檔！請先新增。")
     else:
         # 嘗試讀取 assignment，取得預設值
         try:
-            assign = load_json_from_github(ASSIGN_FILE)
-            default_a = os.path.basename(assign.get("A", "")) if assign.get("A", "") else curve_files[0]
-            default_b = os.path.basename(assign.get("B", "")) if assign.get("B", "") else curve_files[0]
-            default_c = os.path.basename(assign.get("C", "")) if assign.get("C", "") else curve_files[0]
+            assign = storage.get_json(ASSIGN_FILE)
         except Exception:
-            default_a = default_b = default_c = curve_files[0]
-
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            a_curve = st.selectbox(
-                "槽 A 使用的曲線", curve_files,
-                index=curve_files.index(default_a) if default_a in curve_files else 0,
-                key="curve_a"
-            )
-        with col2:
-            b_curve = st.selectbox(
-                "槽 B 使用的曲線", curve_files,
-                index=curve_files.index(default_b) if default_b in curve_files else 0,
-                key="curve_b"
-            )
-        with col3:
-            c_curve = st.selectbox(
-                "槽 C 使用的曲線", curve_files,
-                index=curve_files.index(default_c) if default_c in curve_files else 0,
-                key="curve_c"
-            )
-
-        if a_curve and b_curve and c_curve:
-            mapping = {
-                "A": f"curves/{a_curve}",
-                "B": f"curves/{b_curve}",
-                "C": f"curves/{c_curve}"
-            }
+            assign = {}
+
+        selected_curves = {}
+        for tank, col in tank_columns(tanks):
+            default = os.path.basename(assign[tank]) if assign.get(tank) else curve_files[0]
+            with col:
+                selected_curves[tank] = st.selectbox(
+                    f"槽 {tank} 使用的曲線", curve_files,
+                    index=curve_files.index(default) if default in curve_files else 0,
+                    key=f"curve_{tank}"
+                )
+
+        if all(selected_curves.values()):
+            mapping = {tank: f"curves/{name}" for tank, name in selected_curves.items()}
             if st.button("💾 儲存槽別指派設定"):
-                save_json_to_github(ASSIGN_FILE, mapping)
+                # 只覆寫畫面上的槽，其他槽的指派維持雲端內容
+                storage.update_json(ASSIGN_FILE, lambda assignment: assignment.update(mapping))
                 st.success("已儲存槽別指派設定！")
         else:
-            st.info("請確認三個槽都已選擇曲線檔案。")
+            st.info("請確認每個槽都已選擇曲線檔案。")
 
 
     # === 區塊 4 :即時產氣分析設定表單（含啟動日鎖定功能） ===
     st.header("📊 即時產氣分析")
     if st.button("🧹 一鍵歸零累積紀錄"):
-        # 歸零只影響 json，直接覆蓋 github json
-        save_json_to_github(LOG_PATH, {})
-        save_json_to_github(DAILY_RESULT_LOG, {})
+        # 歸零只影響 json，直接清空 storage 上的分片 log
+        open_log(LOG_PATH, storage).clear()
+        open_log(DAILY_RESULT_LOG, storage).clear()
+        open_log(POWER_LOG, storage).clear()
+        log_index.invalidate()
         st.success("累積紀錄與圖表已清空！")
 
     with st.form("analysis_form"):
@@ -290,19 +242,13 @@ with tab2:
             gas_input = st.number_input("輸入沼氣量 (m³)", min_value=0.0, step=0.1, value=st.session_state["gas_input"])
 
         st.markdown("**請輸入每個槽的啟動日期與是否運轉中：**")
-        col_a, col_b, col_c = st.columns(3)
-        with col_a:
-            run_a = st.checkbox(" A 槽運轉中", value=st.session_state["run_a"], key="run_a_chk")
-            lock_a = st.checkbox("🔒 鎖定啟動日 A", value=st.session_state["lock_a"], key="lock_a_chk")
-            start_a = st.date_input(" A 槽啟動日", value=st.session_state["start_a"], key="start_a_input", disabled=lock_a)
-        with col_b:
-            run_b = st.checkbox(" B 槽運轉中", value=st.session_state["run_b"], key="run_b_chk")
-            lock_b = st.checkbox("🔒 鎖定啟動日 B", value=st.session_state["lock_b"], key="lock_b_chk")
-            start_b = st.date_input(" B 槽啟動日", value=st.session_state["start_b"], key="start_b_input", disabled=lock_b)
-        with col_c:
-            run_c = st.checkbox(" C 槽運轉中", value=st.session_state["run_c"], key="run_c_chk")
-            lock_c = st.checkbox("🔒 鎖定啟動日 C", value=st.session_state["lock_c"], key="lock_c_chk")
-            start_c = st.date_input(" C 槽啟動日", value=st.session_state["start_c"], key="start_c_input", disabled=lock_c)
+        form_values = {}
+        for tank, col in tank_columns(tanks):
+            with col:
+                run = st.checkbox(f" {tank} 槽運轉中", value=st.session_state[f"run_{tank}"], key=f"run_{tank}_chk")
+                lock = st.checkbox(f"🔒 鎖定啟動日 {tank}", value=st.session_state[f"lock_{tank}"], key=f"lock_{tank}_chk")
+                start = st.date_input(f" {tank} 槽啟動日", value=st.session_state[f"start_{tank}"], key=f"start_{tank}_input", disabled=lock)
+            form_values[tank] = (run, lock, start)
 
         submitted = st.form_submit_button("🚀 執行分析")
 
@@ -310,129 +256,149 @@ with tab2:
         st.session_state["today_date"] = date_today
         st.session_state["is_cumulative"] = is_cumulative
         st.session_state["gas_input"] = gas_input
-        st.session_state["run_a"] = run_a
-        st.session_state["run_b"] = run_b
-        st.session_state["run_c"] = run_c
-        st.session_state["lock_a"] = lock_a
-        st.session_state["lock_b"] = lock_b
-        st.session_state["lock_c"] = lock_c
         st.session_state["analysis_ran"] = True 
-        if not lock_a:
-            st.session_state["start_a"] = start_a
-        if not lock_b:
-            st.session_state["start_b"] = start_b
-        if not lock_c:
-            st.session_state["start_c"] = start_c
+        for tank, (run, lock, start) in form_values.items():
+            st.session_state[f"run_{tank}"] = run
+            st.session_state[f"lock_{tank}"] = lock
+            if not lock:
+                st.session_state[f"start_{tank}"] = start
 
         st.success("設定已送出並完成分析準備！")
 
-        active_tanks = {}
-        if run_a: active_tanks["A"] = str(start_a)
-        if run_b: active_tanks["B"] = str(start_b)
-        if run_c: active_tanks["C"] = str(start_c)
-
-        # === 將 A/B/C 的設定寫入 user_config 並存到 GitHub ===
-        for tank in tanks:
-            user_config[tank]["start_date"] = str(st.session_state[f"start_{tank.lower()}"])
-            user_config[tank]["lock"] = st.session_state[f"lock_{tank.lower()}"]
-            user_config[tank]["run"] = st.session_state[f"run_{tank.lower()}"]
-        save_json_to_github(CONFIG_FILE, user_config)
-
-
-
-        # 從 github 讀取曲線指派設定
+        # === 將各槽的設定寫入 user_config 並存到 GitHub ===
+        # 只覆寫畫面上這些槽的欄位，LINE 端同時修改的其他欄位不會被蓋掉
+        def apply_tank_settings(config):
+            for tank in tanks:
+                config.setdefault(tank, {}).update({
+                    "start_date": str(st.session_state[f"start_{tank}"]),
+                    "lock": st.session_state[f"lock_{tank}"],
+                    "run": st.session_state[f"run_{tank}"],
+                })
+
+        # 設定、分析結果、產氣尺度修正、累積讀值、後續日期重算、發電潛能與圖檔都收進同一個 batch，離開 with 時一次 commit；
+        # 中途失敗就整批不寫，不會留下「有每日結果、沒有累積讀值」這種前後不一致的紀錄（與 LINE 的記錄指令相同）
         try:
-            full_mapping = load_json_from_github(ASSIGN_FILE)
-            active_mapping = {k: full_mapping[k] for k in active_tanks if k in full_mapping}
-        except Exception as e:
-            st.error(f"❗ 無法讀取指派設定：{e}")
+            with storage.batch(f"記錄 {date_today} 分析結果") as tx:
+                user_config = tx.update_json(CONFIG_FILE, apply_tank_settings)
+
+                # 從 storage 讀取曲線指派設定，運轉中的槽以陣列篩出
+                try:
+                    fleet = TankFleet.from_config(user_config, tx.get_json(ASSIGN_FILE)).active()
+                except Exception as e:
+                    st.error(f"❗ 無法讀取指派設定：{e}")
+                    st.stop()
+                active_tanks = fleet.start_dates()
+                active_mapping = fleet.curve_mapping()
+
+                analyzer = BiogasAnalyzer(active_mapping, storage=tx)
+                result = analyzer.analyze(
+                    start_dates=active_tanks,
+                    today_str=str(date_today),
+                    total_gas=gas_input,
+                    cumulative_log_path=LOG_PATH,
+                    is_cumulative=True
+                )
+                df_result = pd.DataFrame(result).T.reset_index(names="Tank")
+                open_log(DAILY_RESULT_LOG, tx).set(str(date_today), df_result.to_dict(orient="records"))
+                update_adaptation(tx, {str(date_today): result})
+
+                # 寫入累積讀值並畫累積圖；補登 / 修正過去的日期時，下一筆讀值的產氣分配（與發電潛能）也要跟著重算
+                cumulative_png = analyzer.run_cumulative_pipeline(
+                    log_path=LOG_PATH,
+                    today=str(date_today),
+                    gas_value=gas_input,
+                    active_tanks=active_tanks,
+                    remote_path=f"figures/{date_today}_cumulative.png"
+                )
+                recomputed = recompute_downstream(tx, [str(date_today)])
+
+                # 分布圖 / 疊加圖（記憶體內產生 PNG）；表單重送、資料沒變時由圖檔快取命中，不重畫也不寫入
+                distribution_png, _ = render_figures(
+                    tx,
+                    [(f"figures/{date_today}_daily_distribution.png", daily_distribution_job(result, str(date_today)))],
+                    commit_msg=f"每日產氣分布圖：{date_today}"
+                )[0]
+                stacked_png = analyzer.run_stacked_pipeline(DAILY_RESULT_LOG, LOG_PATH, active_tanks,
+                                                           remote_path=f"figures/{date_today}_stacked.png")
+            if not storage.flush():
+                raise StorageWriteError(["背景寫入佇列"])
+        except StorageWriteError as e:
+            log_index.invalidate()
+            st.error(f"❌ {date_today} 寫入失敗，未記錄，請稍後再試一次（{e}）")
             st.stop()
+        log_index.invalidate()
 
-        analyzer = BiogasAnalyzer(active_mapping)
-        result = analyzer.analyze(
-            start_dates=active_tanks,
-            today_str=str(date_today),
-            total_gas=gas_input,
-            cumulative_log_path=LOG_PATH,
-            is_cumulative=True
-        )
-
-        df_result = pd.DataFrame(result).T.reset_index(names="Tank")
         st.subheader("📋 分析結果")
         st.dataframe(df_result, use_container_width=True)
-
-        # 從 github 讀歷史，更新，寫回 github
-        try:
-            history = load_json_from_github(DAILY_RESULT_LOG)
-        except:
-            history = {}
-        history[str(date_today)] = df_result.to_dict(orient="records")
-        save_json_to_github(DAILY_RESULT_LOG, history)
-
-        # 畫分布圖（本地產生圖片，不存 github）
-        plot_path = analyzer.plot_daily_distribution(result, date_str=str(date_today))
-        st.image(plot_path, caption=f"{date_today} 各槽預估產氣量", use_container_width=True)
-        # push到GitHub
-        push_png_to_github(
-            plot_path,
-            f"figures/{date_today}_daily_distribution.png",
-            commit_msg=f"每日產氣分布圖：{date_today}"
-        )
-
-        # 累積圖也同步 github
-        plot_path = analyzer.run_cumulative_pipeline(
-            log_path=LOG_PATH,
-            today=str(date_today),
-            gas_value=gas_input,
-            active_tanks=active_tanks
-        )
-        st.image(plot_path, caption="📈 累積沼氣量趨勢", use_container_width=True)
-        # push到GitHub
-        push_png_to_github(
-            plot_path,
-            f"figures/{date_today}_cumulative.png",
-            commit_msg=f"每日累積圖：{date_today}"
-        )
-
+        st.image(distribution_png, caption=f"{date_today} 各槽預估產氣量", use_container_width=True)
+        st.image(cumulative_png, caption="📈 累積沼氣量趨勢", use_container_width=True)
+        if recomputed:
+            st.info(f"已重算 {', '.join(recomputed)} 的產氣分配，相關圖檔將於查詢時重畫")
 
         csv = df_result.to_csv(index=False).encode('utf-8')
         st.download_button("📥 下載分析結果 CSV", csv, file_name="biogas_analysis_result.csv")
 
         # 疊加圖
-        stacked_path = analyzer.run_stacked_pipeline(DAILY_RESULT_LOG, LOG_PATH, active_tanks)
-        st.image(stacked_path, caption="📊 每日預估產氣 + 累積產氣量疊加圖（含各槽）", use_container_width=True)
-        # push到GitHub
-        push_png_to_github(
-            stacked_path,
-            f"figures/{date_today}_stacked.png",
-            commit_msg=f"每日疊加圖：{date_today}"
-        )
-
-    # 首頁預設展示現有圖（如有）
+        st.image(stacked_png, caption="📊 每日預估產氣 + 累積產氣量疊加圖（含各槽）", use_container_width=True)
+
+    # 首頁預設展示最新一天的圖（如有，直接讀 storage 上的圖檔）
     if not st.session_state.get("analysis_ran", False):
-        if os.path.exists("cumulative_plot.png"):
-            st.image("cumulative_plot.png", caption="📈 累積沼氣量趨勢", use_container_width=True)
-        if os.path.exists("stacked_daily_cumulative.png"):
-            st.image("stacked_daily_cumulative.png", caption="📊 每日預估產氣 + 累積產氣量疊加圖（含各槽）", use_container_width=True)
+        latest_day, _ = log_index.daily_latest()
+        if latest_day:
+            cumulative_png = storage.get_binary(f"figures/{latest_day}_cumulative.png")
+            stacked_png = storage.get_binary(f"figures/{latest_day}_stacked.png")
+            if cumulative_png:
+                st.image(cumulative_png, caption="📈 累積沼氣量趨勢", use_container_width=True)
+            if stacked_png:
+                st.image(stacked_png, caption="📊 每日預估產氣 + 累積產氣量疊加圖（含各槽）", use_container_width=True)
+
+    # === 區塊 4.5：啟動日排程建議 ===
+    st.header("🗓️ 啟動日排程建議")
+    st.caption("已鎖定啟動日的槽維持不動，其餘槽在規劃起始日之後的候選天數內一次評估所有組合。")
+    plan_col1, plan_col2, plan_col3, plan_col4 = st.columns(4)
+    with plan_col1:
+        plan_start = st.date_input("規劃起始日", value=date.today(), key="plan_start")
+    with plan_col2:
+        plan_objective = st.radio("評分方式", ["smooth", "power"], key="plan_objective",
+                                  format_func=lambda o: "產氣最平穩" if o == "smooth" else "發電潛能最穩定")
+    with plan_col3:
+        plan_horizon = st.number_input("規劃天數", min_value=7, max_value=180, value=PLAN_HORIZON, key="plan_horizon")
+    with plan_col4:
+        plan_max_offset = st.number_input("候選啟動天數", min_value=0, max_value=90, value=PLAN_MAX_OFFSET, key="plan_max_offset")
+    if st.button("🔍 計算排程建議"):
+        plans = plan_from_storage(storage, log_index, plan_start, objective=plan_objective,
+                                  horizon=int(plan_horizon), max_offset=int(plan_max_offset), top=10)
+        if plans:
+            st.dataframe(pd.DataFrame([
+                dict({f"{tank} 槽啟動日": d for tank, d in plan["schedule"].items()},
+                     評分=plan["score"], 日均產氣=plan["mean_gas"], 最低=plan["min_gas"], 最高=plan["peak_gas"])
+                for plan in plans
+            ]), use_container_width=True)
+        else:
+            st.info("尚無已指派曲線的槽可排程。")
 
-    # === 區塊 5：歷史預估產氣量查詢（全部讀 github） ===
+    # === 區塊 5：歷史預估產氣量查詢（全部讀 storage） ===
     st.header("🕓 歷史預估產氣量查詢")
     try:
-        history = load_json_from_github(DAILY_RESULT_LOG)
-        dates = list(history.keys())
+        dates = log_index.daily_dates()
         selected_day = st.selectbox("選擇日期查看分析結果", options=sorted(dates, reverse=True))
         if selected_day:
+            day_records = log_index.daily(selected_day)
             # 刪除按鈕
             if st.button(f"🗑️ 刪除 {selected_day} 這一天的紀錄"):
-                if selected_day in history:
-                    del history[selected_day]
-                    save_json_to_github(DAILY_RESULT_LOG, history)
+                if day_records is not None:
+                    # 連同當日累積讀值一起刪除，並重算下一筆讀值的分配（同一個 commit）
+                    with storage.batch(f"刪除 {selected_day} 紀錄") as tx:
+                        open_log(DAILY_RESULT_LOG, tx).delete(selected_day)
+                        open_log(LOG_PATH, tx).delete(selected_day)
+                        recompute_downstream(tx, [selected_day])
+                    log_index.invalidate()
                     st.success(f"已刪除 {selected_day} 的紀錄")
                     st.rerun()
 
                 else:
                     st.warning("該日期已不在歷史紀錄中。")
-            df_hist = pd.DataFrame(history[selected_day])
+            df_hist = pd.DataFrame(day_records)
             slots = df_hist['Tank'].tolist()
             volumes = df_hist['volume'].tolist()
 
@@ -441,13 +407,15 @@ with tab2:
                 volumes = [0, volumes[1-1], 0]     # 對應插入 0
                 center_idx = 1                     # Bar 置中 index
 
-                fig, ax = plt.subplots(figsize=(8, 6))
+                fig = new_figure(figsize=(8, 6))
+                ax = fig.subplots()
                 bars = ax.bar(slots, volumes, color='gray', width=0.3)
                 real_max_vol = volumes[center_idx]
                 ax.set_ylim(0, real_max_vol * 1.25)
                 ax.text(center_idx, real_max_vol + real_max_vol * 0.04, f"{real_max_vol:.1f}", ha='center', va='bottom', fontsize=14, fontweight='bold')
             else:
-                fig, ax = plt.subplots(figsize=(8, 6))
+                fig = new_figure(figsize=(8, 6))
+                ax = fig.subplots()
                 bars = ax.bar(slots, volumes, color='gray', width=0.3)
                 real_max_vol = max(volumes)
                 ax.set_ylim(0, real_max_vol * 1.25)
@@ -458,7 +426,7 @@ with tab2:
             ax.set_xlabel("槽別", fontsize=14)
             ax.set_ylabel("產氣量 Nm³", fontsize=14)
             ax.tick_params(axis='both', labelsize=13)
-            plt.tight_layout()
+            fig.tight_layout()
             st.pyplot(fig)
 
 
@@ -478,13 +446,6 @@ with tab3:
     st.header(f"⚡️ 沼氣 {ch4_label} 濃度/產氣量/發電潛能管理")
 
 
-    import matplotlib.dates as mdates
-    # 字型設定
-    font_path = "fonts/NotoSansTC-Regular.ttf"
-    fm.fontManager.addfont(font_path)
-    plt.rcParams['font.sans-serif'] = ['Noto Sans TC', 'Microsoft JhengHei', 'Arial Unicode MS', 'sans-serif']
-    plt.rcParams['axes.unicode_minus'] = False
-
     st.markdown(f"""
     #### 🔢 發電潛能計算公式
 
@@ -504,27 +465,25 @@ with tab3:
     > $$
     """)
 
-    def calc_power_potential(gas_volume, ch4_percent, eff=0.35):
-        CH4_LHV = 9.97
-        ch4_vol = gas_volume * (ch4_percent / 100)
-        return round(ch4_vol * CH4_LHV * eff, 2)
-
-    # 讀取雲端json
-    daily_log = load_json_from_github("daily_result_log.json") or {}
-    ch4_log = load_json_from_github("ch4_result_log.json") or {}
+    # 每日結果讀欄式快照，CH₄ 由本機索引讀取（寫入仍經由 storage 上的分片 log）
+    daily_columns = open_log(DAILY_RESULT_LOG, storage).load_columns()
+    daily_frame = daily_columns.to_frame()
+    ch4_log = log_index.ch4_range()
 
     # ===== 手動輸入/修正 CH₄ 濃度 =====
     st.subheader(f"手動新增/修正 {ch4_label} 濃度")
-    all_dates = sorted(set(list(daily_log.keys()) + list(ch4_log.keys())), reverse=True)
+    all_dates = sorted(set(daily_columns.dates()) | set(ch4_log), reverse=True)
     input_date = st.selectbox("選擇日期", all_dates, index=0 if all_dates else None)
-    tank_choices = [tank.get("Tank") for tank in daily_log.get(input_date, [])] if input_date in daily_log else ["A", "B", "C"]
+    tank_choices = daily_frame.loc[daily_frame["date"] == input_date, "Tank"].tolist() or tanks
     input_tank = st.selectbox("選擇槽別", tank_choices)
     input_ch4 = st.number_input(f"輸入{ch4_label}濃度（%）", min_value=0.0, max_value=100.0, step=0.1,
                                 value=ch4_log.get(input_date, {}).get(input_tank, 0.0))
     if st.button(f"儲存/覆寫該日該槽{ch4_label}濃度"):
-        ch4_log.setdefault(input_date, {})
-        ch4_log[input_date][input_tank] = input_ch4
-        save_json_to_github("ch4_result_log.json", ch4_log)
+        # 只改該日該槽，同一天其他槽的濃度以雲端最新內容為準
+        with storage.batch(f"更新 {input_date} {input_tank} 槽{ch4_label}濃度") as tx:
+            open_log(CH4_LOG, tx).update({input_date: lambda day: {**(day or {}), input_tank: input_ch4}})
+            refresh_power(tx, [input_date])
+        log_index.invalidate()
         st.success(f"已儲存 {input_date} {input_tank} = {input_ch4:.1f}%")
         st.rerun()
 
@@ -534,42 +493,29 @@ with tab3:
     if del_date and st.button(f"刪除 {del_date} 的 {ch4_label} 紀錄"):
         if del_date in ch4_log:
             del ch4_log[del_date]
-            save_json_to_github("ch4_result_log.json", ch4_log)
+            with storage.batch(f"刪除 {del_date} {ch4_label}濃度") as tx:
+                open_log(CH4_LOG, tx).delete(del_date)
+                refresh_power(tx, [del_date])
+            log_index.invalidate()
             st.success(f"已刪除 {del_date} 的 {ch4_label} 濃度紀錄")
             st.rerun()
 
-    # ===== 主表與自動計算發電潛能、加權平均、CH4產量 =====
-    records = []
-    for d in sorted(daily_log.keys()):
-        tanks = daily_log[d]
-        total_gas = 0
-        total_ch4_weighted = 0
-        power_total = 0
-        tank_ch4s = []
-        for tank in tanks:
-            tank_name = tank.get("Tank")
-            v = tank.get("volume", 0)
-            ch4 = ch4_log.get(d, {}).get(tank_name, None)
-            total_gas += v
-            if ch4 is not None:
-                total_ch4_weighted += v * ch4
-                power = calc_power_potential(v, ch4)
-                power_total += power
-                tank_ch4s.append(f"{tank_name}:{ch4:.1f}%")
-            else:
-                tank_ch4s.append(f"{tank_name}:--")
-        ch4_avg = total_ch4_weighted / total_gas if total_gas > 0 else None
-        ch4_volume = ch4_avg * total_gas / 100 if ch4_avg is not None else None  # 這就是實際甲烷產量（m³）
-        records.append({
-            "日期": d,
-            "產氣量": total_gas,
-            f"加權{ch4_label}(%)": ch4_avg,
-            f"{ch4_label}產量(m³)": ch4_volume,
-            "發電潛能(kW)": power_total,
-            f"各槽{ch4_label}": "; ".join(tank_ch4s)
-        })
-
-    df = pd.DataFrame(records)
+    # ===== 主表：讀物化的發電潛能 log（加權平均、CH4產量、發電潛能已在寫入時算好） =====
+    power_rows = load_power(storage)
+    if not power_rows and len(daily_columns):
+        # 第一次使用（或 log 被清空）時由完整歷史重建一次
+        refresh_power(storage, commit_msg="重建發電潛能紀錄")
+        power_rows = load_power(storage)
+
+    df = pd.DataFrame({
+        "日期": list(power_rows),
+        "產氣量": [row["gas"] for row in power_rows.values()],
+        f"加權{ch4_label}(%)": [row["ch4_avg"] for row in power_rows.values()],
+        f"{ch4_label}產量(m³)": [row["ch4_volume"] for row in power_rows.values()],
+        "發電潛能(kW)": [row["power"] for row in power_rows.values()],
+        f"各槽{ch4_label}": ["; ".join(f"{t}:{v:.1f}%" if v is not None else f"{t}:--" for t, v in row["tank_ch4"].items())
+                            for row in power_rows.values()],
+    })
 
     if not df.empty:
         df["日期"] = pd.to_datetime(df["日期"])
@@ -579,7 +525,8 @@ with tab3:
 
         # 畫圖
 
-        fig, ax1 = plt.subplots(figsize=(10, 5))
+        fig = new_figure(figsize=(10, 5))
+        ax1 = fig.subplots()
         ax2 = ax1.twinx()
         width = 0.3
 
@@ -614,14 +561,15 @@ with tab3:
         ax2.tick_params(axis='y', labelcolor='r')
         ax1.set_xlabel("日期", fontsize=16, fontweight='bold')
 
-        plt.title(f"加權{ch4_label}佔比與單日發電潛能", fontsize=20, fontweight='bold')
+        ax1.set_title(f"加權{ch4_label}佔比與單日發電潛能", fontsize=20, fontweight='bold')
 
         # --- x軸美化 ---
         locator = mdates.AutoDateLocator(minticks=5, maxticks=15)
         formatter = mdates.DateFormatter('%Y-%m-%d')
         ax1.xaxis.set_major_locator(locator)
         ax1.xaxis.set_major_formatter(formatter)
-        plt.setp(ax1.xaxis.get_majorticklabels(), rotation=45, ha="right", fontsize=12, fontweight='bold')
+        for label in ax1.xaxis.get_majorticklabels():
+            label.set(rotation=45, ha="right", fontsize=12, fontweight='bold')
 
         fig.tight_layout()
         st.pyplot(fig)
@@ -634,7 +582,8 @@ with tab3:
 
     st.markdown("### 單日總產氣量 vs. 單日甲烷產量")
 
-    fig3, ax = plt.subplots(figsize=(10, 4))
+    fig3 = new_figure(figsize=(10, 4))
+    ax = fig3.subplots()
 
     # 單日產氣量折線
     ymax = max(df["產氣量"].max(), df["甲烷產量(m³)"].max(), 10)
@@ -667,7 +616,8 @@ with tab3:
     formatter = mdates.DateFormatter('%Y-%m-%d')
     ax.xaxis.set_major_locator(locator)
     ax.xaxis.set_major_formatter(formatter)
-    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha="right", fontsize=11, fontweight='bold')
+    for label in ax.xaxis.get_majorticklabels():
+        label.set(rotation=45, ha="right", fontsize=11, fontweight='bold')
 
     ax.legend(fontsize=13)
     fig3.tight_layout()
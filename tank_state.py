@@ -0,0 +1,74 @@
+from datetime import date
+
+import numpy as np
+
+# === 各槽狀態（struct-of-arrays） ===
+# user_config.json 仍是 {槽: {"start_date", "run", "lock"}}，curve_assignment.json 仍是 {槽: 曲線路徑}；
+# 載入後每個欄位各是一個陣列，槽數多（多場址、上百個槽）時篩選 / 計算都是陣列運算：
+#   ids    : 槽別字串
+#   start  : 啟動日（datetime64[D]，未設定為 NaT）
+#   curve  : 曲線編號（對應 curve_paths，未指派為 -1）
+#   run / lock : bool
+
+
+def _parse_start(tank, value):
+    # 啟動日格式錯誤時當成未設定（NaT）：該槽不列入運轉中的槽，其他槽照常分析
+    if not value:
+        return np.datetime64("NaT", "D")
+    try:
+        return np.datetime64(date.fromisoformat(str(value)), "D")
+    except ValueError:
+        print(f"[WARNING] {tank} 槽的啟動日 {value!r} 格式錯誤，視為未設定")
+        return np.datetime64("NaT", "D")
+
+
+class TankFleet:
+    def __init__(self, ids, start, curve, run, lock, curve_paths):
+        self.ids = ids
+        self.start = start
+        self.curve = curve
+        self.run = run
+        self.lock = lock
+        self.curve_paths = curve_paths
+
+    @classmethod
+    def from_config(cls, user_config, assignment=None):
+        assignment = assignment or {}
+        ids = list(user_config)
+        curve_paths = sorted({assignment[t] for t in ids if assignment.get(t)})
+        curve_index = {path: i for i, path in enumerate(curve_paths)}
+        return cls(
+            ids=np.array(ids, dtype=str),
+            start=np.array([_parse_start(t, user_config[t].get("start_date")) for t in ids], dtype="datetime64[D]"),
+            curve=np.array([curve_index.get(assignment.get(t), -1) for t in ids], dtype=np.int32),
+            run=np.array([bool(user_config[t].get("run", False)) for t in ids], dtype=bool),
+            lock=np.array([bool(user_config[t].get("lock", False)) for t in ids], dtype=bool),
+            curve_paths=curve_paths,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, tank):
+        return tank in self.ids
+
+    def select(self, mask):
+        return TankFleet(self.ids[mask], self.start[mask], self.curve[mask], self.run[mask], self.lock[mask], self.curve_paths)
+
+    def active(self):
+        # 運轉中且已設定啟動日的槽
+        return self.select(self.run & ~np.isnat(self.start))
+
+    def find(self, tank):
+        # 依槽別找到實際的 id：先完全比對，再忽略大小寫；找不到回傳 None
+        if tank in self.ids:
+            return tank
+        matches = [t for t in self.ids.tolist() if t.lower() == tank.lower()]
+        return matches[0] if len(matches) == 1 else None
+
+    # --- 轉回 analyzer / 設定檔使用的 dict ---
+    def start_dates(self):
+        return {t: str(d) for t, d in zip(self.ids.tolist(), self.start) if not np.isnat(d)}
+
+    def curve_mapping(self):
+        return {t: self.curve_paths[c] for t, c in zip(self.ids.tolist(), self.curve.tolist()) if c >= 0}
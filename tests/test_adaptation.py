@@ -0,0 +1,38 @@
+import pytest
+
+from adaptation import ADAPT_PATH, load_scale, observe, update_adaptation
+from storage import MemoryStorage
+
+
+def _result(*tanks):
+    return {f"T{i}": {"normalized": norm, "volume": volume} for i, (norm, volume) in enumerate(tanks)}
+
+
+def test_observe_tracks_site_scale():
+    state = {}
+    assert observe(state, "2025-07-01", [(0.1, 10.0), (0.3, 30.0)])
+    assert state["scale"] == pytest.approx(100.0)
+    # 不論當天是哪幾槽、比例如何，只看 總產氣 / Σ normalized
+    assert observe(state, "2025-07-02", [(0.2, 30.0), (0.2, 30.0)], alpha=0.5)
+    assert state["scale"] == pytest.approx(125.0)
+    assert state["count"] == 2
+
+
+def test_observe_ignores_old_and_empty_days():
+    state = {}
+    observe(state, "2025-07-02", [(0.5, 50.0)])
+    assert not observe(state, "2025-07-01", [(0.5, 500.0)])
+    assert not observe(state, "2025-07-02", [(0.5, 500.0)])
+    assert not observe(state, "2025-07-03", [(0.0, 0.0)])
+    assert state["scale"] == pytest.approx(100.0)
+
+
+def test_update_adaptation_in_batch():
+    storage = MemoryStorage()
+    assert load_scale(storage) is None
+    with storage.batch("t") as tx:
+        update_adaptation(tx, {"2025-07-02": _result((0.5, 60.0)), "2025-07-01": _result((0.5, 50.0), (0.0, 0.0))})
+        assert storage.read_bytes(ADAPT_PATH) is None
+    state = storage.get_json(ADAPT_PATH)
+    assert state["last_date"] == "2025-07-02"
+    assert load_scale(storage) == pytest.approx(100.0 + 0.1 * (120.0 - 100.0))
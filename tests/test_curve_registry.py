@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from storage import LocalStorage, MemoryStorage
+from curve_registry import CurveRegistry
+from biogas_2 import BiogasAnalyzer
+
+CURVE = "curves/c.json"
+
+
+def _curve(values):
+    return {"name": "c", "normalized_yield": values}
+
+
+@pytest.fixture(params=["memory", "local"])
+def storage(request, tmp_path):
+    return MemoryStorage() if request.param == "memory" else LocalStorage(str(tmp_path))
+
+
+def test_get_outside_and_inside_batch(storage):
+    registry = CurveRegistry(ttl=60)
+    storage.put_json(CURVE, _curve([1, 2, 3]))
+    assert list(registry.get(CURVE, storage).normalized) == [1, 2, 3]
+    with storage.batch("t") as tx:
+        # batch 與底層 storage 共用快取
+        assert registry.get(CURVE, tx) is registry.get(CURVE, storage)
+
+
+def test_curves_are_keyed_by_storage(tmp_path):
+    registry = CurveRegistry(ttl=60)
+    a = MemoryStorage({CURVE: json.dumps(_curve([1, 1])).encode()})
+    b = LocalStorage(str(tmp_path))
+    b.put_json(CURVE, _curve([5, 5, 5]))
+    assert len(registry.get(CURVE, a)) == 2
+    assert len(registry.get(CURVE, b)) == 3
+    assert len(registry.get(CURVE, a)) == 2
+
+
+def test_analyzer_on_local_storage(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.put_json(CURVE, _curve([0.2, 0.4, 0.6]))
+    analyzer = BiogasAnalyzer({"A": CURVE}, storage=storage)
+    assert len(analyzer.curves["A"]) == 3
+    result = analyzer.analyze({"A": "2025-07-01"}, "2025-07-02", 10.0, is_cumulative=False)
+    assert result["A"]["day"] == 2
+    assert result["A"]["volume"] == pytest.approx(10.0)
@@ -0,0 +1,56 @@
+import pytest
+
+from storage import MemoryStorage, StorageWriteError
+from figure_cache import FigureCache
+
+PATH = "figures/2025-07-01_stacked.png"
+
+
+def _render(calls):
+    def render(jobs):
+        calls.extend(jobs)
+        return [f"PNG:{job['value']}".encode() for job in jobs]
+    return render
+
+
+def test_hit_skips_render_and_write(tmp_path):
+    storage, calls = MemoryStorage(), []
+    cache = FigureCache(str(tmp_path))
+    assert cache.render(storage, [(PATH, {"value": 1})], _render(calls)) == [(b"PNG:1", False)]
+    assert cache.render(storage, [(PATH, {"value": 1})], _render(calls)) == [(b"PNG:1", True)]
+    assert len(calls) == 1
+
+
+def test_other_process_overwrite_is_seen(tmp_path):
+    # 兩個程序共用同一個快取資料夾：B 覆寫了同一路徑，A 不能再沿用自己的舊 key
+    storage, calls = MemoryStorage(), []
+    a, b = FigureCache(str(tmp_path)), FigureCache(str(tmp_path))
+    a.render(storage, [(PATH, {"value": 1})], _render(calls))
+    b.render(storage, [(PATH, {"value": 2})], _render(calls))
+    assert storage.get_binary(PATH) == b"PNG:2"
+    png, hit = a.render(storage, [(PATH, {"value": 1})], _render(calls))[0]
+    assert not hit
+    assert storage.get_binary(PATH) == b"PNG:1"
+
+
+def test_concurrent_record_of_same_path_is_dropped(tmp_path):
+    # A 畫好但還沒 commit 時，B 記錄了同一路徑：不確定誰的 commit 較晚，A 不記錄，下次改查遠端
+    storage, calls = MemoryStorage(), []
+    a, b = FigureCache(str(tmp_path)), FigureCache(str(tmp_path))
+    with storage.batch("a") as tx:
+        a.render(tx, [(PATH, {"value": 1})], _render(calls))
+        b.render(storage, [(PATH, {"value": 2})], _render(calls))
+    assert PATH not in a._load_index()
+    assert storage.get_binary(PATH) == b"PNG:1"
+    assert b.render(storage, [(PATH, {"value": 2})], _render(calls))[0] == (b"PNG:2", False)
+    assert storage.get_binary(PATH) == b"PNG:2"
+
+
+def test_failed_commit_is_not_recorded(tmp_path):
+    storage, calls = MemoryStorage(), []
+    storage.commit_batch = lambda *args, **kwargs: False
+    cache = FigureCache(str(tmp_path))
+    with pytest.raises(StorageWriteError):
+        with storage.batch("t") as tx:
+            cache.render(tx, [(PATH, {"value": 1})], _render(calls))
+    assert cache._load_index() == {}
@@ -0,0 +1,37 @@
+import pytest
+
+from storage import LocalStorage, MemoryStorage
+from log_store import open_log, CUMULATIVE_LOG, DAILY_RESULT_LOG
+
+
+@pytest.fixture(params=["memory", "local"])
+def storage(request, tmp_path):
+    return MemoryStorage() if request.param == "memory" else LocalStorage(str(tmp_path))
+
+
+def test_open_log_outside_batch(storage):
+    # LocalStorage 本身有 root（資料夾路徑）屬性，不能被當成 batch
+    log = open_log(CUMULATIVE_LOG, storage)
+    log.update({"2025-07-01": 100.0, "2025-08-02": 250.0})
+    assert open_log(CUMULATIVE_LOG, storage).load_all() == {"2025-07-01": 100.0, "2025-08-02": 250.0}
+    assert open_log(CUMULATIVE_LOG, storage).prior("2025-08-02") == ("2025-07-01", 100.0)
+
+
+def test_open_log_shared_within_batch(storage):
+    with storage.batch("t") as tx:
+        log = open_log(CUMULATIVE_LOG, tx)
+        log.set("2025-07-01", 1.0)
+        with tx.batch("inner") as inner:
+            # 巢狀 batch 拿到同一個 ShardedLog，看得到外層尚未送出的寫入
+            assert open_log(CUMULATIVE_LOG, inner) is log
+            open_log(CUMULATIVE_LOG, inner).set("2025-07-02", 2.0)
+        assert log.load_all() == {"2025-07-01": 1.0, "2025-07-02": 2.0}
+        assert open_log(CUMULATIVE_LOG, storage).load_all() == {}
+    assert open_log(CUMULATIVE_LOG, storage).load_all() == {"2025-07-01": 1.0, "2025-07-02": 2.0}
+
+
+def test_load_columns_outside_batch(storage):
+    entry = {"Tank": "A", "start_date": "2025-07-01", "day": 1, "normalized": 0.5, "stage": "起始期", "volume": 12.0}
+    open_log(DAILY_RESULT_LOG, storage).update({"2025-07-01": [entry], "2025-07-02": []})
+    cols = open_log(DAILY_RESULT_LOG, storage).load_columns()
+    assert cols.to_frame()["volume"].tolist() == [12.0]
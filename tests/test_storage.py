@@ -0,0 +1,189 @@
+import threading
+
+import pytest
+
+from storage import (
+    LocalStorage, MemoryStorage, WriteBehindStorage, StorageConflict, StorageWriteError,
+    content_version, dump_json_bytes,
+)
+
+
+@pytest.fixture(params=["memory", "local"])
+def storage(request, tmp_path):
+    return MemoryStorage() if request.param == "memory" else LocalStorage(str(tmp_path))
+
+
+@pytest.fixture(params=["memory", "local"])
+def write_behind(request, tmp_path):
+    backend = MemoryStorage() if request.param == "memory" else LocalStorage(str(tmp_path))
+    wb = WriteBehindStorage(backend, interval=60)
+    yield wb
+    wb.close()
+
+
+def _interleave(storage, path, mutate):
+    # 模擬另一個寫入者：在 batch 讀取之後、commit 之前改了同一個檔
+    storage.update_json(path, mutate)
+
+
+# --- 基本讀寫 ---
+def test_read_write_and_versions(storage):
+    assert storage.read_bytes("a/x.json") is None
+    assert storage.read_versioned("a/x.json") == (None, None)
+    storage.put_json("a/x.json", {"k": 1})
+    raw, version = storage.read_versioned("a/x.json")
+    assert raw == dump_json_bytes({"k": 1})
+    assert version == content_version(raw)
+    assert storage.versions(["a/x.json", "a/missing.json"]) == {"a/x.json": version, "a/missing.json": None}
+    assert storage.get_json("a/x.json") == {"k": 1}
+    assert storage.get_json("a/missing.json") == {}
+
+
+def test_binary_and_list(storage):
+    storage.put_binary("figures/a.png", b"\x89PNG")
+    storage.put_json("figures/b.json", {})
+    storage.put_json("figures/sub/c.json", {})
+    assert storage.get_binary("figures/a.png") == b"\x89PNG"
+    assert storage.list("figures") == ["a.png", "b.json"]
+    assert storage.list("figures", suffix=".json") == ["b.json"]
+    assert storage.list("nothing") == []
+
+
+def test_update_json(storage):
+    storage.update_json("c.json", lambda d: d.setdefault("l", []).append(1))
+    # mutate 也可以回傳新的 dict
+    assert storage.update_json("c.json", lambda d: {"l": d["l"] + [2]}) == {"l": [1, 2]}
+    assert storage.get_json("c.json") == {"l": [1, 2]}
+
+
+def test_update_json_is_serialized_across_threads(storage):
+    def worker():
+        for _ in range(20):
+            storage.update_json("n.json", lambda d: d.update(n=d.get("n", 0) + 1))
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert storage.get_json("n.json") == {"n": 80}
+
+
+# --- batch ---
+def test_batch_read_your_writes(storage):
+    storage.put_json("x.json", {"v": 0})
+    with storage.batch("t") as tx:
+        tx.put_json("x.json", {"v": 1})
+        tx.put_binary("figures/y.png", b"png")
+        assert tx.get_json("x.json") == {"v": 1}
+        assert tx.read_versioned("x.json")[1] == content_version(dump_json_bytes({"v": 1}))
+        assert tx.versions(["figures/y.png"]) == {"figures/y.png": content_version(b"png")}
+        assert tx.list("figures") == ["y.png"]
+        # 尚未 commit：後端還是舊內容
+        assert storage.get_json("x.json") == {"v": 0}
+        assert storage.read_bytes("figures/y.png") is None
+    assert storage.get_json("x.json") == {"v": 1}
+    assert storage.read_bytes("figures/y.png") == b"png"
+
+
+def test_batch_reads_backend_once(storage):
+    storage.put_json("x.json", {"v": 0})
+    with storage.batch("t") as tx:
+        assert tx.get_json("x.json") == {"v": 0}
+        storage.put_json("x.json", {"v": 9})
+        # 批次內看到的是第一次讀到的快照
+        assert tx.get_json("x.json") == {"v": 0}
+
+
+def test_batch_exception_discards_writes(storage):
+    with pytest.raises(ValueError):
+        with storage.batch("t") as tx:
+            tx.put_json("x.json", {"v": 1})
+            raise ValueError
+    assert storage.read_bytes("x.json") is None
+
+
+def test_batch_conflict_replays_mutations(storage):
+    storage.put_json("l.json", {"l": [0]})
+    with storage.batch("t") as tx:
+        tx.update_json("l.json", lambda d: d["l"].append(1))
+        _interleave(storage, "l.json", lambda d: d["l"].append(2))
+    # 別人的寫入保留，本批的 mutation 在最新內容上重放
+    assert storage.get_json("l.json") == {"l": [0, 2, 1]}
+
+
+def test_batch_overwrite_wins_on_conflict(storage):
+    storage.put_json("o.json", {"v": 0})
+    with storage.batch("t") as tx:
+        tx.get_json("o.json")
+        tx.put_json("o.json", {"v": 1})
+        _interleave(storage, "o.json", lambda d: d.update(v=2))
+    assert storage.get_json("o.json") == {"v": 1}
+
+
+def test_nested_batch_commits_with_outer(storage):
+    with storage.batch("outer") as outer:
+        with outer.batch("inner") as inner:
+            inner.update_json("n.json", lambda d: d.update(a=1))
+        assert storage.read_bytes("n.json") is None
+        assert outer.get_json("n.json") == {"a": 1}
+        outer.update_json("n.json", lambda d: d.update(b=2))
+        _interleave(storage, "n.json", lambda d: d.update(c=3))
+    assert storage.get_json("n.json") == {"a": 1, "b": 2, "c": 3}
+
+
+def test_failed_commit_raises_and_skips_hooks(storage):
+    storage.commit_batch = lambda *args, **kwargs: False
+    called = []
+    with pytest.raises(StorageWriteError):
+        with storage.batch("t") as tx:
+            tx.put_json("x.json", {})
+            tx.after_commit(lambda: called.append(1))
+    assert called == []
+
+
+def test_after_commit_runs_after_outer_commit(storage):
+    called = []
+    with storage.batch("outer") as outer:
+        with outer.batch("inner") as inner:
+            inner.put_json("x.json", {})
+            inner.after_commit(lambda: called.append(storage.read_bytes("x.json") is not None))
+        assert called == []
+    assert called == [True]
+
+
+def test_conflict_retries_are_bounded(storage):
+    storage.put_json("r.json", {})
+    storage.commit_batch = lambda writes, msg, expected=None: (_ for _ in ()).throw(StorageConflict(list(writes)))
+    with pytest.raises(StorageConflict):
+        storage.update_json("r.json", lambda d: d.update(a=1))
+
+
+# --- 背景寫入 ---
+def test_write_behind_reads_queued_writes(write_behind):
+    write_behind.put_json("logs/q.json", {"v": 1})
+    assert write_behind.get_json("logs/q.json") == {"v": 1}
+    assert write_behind.backend.read_bytes("logs/q.json") is None
+    assert write_behind.list("logs", suffix=".json") == ["q.json"]
+    assert write_behind.flush(timeout=10)
+    assert write_behind.backend.get_json("logs/q.json") == {"v": 1}
+
+
+def test_write_behind_coalesces_and_replays(write_behind):
+    write_behind.put_json("c.json", {"l": []})
+    for i in range(3):
+        write_behind.update_json("c.json", lambda d, i=i: d["l"].append(i))
+    assert write_behind.flush(timeout=10)
+    assert write_behind.backend.get_json("c.json") == {"l": [0, 1, 2]}
+    # 後端被別人改過：佇列中的 mutation 在最新內容上重放
+    write_behind.update_json("c.json", lambda d: d["l"].append(3))
+    _interleave(write_behind.backend, "c.json", lambda d: d["l"].append(9))
+    assert write_behind.flush(timeout=10)
+    assert write_behind.backend.get_json("c.json") == {"l": [0, 1, 2, 9, 3]}
+
+
+def test_write_behind_after_commit_waits_for_send(write_behind):
+    called = []
+    with write_behind.batch("t") as tx:
+        tx.put_json("h.json", {})
+        tx.after_commit(lambda: called.append(write_behind.backend.read_bytes("h.json") is not None))
+    assert called == []
+    assert write_behind.flush(timeout=10)
+    assert called == [True]
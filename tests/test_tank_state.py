@@ -0,0 +1,23 @@
+from tank_state import TankFleet
+
+
+def test_from_config_skips_malformed_start_date(capsys):
+    user_config = {
+        "A": {"start_date": "2025-07-01", "run": True},
+        "B": {"start_date": "2025/07/32", "run": True},
+        "C": {"start_date": "57414-07-17", "run": True},
+        "D": {"start_date": "2025-07-03", "run": True},
+    }
+    assignment = {t: f"curves/{t}.json" for t in user_config}
+    fleet = TankFleet.from_config(user_config, assignment)
+    assert fleet.active().start_dates() == {"A": "2025-07-01", "D": "2025-07-03"}
+    assert fleet.active().curve_mapping() == {"A": "curves/A.json", "D": "curves/D.json"}
+    # 格式錯誤的槽仍找得到，才能用指令重新設定啟動日
+    assert fleet.find("b") == "B"
+    assert capsys.readouterr().out.count("[WARNING]") == 2
+
+
+def test_from_config_without_start_date():
+    fleet = TankFleet.from_config({"A": {"run": True}, "B": {"start_date": "", "run": True}})
+    assert len(fleet) == 2
+    assert len(fleet.active()) == 0